@@ -0,0 +1,222 @@
+"""
+BulkSender
+Runs mail merge jobs in the background. Every job renders and sends
+the personalized email of each recipient over a single SMTP connection
+of the account, see `SMTPPool.send_bulk`, and publishes its progress to
+the subscribers of the job.
+
+Jobs are kept in memory, finished ones are removed after
+`BULK_SEND_JOB_RETENTION`.
+"""
+from __future__ import annotations
+import time
+import queue
+import threading
+from enum import Enum
+from dataclasses import dataclass, field
+
+from src.internal.client_handler import ClientHandler
+from src.modules.openmail.mail_merge import MailMerge
+from src.modules.openmail.types import MergeRecipient
+from src.utils import generate_random_id
+
+client_handler = ClientHandler()
+
+"""
+Errors
+"""
+class BulkSendJobNotFound(Exception):
+    def __init__(self, msg: str = "Bulk send job could not be found.", *args, **kwargs):
+        super().__init__(msg, *args, **kwargs)
+
+"""
+Enums, Types
+"""
+class BulkSendJobStatus(str, Enum):
+    Sending = "sending"
+    Completed = "completed"
+    Cancelled = "cancelled"
+    Failed = "failed"
+
+    def __str__(self) -> str:
+        return self.value
+
+@dataclass
+class BulkSendJob:
+    id: str
+    account: str
+    total: int
+    sent: int = 0
+    failed: int = 0
+    status: BulkSendJobStatus = BulkSendJobStatus.Sending
+    # Failed recipients with their errors, up to `MAX_REPORTED_ERRORS`.
+    errors: list[dict] = field(default_factory=list)
+    last_error: str = ""
+    created_at: float = field(default_factory=time.time)
+    finished_at: float = 0
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status != BulkSendJobStatus.Sending
+
+    def to_status(self) -> dict:
+        """Summary of the job to be published to the subscribers."""
+        return {
+            "id": self.id,
+            "status": str(self.status),
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "errors": list(self.errors),
+            "last_error": self.last_error,
+        }
+
+"""
+Constants
+"""
+MAX_REPORTED_ERRORS = 100
+# Timers in seconds
+BULK_SEND_JOB_RETENTION = 60 * 60
+JOIN_TIMEOUT = 5
+
+class BulkSender:
+    _instance = None
+    _lock: threading.RLock
+    _jobs: dict[str, tuple[BulkSendJob, threading.Event]]
+    _threads: dict[str, threading.Thread]
+    _subscribers: dict[str, list[queue.SimpleQueue]]
+
+    def __new__(cls):
+        if not cls._instance:
+            cls._instance = super().__new__(cls)
+            cls._instance._lock = threading.RLock()
+            cls._instance._jobs = {}
+            cls._instance._threads = {}
+            cls._instance._subscribers = {}
+
+        return cls._instance
+
+    def start(
+        self,
+        account: str,
+        merge: MailMerge,
+        recipients: list[MergeRecipient]
+    ) -> BulkSendJob:
+        """
+        Start sending in the background, `merge` is closed once the
+        job is finished.
+        """
+        self._remove_expired_jobs()
+        job = BulkSendJob(id=generate_random_id(), account=account, total=len(recipients))
+        stop_event = threading.Event()
+        thread = threading.Thread(
+            target=self._run, args=(job, merge, recipients, stop_event), daemon=True
+        )
+        with self._lock:
+            self._jobs[job.id] = (job, stop_event)
+            self._threads[job.id] = thread
+        thread.start()
+        return job
+
+    def shutdown(self) -> None:
+        with self._lock:
+            jobs = list(self._jobs.values())
+            threads = list(self._threads.values())
+        for _, stop_event in jobs:
+            stop_event.set()
+        for thread in threads:
+            thread.join(timeout=JOIN_TIMEOUT)
+
+    def get_job(self, job_id: str) -> BulkSendJob:
+        with self._lock:
+            if job_id not in self._jobs:
+                raise BulkSendJobNotFound
+            return self._jobs[job_id][0]
+
+    def get_jobs(self, account: str) -> list[BulkSendJob]:
+        with self._lock:
+            return sorted(
+                (job for job, _ in self._jobs.values() if job.account == account),
+                key=lambda job: job.created_at
+            )
+
+    def cancel(self, job_id: str) -> None:
+        """Stop the job after the email being sent, sent emails can not be taken back."""
+        with self._lock:
+            if job_id not in self._jobs:
+                raise BulkSendJobNotFound
+            self._jobs[job_id][1].set()
+
+    def subscribe(self, job_id: str) -> queue.SimpleQueue:
+        """Returns a queue that receives the status of the job on every change."""
+        subscriber = queue.SimpleQueue()
+        with self._lock:
+            self._subscribers.setdefault(job_id, []).append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, job_id: str, subscriber: queue.SimpleQueue) -> None:
+        with self._lock:
+            try:
+                self._subscribers.get(job_id, []).remove(subscriber)
+            except ValueError:
+                pass
+            if not self._subscribers.get(job_id, True):
+                del self._subscribers[job_id]
+
+    def _publish(self, job: BulkSendJob) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(job.id, []))
+            status = job.to_status()
+        for subscriber in subscribers:
+            subscriber.put(status)
+
+    def _remove_expired_jobs(self) -> None:
+        expired_before = time.time() - BULK_SEND_JOB_RETENTION
+        with self._lock:
+            for job_id, (job, _) in list(self._jobs.items()):
+                if job.is_finished and job.finished_at < expired_before:
+                    del self._jobs[job_id]
+                    self._threads.pop(job_id, None)
+
+    def _run(
+        self,
+        job: BulkSendJob,
+        merge: MailMerge,
+        recipients: list[MergeRecipient],
+        stop_event: threading.Event
+    ) -> None:
+        def on_result(recipient: MergeRecipient, is_sent: bool, msg: str) -> None:
+            with self._lock:
+                if is_sent:
+                    job.sent += 1
+                else:
+                    job.failed += 1
+                    job.last_error = msg
+                    if len(job.errors) < MAX_REPORTED_ERRORS:
+                        job.errors.append({"address": recipient.address, "error": msg})
+            self._publish(job)
+
+        status = BulkSendJobStatus.Completed
+        try:
+            client_handler.get_client(job.account).smtp.send_bulk(
+                merge, recipients, on_result, stop_event
+            )
+            if stop_event.is_set() and job.sent + job.failed < job.total:
+                status = BulkSendJobStatus.Cancelled
+        except Exception as e:
+            status = BulkSendJobStatus.Failed
+            job.last_error = str(e)
+        finally:
+            merge.close()
+            with self._lock:
+                job.status = status
+                job.finished_at = time.time()
+                self._threads.pop(job.id, None)
+            self._publish(job)
+
+__all__ = [
+    "BulkSender",
+    "BulkSendJob",
+    "BulkSendJobStatus",
+    "BulkSendJobNotFound",
+]
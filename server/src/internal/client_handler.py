@@ -1,4 +1,4 @@
-import asyncio
+import time
 from typing import cast
 from concurrent.futures import ThreadPoolExecutor
 
@@ -9,8 +9,10 @@ from src.internal.secure_storage import (
     RSACipher,
     SecureStorageKeyValue,
 )
+from src.internal.connection_supervisor import ConnectionSupervisor, ConnectionStatus
 from src.helpers.uvicorn_logger import UvicornLogger
 from src.modules.openmail import Openmail
+from src.modules.openmail.utils import extract_domain
 
 uvicorn_logger = UvicornLogger()
 secure_storage = SecureStorage()
@@ -20,7 +22,8 @@ type OpenmailClients = dict[str, Openmail]
 type FailedOpenmailClients = list[str]
 
 MAX_TASK_WORKER = 5
-IMAP_LOGGED_OUT_INTERVAL = 60
+# Timers in seconds
+STARTUP_STAGGER_INTERVAL = 0.5
 
 openmail_clients: OpenmailClients = {}
 failed_openmail_clients: list[str] = []
@@ -29,18 +32,22 @@ openmail_clients_for_new_messages: OpenmailClients = {}
 
 class ClientHandler:
     _instance = None
-    _monitor_logged_out_clients_task = None
+    _supervisor: ConnectionSupervisor[tuple[str, bool]]
 
     def __new__(cls):
         if not cls._instance:
             cls._instance = super().__new__(cls)
-            cls._instance._monitor_logged_out_clients_task = None
+            cls._instance._supervisor = ConnectionSupervisor(
+                probe=cls._instance._probe_client,
+                reconnect=cls._instance._reconnect_client,
+            )
 
         return cls._instance
 
     def create_openmail_clients(self):
         try:
             uvicorn_logger.info("Openmail clients are creating...")
+            self._supervisor.start()
             accounts: list[AccountWithPassword] = cast(
                 list[AccountWithPassword], account_manager.get_all()
             )
@@ -48,36 +55,58 @@ class ClientHandler:
                 uvicorn_logger.info("No client found to create.")
                 return
 
+            # Logins are staggered to not hit the same provider
+            # with every account at the exact same moment.
             with ThreadPoolExecutor(max_workers=MAX_TASK_WORKER) as executor:
-                executor.map(self.connect_to_account, accounts)
+                for i, account in enumerate(accounts):
+                    executor.submit(
+                        self._connect_to_account_after,
+                        account,
+                        i * STARTUP_STAGGER_INTERVAL
+                    )
+
+            # Failed ones are going to be retried in the background.
+            for i, email_address in enumerate(list(failed_openmail_clients)):
+                self._supervisor.watch(
+                    (email_address, False),
+                    extract_domain(email_address, full=True),
+                    connected=False,
+                    delay=i * STARTUP_STAGGER_INTERVAL
+                )
         except Exception as e:
             uvicorn_logger.error(f"Error while creating openmail clients: {e}")
             raise e
 
-        """
-        # TODO: Open this later
-        # Check logged out clients and reconnect them.
-        try:
-            global monitor_logged_out_clients_task
-            monitor_logged_out_clients_task = asyncio.create_task(monitor_logged_out_openmail_clients())
-        except Exception as e:
-            uvicorn_logger.error(f"Error while creating monitors to logged out openmail clients: {e}")
-            pass"""
+    def _connect_to_account_after(self, account: AccountWithPassword, delay: float):
+        time.sleep(delay)
+        self.connect_to_account(account)
 
-    def is_connection_available(
+    def get_connection_status(
         self, account: str, for_new_messages: bool = False
-    ) -> bool:
+    ) -> ConnectionStatus:
+        """
+        Returns the connection status of the account immediately, without
+        any round trip. Dropped connections are reconnected in the background
+        by the supervisor.
+        """
+        key = (account, for_new_messages)
         target_openmail_clients = (
             openmail_clients_for_new_messages if for_new_messages else openmail_clients
         )
 
-        print(f"Checking {account} whether is logged out or not...")
-        if not target_openmail_clients[account].imap.is_logged_out():
-            print(f"No need to reconnect for {account}")
-            return True
+        client = target_openmail_clients.get(account)
+        if client and client.imap.state == "LOGOUT":
+            self._supervisor.report_logged_out(key)
+
+        return self._supervisor.get_status(key)
 
-        self.reconnect_to_account(account, for_new_messages)
-        return not target_openmail_clients[account].imap.is_logged_out()
+    def is_connection_available(
+        self, account: str, for_new_messages: bool = False
+    ) -> bool:
+        return (
+            self.get_connection_status(account, for_new_messages)
+            == ConnectionStatus.Connected
+        )
 
     def add_client(self, account: str, client: Openmail):
         openmail_clients[account] = client
@@ -85,6 +114,7 @@ class ClientHandler:
             failed_openmail_clients.remove(account)
         except ValueError:
             pass
+        self._supervisor.watch((account, False), extract_domain(account, full=True))
 
     def get_client(self, account: str, for_new_messages: bool = False) -> Openmail:
         return openmail_clients[account]
@@ -103,7 +133,7 @@ class ClientHandler:
 
     def connect_to_account(
         self, account: AccountWithPassword, for_new_messages: bool = False
-    ):
+    ) -> bool:
         uvicorn_logger.info(f"Connecting to {account.email_address}...")
         target_openmail_clients = (
             openmail_clients_for_new_messages if for_new_messages else openmail_clients
@@ -111,9 +141,12 @@ class ClientHandler:
         target_failed_openmail_clients = (
             None if for_new_messages else failed_openmail_clients
         )
+        key = (account.email_address, for_new_messages)
         try:
-            target_openmail_clients[account.email_address] = Openmail()
-            status, _ = target_openmail_clients[account.email_address].connect(
+            # Previous client, if there is any, is kept until the new
+            # one is ready so requests never see a half connected client.
+            openmail_client = Openmail()
+            status, msg = openmail_client.connect(
                 account.email_address,
                 RSACipher.decrypt_password(
                     account.encrypted_password,
@@ -124,78 +157,82 @@ class ClientHandler:
                 ),
                 imap_enable_idle_optimization=True,
                 imap_listen_new_messages=for_new_messages,
+                # Requests are served by the main clients, a standby
+                # session lets them survive a dropped connection.
+                imap_enable_standby=not for_new_messages,
+                # Most accounts send a handful of emails a day, SMTP
+                # is connected on the first send.
+                smtp_lazy_connect=True,
             )
             if status:
                 uvicorn_logger.info(f"Successfully connected to {account.email_address}")
+                target_openmail_clients[account.email_address] = openmail_client
                 # TODO: Open this later.
                 # target_openmail_clients[account.email_address].imap.idle()
                 try:
-                    if target_failed_openmail_clients:
+                    if target_failed_openmail_clients is not None:
                         target_failed_openmail_clients.remove(account.email_address)
                 except ValueError:
                     pass
+                self._supervisor.watch(
+                    key, extract_domain(account.email_address, full=True)
+                )
+                return True
             else:
-                uvicorn_logger.warning(f"Could not successfully connected to {account.email_address}.")
-                del target_openmail_clients[account.email_address]
-                if target_failed_openmail_clients:
-                    target_failed_openmail_clients.append(account.email_address)
+                uvicorn_logger.warning(f"Could not successfully connected to {account.email_address}: {msg}")
         except Exception as e:
-            del target_openmail_clients[account.email_address]
-            if target_failed_openmail_clients:
-                target_failed_openmail_clients.append(account.email_address)
             uvicorn_logger.error(
                 f"Failed while connecting to {account.email_address}: {e}"
             )
 
-    def reconnect_to_account(self, email_address: str, for_new_messages: bool = False):
-        print(f"Reconnecton for {email_address}...")
+        target_openmail_clients.pop(account.email_address, None)
+        if (
+            target_failed_openmail_clients is not None
+            and account.email_address not in target_failed_openmail_clients
+        ):
+            target_failed_openmail_clients.append(account.email_address)
+        return False
+
+    def reconnect_to_account(self, email_address: str, for_new_messages: bool = False) -> bool:
+        account = account_manager.get(email_address)
+        if not account:
+            uvicorn_logger.warning(f"{email_address} could not found while trying to reconnect.")
+            self._supervisor.unwatch((email_address, for_new_messages))
+            return False
+
+        uvicorn_logger.info(f"Reconnecting to {email_address}...")
         target_openmail_clients = (
             openmail_clients_for_new_messages if for_new_messages else openmail_clients
         )
-        target_failed_openmail_clients = (
-            None if for_new_messages else failed_openmail_clients
+        previous_client = target_openmail_clients.get(email_address)
+        is_reconnected = self.connect_to_account(
+            cast(AccountWithPassword, account), for_new_messages
         )
-        try:
-            created_openmail_clients = target_openmail_clients.keys()
-            if email_address not in created_openmail_clients:
-                return
-
-            if not target_openmail_clients[email_address].imap.is_logged_out():
-                print(f"No need to reconnect for {email_address}")
-                return
-
-            account = account_manager.get(email_address)
-            if account:
-                self.connect_to_account(account, for_new_messages)
-            else:
-                uvicorn_logger.warning(f"{email_address} could not found while trying to reconnect.")
-        except Exception as e:
-            del target_openmail_clients[email_address]
-            if target_failed_openmail_clients:
-                target_failed_openmail_clients.append(email_address)
-            uvicorn_logger.error(f"Failed while reconnecting to {email_address}: {e}")
-
-    def reconnect_logged_out_openmail_clients(self):
-        print(
-            "Reconnecting to Openmail clients...",
+        if previous_client and is_reconnected:
+            try:
+                previous_client.disconnect()
+            except Exception:
+                pass
+        return is_reconnected
+
+    def _probe_client(self, key: tuple[str, bool]) -> bool:
+        email_address, for_new_messages = key
+        target_openmail_clients = (
+            openmail_clients_for_new_messages if for_new_messages else openmail_clients
         )
-        with ThreadPoolExecutor(max_workers=MAX_TASK_WORKER) as executor:
-            for email_address, client in openmail_clients.items():
-                executor.submit(self.reconnect_to_account, email_address, False)
-            for email_address, client in openmail_clients_for_new_messages.items():
-                executor.submit(self.reconnect_to_account, email_address, True)
+        client = target_openmail_clients.get(email_address)
+        if not client:
+            return False
+        client.keep_standby_alive()
+        if not client.imap.is_logged_out():
+            return True
+        # Standby takes over without a new login, supervisor reconnects
+        # only if there is no standby to promote.
+        return client.failover()
 
-    async def monitor_logged_out_openmail_clients(self):
-        try:
-            while True:
-                await asyncio.sleep(IMAP_LOGGED_OUT_INTERVAL)
-                print("Checking logged out Openmail clients...")
-                self.reconnect_logged_out_openmail_clients()
-        except asyncio.CancelledError:
-            uvicorn_logger.info(
-                "Monitoring logged out clients task is being cancelled..."
-            )
-            raise
+    def _reconnect_client(self, key: tuple[str, bool]) -> bool:
+        email_address, for_new_messages = key
+        return self.reconnect_to_account(email_address, for_new_messages)
 
     def _shutdown_openmail_clients(self):
         try:
@@ -211,18 +248,17 @@ class ClientHandler:
             uvicorn_logger.error(f"Openmail clients could not properly terminated: {e}")
 
     def _shutdown_monitors(self):
-        if self.__class__._monitor_logged_out_clients_task:
-            self.__class__._monitor_logged_out_clients_task.cancel()
+        self._supervisor.shutdown()
 
     def shutdown(self):
         uvicorn_logger.info(
             "Shutdown signal received. Starting to logging out and terminating threads..."
         )
         try:
-            self._shutdown_openmail_clients()
             self._shutdown_monitors()
+            self._shutdown_openmail_clients()
         except Exception:
             uvicorn_logger.error("Shutdown could not properly executed.")
 
 
-__all__ = ["ClientHandler"]
+__all__ = ["ClientHandler", "ConnectionStatus"]
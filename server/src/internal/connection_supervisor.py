@@ -0,0 +1,377 @@
+"""
+ConnectionSupervisor
+Keeps the openmail clients healthy in the background. Every supervised
+connection is probed periodically with a cheap NOOP and, if it turns out
+to be dropped, reconnected with jittered exponential backoff. Logins are
+budgeted process-wide and a circuit breaker per provider stops a provider
+outage from turning into a login storm.
+
+The supervisor does not know anything about `Openmail` itself, probing
+and reconnecting are done through the callbacks given by `ClientHandler`.
+"""
+from __future__ import annotations
+import time
+import threading
+from enum import Enum
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Hashable
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils import calculate_backoff
+
+"""
+Enums, Types
+"""
+class ConnectionStatus(str, Enum):
+    Connected = "connected"
+    Reconnecting = "reconnecting"
+    CircuitOpen = "circuit_open"
+    Disconnected = "disconnected"
+
+    def __str__(self) -> str:
+        return self.value
+
+class CircuitState(str, Enum):
+    Closed = "closed"
+    Open = "open"
+    HalfOpen = "half_open"
+
+    def __str__(self) -> str:
+        return self.value
+
+@dataclass
+class SupervisedConnection[K: Hashable]:
+    key: K
+    provider: str
+    status: ConnectionStatus
+    attempt: int = 0
+    last_probe_at: float = 0
+    last_error: str = ""
+
+"""
+Constants
+"""
+MAX_TASK_WORKER = 5
+# Timers in seconds
+WHEEL_TICK = 1
+PROBE_INTERVAL = 60
+BACKOFF_BASE = 2
+BACKOFF_CAP = 300
+CIRCUIT_COOLDOWN = 120
+LOGIN_BUDGET_WINDOW = 10
+LOGIN_BUDGET_RETRY_DELAY = 2
+JOIN_TIMEOUT = 5
+# Counts
+WHEEL_SIZE = 512
+LOGIN_BUDGET = 5
+CIRCUIT_FAILURE_THRESHOLD = 5
+
+class TimerWheel[K: Hashable]:
+    """
+    Hashed timer wheel with `WHEEL_SIZE` slots of `WHEEL_TICK` seconds.
+    Scheduling and cancelling are O(1), delays longer than one revolution
+    are kept in their slot with the remaining number of rounds.
+    """
+    def __init__(self, size: int = WHEEL_SIZE):
+        self._size = size
+        self._cursor = 0
+        self._slots: list[dict[K, int]] = [{} for _ in range(size)]
+        self._positions: dict[K, int] = {}
+
+    def schedule(self, key: K, delay: float) -> None:
+        """Schedule `key` to be due after `delay` seconds, replaces the previous schedule."""
+        self.cancel(key)
+        ticks = max(int(round(delay / WHEEL_TICK)), 1)
+        slot = (self._cursor + ticks) % self._size
+        self._slots[slot][key] = (ticks - 1) // self._size
+        self._positions[key] = slot
+
+    def cancel(self, key: K) -> None:
+        slot = self._positions.pop(key, None)
+        if slot is not None:
+            self._slots[slot].pop(key, None)
+
+    def is_scheduled(self, key: K) -> bool:
+        return key in self._positions
+
+    def advance(self) -> list[K]:
+        """Move the cursor one tick forward and return the keys that are due."""
+        self._cursor = (self._cursor + 1) % self._size
+        slot = self._slots[self._cursor]
+        due = []
+        for key, rounds in list(slot.items()):
+            if rounds > 0:
+                slot[key] = rounds - 1
+                continue
+            del slot[key]
+            del self._positions[key]
+            due.append(key)
+        return due
+
+class CircuitBreaker:
+    """
+    Circuit breaker of a single provider. Opens after `failure_threshold`
+    consecutive failed logins, lets a single trial login through after
+    `cooldown` seconds and closes again on the first success.
+    """
+    def __init__(
+        self,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        cooldown: float = CIRCUIT_COOLDOWN
+    ):
+        self._failure_threshold = failure_threshold
+        self._cooldown = cooldown
+        self._failures = 0
+        self._opened_at = 0.0
+        self._state = CircuitState.Closed
+        self._is_trial_in_progress = False
+
+    @property
+    def state(self) -> CircuitState:
+        if (
+            self._state == CircuitState.Open
+            and time.monotonic() - self._opened_at >= self._cooldown
+        ):
+            self._state = CircuitState.HalfOpen
+        return self._state
+
+    def remaining_cooldown(self) -> float:
+        if self.state != CircuitState.Open:
+            return 0
+        return max(self._cooldown - (time.monotonic() - self._opened_at), 0)
+
+    def allow(self) -> bool:
+        """Check if a login attempt is allowed, half open state allows only one."""
+        state = self.state
+        if state == CircuitState.Closed:
+            return True
+        if state == CircuitState.HalfOpen and not self._is_trial_in_progress:
+            self._is_trial_in_progress = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._is_trial_in_progress = False
+        self._state = CircuitState.Closed
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._is_trial_in_progress or self._failures >= self._failure_threshold:
+            self._is_trial_in_progress = False
+            self._state = CircuitState.Open
+            self._opened_at = time.monotonic()
+
+class ConnectionSupervisor[K: Hashable]:
+    """
+    Runs NOOP health probes on a timer wheel and reconnects dropped
+    connections in the background.
+
+    Connections are identified by keys of type `K`, which are passed to
+    the callbacks as they are.
+
+    Args:
+        probe (Callable[[K], bool]): Returns True if the connection of
+        the key is still alive. Should be cheap and must not block for long.
+        reconnect (Callable[[K], bool]): Reconnects the connection of
+        the key, returns True on success.
+    """
+    def __init__(
+        self,
+        probe: Callable[[K], bool],
+        reconnect: Callable[[K], bool],
+    ):
+        self._probe = probe
+        self._reconnect = reconnect
+        self._lock = threading.RLock()
+        self._wheel: TimerWheel[K] = TimerWheel()
+        self._connections: dict[K, SupervisedConnection[K]] = {}
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._in_flight: set[K] = set()
+        self._login_timestamps: deque[float] = deque()
+        self._executor: ThreadPoolExecutor | None = None
+        self._release_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._release_event.clear()
+        self._executor = ThreadPoolExecutor(max_workers=MAX_TASK_WORKER)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def shutdown(self) -> None:
+        self._release_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=JOIN_TIMEOUT)
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._thread = None
+        self._executor = None
+
+    def watch(
+        self,
+        key: K,
+        provider: str,
+        connected: bool = True,
+        delay: float = 0
+    ) -> None:
+        """
+        Start supervising `key`. Connected ones are going to be probed after
+        PROBE_INTERVAL, others are going to be reconnected after `delay`.
+        """
+        with self._lock:
+            connection = self._connections.get(key)
+            if connection:
+                connection.provider = provider or connection.provider
+            else:
+                connection = SupervisedConnection(
+                    key=key,
+                    provider=provider,
+                    status=ConnectionStatus.Disconnected
+                )
+                self._connections[key] = connection
+
+            if connected:
+                connection.status = ConnectionStatus.Connected
+                connection.attempt = 0
+                connection.last_error = ""
+                self._wheel.schedule(key, PROBE_INTERVAL)
+            else:
+                connection.status = ConnectionStatus.Reconnecting
+                self._wheel.schedule(key, delay)
+
+    def unwatch(self, key: K) -> None:
+        with self._lock:
+            self._wheel.cancel(key)
+            self._connections.pop(key, None)
+
+    def report_logged_out(self, key: K) -> None:
+        """Mark connection as dropped and schedule a reconnect as soon as possible."""
+        with self._lock:
+            connection = self._connections.get(key)
+            if not connection or connection.status == ConnectionStatus.Reconnecting:
+                return
+            connection.status = ConnectionStatus.Reconnecting
+            connection.attempt = 0
+            self._wheel.schedule(key, 0)
+
+    def get_status(self, key: K) -> ConnectionStatus:
+        with self._lock:
+            connection = self._connections.get(key)
+            if not connection:
+                return ConnectionStatus.Disconnected
+            if (
+                connection.status == ConnectionStatus.Reconnecting
+                and self._get_breaker(connection.provider).state == CircuitState.Open
+            ):
+                return ConnectionStatus.CircuitOpen
+            return connection.status
+
+    def get_connections(self) -> list[SupervisedConnection[K]]:
+        with self._lock:
+            return list(self._connections.values())
+
+    def _get_breaker(self, provider: str) -> CircuitBreaker:
+        if provider not in self._breakers:
+            self._breakers[provider] = CircuitBreaker()
+        return self._breakers[provider]
+
+    def _take_login_budget(self) -> bool:
+        now = time.monotonic()
+        while self._login_timestamps and now - self._login_timestamps[0] > LOGIN_BUDGET_WINDOW:
+            self._login_timestamps.popleft()
+        if len(self._login_timestamps) >= LOGIN_BUDGET:
+            return False
+        self._login_timestamps.append(now)
+        return True
+
+    def _run(self) -> None:
+        while not self._release_event.wait(timeout=WHEEL_TICK):
+            with self._lock:
+                due = self._wheel.advance()
+                for key in due:
+                    self._dispatch(key)
+
+    def _dispatch(self, key: K) -> None:
+        connection = self._connections.get(key)
+        if not connection or key in self._in_flight or not self._executor:
+            return
+
+        if connection.status == ConnectionStatus.Connected:
+            self._in_flight.add(key)
+            self._executor.submit(self._run_probe, key)
+            return
+
+        breaker = self._get_breaker(connection.provider)
+        if not breaker.allow():
+            self._wheel.schedule(key, breaker.remaining_cooldown() or LOGIN_BUDGET_RETRY_DELAY)
+            return
+
+        if not self._take_login_budget():
+            self._wheel.schedule(key, calculate_backoff(1, LOGIN_BUDGET_RETRY_DELAY, LOGIN_BUDGET_WINDOW))
+            return
+
+        self._in_flight.add(key)
+        self._executor.submit(self._run_reconnect, key)
+
+    def _run_probe(self, key: K) -> None:
+        try:
+            is_alive = self._probe(key)
+        except Exception:
+            is_alive = False
+
+        with self._lock:
+            self._in_flight.discard(key)
+            connection = self._connections.get(key)
+            if not connection:
+                return
+            connection.last_probe_at = time.time()
+            if connection.status != ConnectionStatus.Connected:
+                return
+            if is_alive:
+                self._wheel.schedule(key, PROBE_INTERVAL)
+            else:
+                connection.status = ConnectionStatus.Reconnecting
+                connection.attempt = 0
+                self._wheel.schedule(key, 0)
+
+    def _run_reconnect(self, key: K) -> None:
+        error = ""
+        try:
+            is_reconnected = self._reconnect(key)
+        except Exception as e:
+            is_reconnected = False
+            error = str(e)
+
+        with self._lock:
+            self._in_flight.discard(key)
+            connection = self._connections.get(key)
+            if not connection:
+                return
+
+            breaker = self._get_breaker(connection.provider)
+            if is_reconnected:
+                breaker.record_success()
+                connection.status = ConnectionStatus.Connected
+                connection.attempt = 0
+                connection.last_error = ""
+                self._wheel.schedule(key, PROBE_INTERVAL)
+            else:
+                breaker.record_failure()
+                connection.attempt += 1
+                connection.last_error = error
+                self._wheel.schedule(
+                    key,
+                    calculate_backoff(connection.attempt, BACKOFF_BASE, BACKOFF_CAP)
+                )
+
+__all__ = [
+    "ConnectionSupervisor",
+    "ConnectionStatus",
+    "TimerWheel",
+    "CircuitBreaker",
+]
@@ -0,0 +1,196 @@
+"""
+FederatedSearch
+Searches several folders of several accounts at once and yields the
+matches of each folder as soon as it answers, so the first hits are
+shown while the slow folders are still being searched.
+
+An account has a single IMAP session and its commands are run one by
+one, see `CommandScheduler`. Searching many of its folders at the same
+time would only queue them up on the session, so each account searches
+at most `FEDERATED_SEARCH_FOLDERS_PER_ACCOUNT` folders at a time while
+the accounts themselves are searched in parallel.
+"""
+from __future__ import annotations
+import time
+import queue
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Iterator
+
+from src.modules.openmail.types import Email, Mailbox
+from src.modules.openmail.utils import get_timestamp
+
+"""
+Types
+"""
+@dataclass
+class FolderSearchResult:
+    account: str
+    folder: str
+    # Matches of the folder, newest first.
+    emails: list[Email] = field(default_factory=list)
+    # Error of the folder or of the account, the search of the other
+    # folders goes on.
+    error: str = ""
+
+"""
+Constants
+"""
+FEDERATED_SEARCH_FOLDERS_PER_ACCOUNT = 1
+# Timers in seconds
+FEDERATED_SEARCH_TIMEOUT = 30
+
+class _AccountSearch:
+    def __init__(self, account: str, folders: list[str] | None):
+        self.account = account
+        self.lock = threading.Lock()
+        # None until the folders of the account are resolved.
+        self.folders: deque[str] | None = deque(folders) if folders is not None else None
+
+    def next_folder(self) -> str | None:
+        with self.lock:
+            return self.folders.popleft() if self.folders else None
+
+def iter_federated_search(
+    targets: dict[str, list[str] | None],
+    search_folder: Callable[[str, str], Mailbox],
+    resolve_folders: Callable[[str], list[str]],
+    folders_per_account: int = FEDERATED_SEARCH_FOLDERS_PER_ACCOUNT,
+    timeout: float = FEDERATED_SEARCH_TIMEOUT
+) -> Iterator[FolderSearchResult]:
+    """
+    Search the folders of the accounts and yield the result of each
+    folder once it answers.
+
+    Args:
+        targets (dict[str, list[str] | None]): Folders to search of each
+        account, None to search the folders of `resolve_folders`.
+        search_folder (Callable[[str, str], Mailbox]): Searches a folder,
+        called with the account and the folder.
+        resolve_folders (Callable[[str], list[str]]): Folders of an account
+        to search when they are not given, see `IMAPManager.get_searchable_folders`.
+        folders_per_account (int, optional): Maximum number of folders of
+        an account that are searched at the same time. Defaults to
+        FEDERATED_SEARCH_FOLDERS_PER_ACCOUNT.
+        timeout (float, optional): Seconds to wait for all the folders.
+        Defaults to FEDERATED_SEARCH_TIMEOUT.
+
+    Yields:
+        FolderSearchResult: Matches of a folder, or the error of the
+        folder. Folders that do not answer within `timeout`, or accounts
+        whose folders can not be resolved, are yielded with an error.
+
+    Example:
+        >>> for result in iter_federated_search({"a@gmail.com": None, "b@outlook.com": ["INBOX"]}, ...):
+        ...     print(result.account, result.folder, len(result.emails))
+        b@outlook.com INBOX 3
+        a@gmail.com [Gmail]/All Mail 12
+    """
+    if folders_per_account < 1:
+        raise ValueError(
+            f"Invalid `folders_per_account`: {folders_per_account}. "
+            "`folders_per_account` must be greater than or equal to 1."
+        )
+
+    results: queue.Queue[FolderSearchResult | None] = queue.Queue()
+    cancelled = threading.Event()
+    lanes_lock = threading.Lock()
+    running_lanes = 0
+    # Folders that are being searched, to report them if they time out.
+    in_flight: dict[tuple[str, str], None] = {}
+
+    def start_lane(target: Callable[[_AccountSearch], None], account_search: _AccountSearch) -> None:
+        nonlocal running_lanes
+        with lanes_lock:
+            running_lanes += 1
+        threading.Thread(target=target, args=(account_search,), daemon=True).start()
+
+    def search_folders(account_search: _AccountSearch) -> None:
+        try:
+            while not cancelled.is_set():
+                folder = account_search.next_folder()
+                if folder is None:
+                    return
+                with lanes_lock:
+                    in_flight[(account_search.account, folder)] = None
+                try:
+                    mailbox = search_folder(account_search.account, folder)
+                    result = FolderSearchResult(
+                        account_search.account,
+                        mailbox.folder or folder,
+                        sorted(mailbox.emails, key=lambda email: get_timestamp(email.date), reverse=True)
+                    )
+                except Exception as e:
+                    result = FolderSearchResult(account_search.account, folder, error=str(e))
+                with lanes_lock:
+                    in_flight.pop((account_search.account, folder), None)
+                results.put(result)
+        finally:
+            # Lane is done, its results are all put before this.
+            results.put(None)
+
+    def search_account(account_search: _AccountSearch) -> None:
+        if account_search.folders is None:
+            try:
+                folders = resolve_folders(account_search.account)
+            except Exception as e:
+                with account_search.lock:
+                    account_search.folders = deque()
+                results.put(FolderSearchResult(account_search.account, "", error=str(e)))
+                results.put(None)
+                return
+            with account_search.lock:
+                account_search.folders = deque(folders)
+
+        # This thread is one of the lanes of the account too.
+        for _ in range(min(folders_per_account, len(account_search.folders)) - 1):
+            start_lane(search_folders, account_search)
+        search_folders(account_search)
+
+    account_searches = [_AccountSearch(account, folders) for account, folders in targets.items()]
+    for account_search in account_searches:
+        start_lane(search_account, account_search)
+
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            with lanes_lock:
+                if running_lanes == 0:
+                    return
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise queue.Empty
+                result = results.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if result is None:
+                with lanes_lock:
+                    running_lanes -= 1
+                continue
+            yield result
+
+        cancelled.set()
+        timed_out_error = f"Timed out after {timeout} seconds."
+        with lanes_lock:
+            timed_out = list(in_flight)
+        for account_search in account_searches:
+            with account_search.lock:
+                if account_search.folders is None:
+                    timed_out.append((account_search.account, ""))
+                else:
+                    timed_out.extend((account_search.account, folder) for folder in account_search.folders)
+        for account, folder in timed_out:
+            yield FolderSearchResult(account, folder, error=timed_out_error)
+    finally:
+        # Searches in flight finish in the background, no more folders
+        # are searched after them.
+        cancelled.set()
+
+__all__ = [
+    "iter_federated_search",
+    "FolderSearchResult",
+    "FEDERATED_SEARCH_FOLDERS_PER_ACCOUNT",
+    "FEDERATED_SEARCH_TIMEOUT",
+]
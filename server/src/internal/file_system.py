@@ -177,6 +177,26 @@ class DirObject:
         walk(self.children)
         return node_list
 
+def fsync_dir(path: str) -> None:
+    """Flush the entries of the directory, so a rename in it survives a crash."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def write_durably(path: str, content: bytes) -> None:
+    """Write the file and return after its content is flushed to disk."""
+    with open(path, "wb") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+
 class Root(DirObject):
     def __init__(self, name: str, parent: str = ROOT_DIR):
         """Initialize root directory at the specified parent path."""
@@ -187,5 +207,7 @@ class Root(DirObject):
 __all__ = [
     "Root",
     "DirObject",
-    "FileObject"
+    "FileObject",
+    "fsync_dir",
+    "write_durably",
 ]
@@ -0,0 +1,500 @@
+"""
+Outbox
+Persistent outbound queue. Emails to send/reply/forward are spooled
+under `~/.openmail/outbox` before the request returns and delivered by
+a background worker per account. Failed deliveries are retried with
+backoff, and every status change is published to the subscribers of
+the account, like the notification stream.
+
+Every job is a directory containing `job.json` and the attachments
+of the draft. Jobs are written to a temporary directory first and then
+renamed, so a crash never leaves a half written job behind.
+"""
+from __future__ import annotations
+import os
+import json
+import time
+import queue
+import copy
+import base64
+import shutil
+import smtplib
+import threading
+from enum import Enum
+from dataclasses import dataclass, field, asdict
+
+from src.internal.file_system import Root, DirObject, fsync_dir, write_durably
+from src.internal.client_handler import ClientHandler
+from src.modules.openmail.types import Draft, Attachment
+from src.modules.openmail.smtp import SMTPDeliveryUnknownException
+from src.modules.openmail.search_index import get_search_index
+from src.modules.openmail.conversations import get_references, parse_message_ids
+from src.utils import calculate_backoff, generate_random_id
+
+client_handler = ClientHandler()
+
+"""
+Errors
+"""
+class OutboxJobNotFound(Exception):
+    def __init__(self, msg: str = "Outbox job could not be found.", *args, **kwargs):
+        super().__init__(msg, *args, **kwargs)
+
+class OutboxDeliveryFailed(Exception):
+    def __init__(self, msg: str = "Email could not be delivered.", *args, **kwargs):
+        super().__init__(msg, *args, **kwargs)
+
+"""
+Enums, Types
+"""
+class OutboxJobKind(str, Enum):
+    Send = "send"
+    Reply = "reply"
+    Forward = "forward"
+
+    def __str__(self) -> str:
+        return self.value
+
+class OutboxJobStatus(str, Enum):
+    Queued = "queued"
+    Sending = "sending"
+    Retrying = "retrying"
+    Sent = "sent"
+    Failed = "failed"
+
+    def __str__(self) -> str:
+        return self.value
+
+@dataclass
+class OutboxJob:
+    id: str
+    account: str
+    kind: OutboxJobKind
+    draft: Draft
+    original_message_id: str = ""
+    status: OutboxJobStatus = OutboxJobStatus.Queued
+    attempt: int = 0
+    created_at: float = field(default_factory=time.time)
+    next_attempt_at: float = 0
+    last_error: str = ""
+
+    def to_dict(self) -> dict:
+        job = asdict(self)
+        job["kind"] = str(self.kind)
+        job["status"] = str(self.status)
+        return job
+
+    @classmethod
+    def from_dict(cls, job: dict) -> OutboxJob:
+        draft = dict(job["draft"])
+        draft["attachments"] = [
+            Attachment(**attachment) for attachment in draft.get("attachments") or []
+        ]
+        return cls(**{
+            **job,
+            "kind": OutboxJobKind(job["kind"]),
+            "status": OutboxJobStatus(job["status"]),
+            "draft": Draft(**draft),
+        })
+
+    def to_status(self) -> dict:
+        """Summary of the job to be published to the subscribers."""
+        return {
+            "id": self.id,
+            "kind": str(self.kind),
+            "status": str(self.status),
+            "subject": self.draft.subject,
+            "attempt": self.attempt,
+            "next_attempt_at": self.next_attempt_at,
+            "last_error": self.last_error,
+        }
+
+"""
+Constants
+"""
+JOB_FILENAME = "job.json"
+ATTACHMENTS_DIRNAME = "attachments"
+TEMP_SUFFIX = ".tmp"
+OUTBOX_MAX_ATTEMPTS = 8
+# Timers in seconds
+OUTBOX_BACKOFF_BASE = 30
+OUTBOX_BACKOFF_CAP = 60 * 60
+OUTBOX_MIN_RETRY_DELAY = 1
+OUTBOX_CONNECTION_RETRY_DELAY = 15
+JOIN_TIMEOUT = 5
+
+def _link_or_copy(source: str, destination: str) -> None:
+    """Hard link the file if possible, it is copied across file systems."""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+        with open(destination, "rb+") as f:
+            os.fsync(f.fileno())
+
+def is_permanent_failure(err: BaseException) -> bool:
+    """
+    Check if retrying the delivery can not change the result, like a
+    rejected recipient, or must not be done since the email may be
+    delivered already.
+    """
+    for e in (err, err.__cause__):
+        if isinstance(e, (
+            smtplib.SMTPRecipientsRefused,
+            smtplib.SMTPAuthenticationError,
+            SMTPDeliveryUnknownException,
+        )):
+            return True
+        if (
+            isinstance(e, (smtplib.SMTPSenderRefused, smtplib.SMTPDataError))
+            and 500 <= e.smtp_code < 600
+        ):
+            return True
+    return False
+
+class OutboxSpool:
+    """Jobs of the outbox on disk, one directory per account under `root`."""
+    def __init__(self, root: DirObject):
+        self._root = root
+        self._lock = threading.RLock()
+
+    def _get_account_dir(self, account: str) -> str:
+        return os.path.join(self._root.fullpath, account)
+
+    def _get_job_dir(self, account: str, job_id: str) -> str:
+        return os.path.join(self._get_account_dir(account), job_id)
+
+    def get_accounts(self) -> list[str]:
+        if not os.path.exists(self._root.fullpath):
+            return []
+        return [
+            item.name for item in os.scandir(self._root.fullpath) if item.is_dir()
+        ]
+
+    def recover(self) -> None:
+        """Remove jobs that were being written while the app crashed."""
+        with self._lock:
+            for account in self.get_accounts():
+                for item in os.scandir(self._get_account_dir(account)):
+                    if item.name.endswith(TEMP_SUFFIX):
+                        shutil.rmtree(item.path, ignore_errors=True)
+
+    def add(
+        self,
+        account: str,
+        kind: OutboxJobKind,
+        draft: Draft,
+        original_message_id: str = ""
+    ) -> OutboxJob:
+        """
+        Write the job to disk and return it after it is durably stored.
+        Attachment data is moved to files next to the job, so `job.json`
+        only keeps their paths. Attachments that are already files, like
+        uploads, are linked next to the job so the job does not depend on
+        the original file being kept.
+        """
+        job = OutboxJob(
+            id=generate_random_id(),
+            account=account,
+            kind=kind,
+            draft=draft,
+            original_message_id=original_message_id,
+        )
+        account_dir = self._get_account_dir(account)
+        job_dir = self._get_job_dir(account, job.id)
+        temp_dir = job_dir + TEMP_SUFFIX
+        os.makedirs(os.path.join(temp_dir, ATTACHMENTS_DIRNAME), exist_ok=True)
+        try:
+            attachments = []
+            for i, attachment in enumerate(draft.attachments or []):
+                filename = os.path.join(ATTACHMENTS_DIRNAME, str(i))
+                is_stored = True
+                if attachment.data:
+                    data = attachment.data
+                    if isinstance(data, str):
+                        data = base64.b64decode(data)
+                    write_durably(os.path.join(temp_dir, filename), data)
+                elif attachment.path and os.path.isfile(attachment.path):
+                    _link_or_copy(attachment.path, os.path.join(temp_dir, filename))
+                else:
+                    is_stored = False
+                if is_stored:
+                    attachment = Attachment(
+                        name=attachment.name,
+                        size=attachment.size,
+                        type=attachment.type,
+                        path=os.path.join(job_dir, filename),
+                        cid=attachment.cid,
+                    )
+                attachments.append(attachment)
+            job.draft = Draft(**{**asdict(draft), "attachments": attachments})
+
+            write_durably(
+                os.path.join(temp_dir, JOB_FILENAME),
+                json.dumps(job.to_dict()).encode("utf-8")
+            )
+            fsync_dir(os.path.join(temp_dir, ATTACHMENTS_DIRNAME))
+            fsync_dir(temp_dir)
+            os.rename(temp_dir, job_dir)
+            fsync_dir(account_dir)
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+
+        return job
+
+    def save(self, job: OutboxJob) -> None:
+        """Replace `job.json` of the job atomically."""
+        job_dir = self._get_job_dir(job.account, job.id)
+        if not os.path.exists(job_dir):
+            raise OutboxJobNotFound
+        temp_path = os.path.join(job_dir, JOB_FILENAME + TEMP_SUFFIX)
+        write_durably(temp_path, json.dumps(job.to_dict()).encode("utf-8"))
+        os.replace(temp_path, os.path.join(job_dir, JOB_FILENAME))
+
+    def get(self, account: str, job_id: str) -> OutboxJob:
+        job_path = os.path.join(self._get_job_dir(account, job_id), JOB_FILENAME)
+        try:
+            with open(job_path, "r", encoding="utf-8") as f:
+                return OutboxJob.from_dict(json.load(f))
+        except FileNotFoundError:
+            raise OutboxJobNotFound from None
+
+    def get_all(self, account: str) -> list[OutboxJob]:
+        """Jobs of the account in the order they were queued."""
+        account_dir = self._get_account_dir(account)
+        if not os.path.exists(account_dir):
+            return []
+
+        jobs = []
+        for item in os.scandir(account_dir):
+            if not item.is_dir() or item.name.endswith(TEMP_SUFFIX):
+                continue
+            try:
+                jobs.append(self.get(account, item.name))
+            except Exception as e:
+                print(f"Outbox job `{item.path}` could not be loaded: {str(e)}")
+        return sorted(jobs, key=lambda job: (job.created_at, job.id))
+
+    def remove(self, account: str, job_id: str) -> None:
+        job_dir = self._get_job_dir(account, job_id)
+        if not os.path.exists(job_dir):
+            raise OutboxJobNotFound
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+class Outbox:
+    _instance = None
+    _spool: OutboxSpool
+    _lock: threading.RLock
+    _workers: dict[str, tuple[threading.Thread, threading.Event]]
+    _subscribers: dict[str, list[queue.SimpleQueue]]
+    _release_event: threading.Event
+
+    def __new__(cls):
+        if not cls._instance:
+            cls._instance = super().__new__(cls)
+            cls._instance._spool = OutboxSpool(Root("outbox"))
+            cls._instance._lock = threading.RLock()
+            cls._instance._workers = {}
+            cls._instance._subscribers = {}
+            cls._instance._release_event = threading.Event()
+
+        return cls._instance
+
+    def start(self) -> None:
+        """Recover the spool and start workers of the accounts that have pending jobs."""
+        self._release_event.clear()
+        self._spool.recover()
+        for account in self._spool.get_accounts():
+            self._wake_worker(account)
+
+    def shutdown(self) -> None:
+        self._release_event.set()
+        with self._lock:
+            workers = list(self._workers.values())
+            self._workers.clear()
+        for thread, wake_event in workers:
+            wake_event.set()
+            thread.join(timeout=JOIN_TIMEOUT)
+
+    def enqueue(
+        self,
+        account: str,
+        kind: OutboxJobKind,
+        draft: Draft,
+        original_message_id: str = ""
+    ) -> OutboxJob:
+        """Durably queue the draft, it is going to be delivered in the background."""
+        job = self._spool.add(account, kind, draft, original_message_id)
+        self._publish(job)
+        self._wake_worker(account)
+        return job
+
+    def get_jobs(self, account: str) -> list[OutboxJob]:
+        return self._spool.get_all(account)
+
+    def discard(self, account: str, job_id: str) -> None:
+        """Remove a job that is waiting or has failed."""
+        with self._lock:
+            self._spool.remove(account, job_id)
+
+    def subscribe(self, account: str) -> queue.SimpleQueue:
+        """Returns a queue that receives status of every job of the account."""
+        subscriber = queue.SimpleQueue()
+        with self._lock:
+            self._subscribers.setdefault(account, []).append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, account: str, subscriber: queue.SimpleQueue) -> None:
+        with self._lock:
+            try:
+                self._subscribers.get(account, []).remove(subscriber)
+            except ValueError:
+                pass
+
+    def _publish(self, job: OutboxJob) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(job.account, []))
+        status = job.to_status()
+        for subscriber in subscribers:
+            subscriber.put(status)
+
+    def _wake_worker(self, account: str) -> None:
+        with self._lock:
+            if self._release_event.is_set():
+                return
+            worker = self._workers.get(account)
+            if worker and worker[0].is_alive():
+                worker[1].set()
+                return
+            wake_event = threading.Event()
+            thread = threading.Thread(
+                target=self._run_worker, args=(account, wake_event), daemon=True
+            )
+            self._workers[account] = (thread, wake_event)
+            thread.start()
+
+    def _run_worker(self, account: str, wake_event: threading.Event) -> None:
+        while not self._release_event.is_set():
+            try:
+                delay = self._deliver_next(account)
+            except Exception as e:
+                print(f"Unexpected error in outbox worker of {account}: {str(e)}")
+                delay = OUTBOX_CONNECTION_RETRY_DELAY
+
+            if delay is None:
+                with self._lock:
+                    # Nothing left, worker is started again on the next enqueue.
+                    if not wake_event.is_set():
+                        self._workers.pop(account, None)
+                        return
+                wake_event.clear()
+                continue
+            if delay <= 0:
+                continue
+
+            wake_event.wait(timeout=delay)
+            wake_event.clear()
+
+    def _deliver_next(self, account: str) -> float | None:
+        """
+        Deliver the next due job of the account.
+
+        Returns:
+            float | None: Seconds to wait before the next call, None
+            if there is no job waiting to be delivered.
+        """
+        with self._lock:
+            jobs = [
+                job for job in self._spool.get_all(account)
+                if job.status != OutboxJobStatus.Failed
+            ]
+        if not jobs:
+            return None
+
+        now = time.time()
+        due_jobs = [job for job in jobs if job.next_attempt_at <= now]
+        if not due_jobs:
+            return min(job.next_attempt_at for job in jobs) - now
+
+        if not (
+            client_handler.is_client_exists(account)
+            and client_handler.is_connection_available(account)
+        ):
+            return OUTBOX_CONNECTION_RETRY_DELAY
+
+        job = due_jobs[0]
+        job.status = OutboxJobStatus.Sending
+        self._publish(job)
+        try:
+            self._deliver(job)
+        except Exception as e:
+            job.attempt += 1
+            job.last_error = str(e)
+            if is_permanent_failure(e) or job.attempt >= OUTBOX_MAX_ATTEMPTS:
+                job.status = OutboxJobStatus.Failed
+            else:
+                job.status = OutboxJobStatus.Retrying
+                job.next_attempt_at = time.time() + max(
+                    calculate_backoff(job.attempt, OUTBOX_BACKOFF_BASE, OUTBOX_BACKOFF_CAP),
+                    OUTBOX_MIN_RETRY_DELAY
+                )
+            with self._lock:
+                try:
+                    self._spool.save(job)
+                except OutboxJobNotFound:
+                    # Discarded while being delivered.
+                    return 0
+            self._publish(job)
+            return 0
+
+        with self._lock:
+            try:
+                self._spool.remove(account, job.id)
+            except OutboxJobNotFound:
+                pass
+        job.status = OutboxJobStatus.Sent
+        self._publish(job)
+        return 0
+
+    def _get_draft(self, job: OutboxJob) -> Draft:
+        """
+        Draft of the job. Replies and forwards also refer to the ancestors
+        of the original email, found in the local index by its Message-ID,
+        so they join its conversation in the clients of the receivers too.
+        """
+        if job.kind == OutboxJobKind.Send or not job.original_message_id:
+            return job.draft
+
+        search_index = get_search_index(job.account)
+        for location in search_index.locate(job.original_message_id):
+            original_email = search_index.get_email(location.folder, location.uid)
+            if original_email is None:
+                continue
+            draft = copy.copy(job.draft)
+            draft.references = " ".join(dict.fromkeys(
+                get_references(original_email) + parse_message_ids(job.draft.references)
+            ))
+            return draft
+        return job.draft
+
+    def _deliver(self, job: OutboxJob) -> None:
+        smtp = client_handler.get_client(job.account).smtp
+        if job.kind == OutboxJobKind.Reply:
+            status, msg = smtp.reply_email(job.original_message_id, self._get_draft(job))
+        elif job.kind == OutboxJobKind.Forward:
+            status, msg = smtp.forward_email(job.original_message_id, self._get_draft(job))
+        else:
+            status, msg = smtp.send_email(job.draft)
+
+        if not status:
+            raise OutboxDeliveryFailed(msg)
+
+__all__ = [
+    "Outbox",
+    "OutboxSpool",
+    "OutboxJob",
+    "OutboxJobKind",
+    "OutboxJobStatus",
+    "OutboxJobNotFound",
+]
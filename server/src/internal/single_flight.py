@@ -0,0 +1,166 @@
+"""
+SingleFlight
+Coalesces identical reads of an account that run at the same time. The
+first call of a key runs the operation, the calls that arrive while it
+is in flight wait for it and share its result, or its error, instead of
+sending the same commands to the server again.
+
+Results can optionally be kept for a short time after the call is done,
+so duplicates that arrive right after it are answered from memory too.
+Kept results of an account are dropped with `invalidate` whenever the
+account is modified.
+"""
+from __future__ import annotations
+import json
+import time
+import threading
+from dataclasses import dataclass, asdict, is_dataclass
+from typing import Any, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+"""
+Types
+"""
+@dataclass
+class SingleFlightStats:
+    operation: str
+    calls: int = 0
+    # Calls that ran the operation.
+    executions: int = 0
+    # Calls that joined a call in flight.
+    coalesced: int = 0
+    # Calls that are answered from a kept result.
+    cached: int = 0
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Exception | None = None
+
+def _normalize_arg(arg: Any) -> Hashable:
+    if arg is None or arg == "":
+        return ""
+    if isinstance(arg, str):
+        return arg.strip()
+    if isinstance(arg, (int, float, bool)):
+        return arg
+    return json.dumps(
+        asdict(arg) if is_dataclass(arg) and not isinstance(arg, type) else arg,
+        sort_keys=True,
+        default=str
+    )
+
+class SingleFlight:
+    _instance = None
+    _lock: threading.Lock
+    _flights: dict[tuple, _Flight]
+    _results: dict[tuple, tuple[float, Any]]
+    _stats: dict[str, SingleFlightStats]
+
+    def __new__(cls):
+        if not cls._instance:
+            cls._instance = super().__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._flights = {}
+            cls._instance._results = {}
+            cls._instance._stats = {}
+
+        return cls._instance
+
+    @staticmethod
+    def make_key(account: str, operation: str, *args: Any) -> tuple:
+        """
+        Key of the call, `None` and empty strings are the same and
+        dataclasses like `SearchCriteria` are compared by their fields.
+        """
+        return (account.lower(), operation, *map(_normalize_arg, args))
+
+    def run(
+        self,
+        account: str,
+        operation: str,
+        args: tuple,
+        func: Callable[[], T],
+        ttl: float = 0
+    ) -> T:
+        """
+        Run `func` unless an identical call is in flight or its result
+        is kept, and return its result.
+
+        Args:
+            account (str): Email address of the account.
+            operation (str): Name of the operation, counters are kept per operation.
+            args (tuple): Arguments of the operation, see `make_key`.
+            func (Callable[[], T]): Runs the operation.
+            ttl (float, optional): Seconds to keep the result after the
+            call is done. Defaults to 0, the result is not kept.
+        """
+        key = self.make_key(account, operation, *args)
+        with self._lock:
+            stats = self._stats.setdefault(operation, SingleFlightStats(operation))
+            stats.calls += 1
+            kept = self._results.get(key)
+            if kept and kept[0] > time.monotonic():
+                stats.cached += 1
+                return kept[1]
+
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._flights[key] = _Flight()
+                stats.executions += 1
+            else:
+                stats.coalesced += 1
+
+        if not is_leader:
+            flight.done.wait()
+            if flight.error:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                # Invalidated while in flight, result may be stale.
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                    if flight.error is None and ttl > 0:
+                        self._remove_expired_results()
+                        self._results[key] = (time.monotonic() + ttl, flight.result)
+            flight.done.set()
+
+        return flight.result
+
+    def invalidate(self, account: str) -> None:
+        """
+        Drop the kept results of the account. Calls in flight are not
+        joined anymore, the ones that arrive after this run again.
+        """
+        account = account.lower()
+        with self._lock:
+            for key in [key for key in self._results if key[0] == account]:
+                del self._results[key]
+            for key in [key for key in self._flights if key[0] == account]:
+                del self._flights[key]
+
+    def _remove_expired_results(self) -> None:
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _) in self._results.items() if expires_at <= now]:
+            del self._results[key]
+
+    def get_stats(self) -> list[SingleFlightStats]:
+        with self._lock:
+            return [SingleFlightStats(**asdict(stats)) for stats in self._stats.values()]
+
+__all__ = [
+    "SingleFlight",
+    "SingleFlightStats",
+]
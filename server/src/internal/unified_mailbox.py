@@ -0,0 +1,195 @@
+"""
+UnifiedMailbox
+Combines a folder of several accounts into a single mailbox, newest
+first. Accounts are queried at the same time and each one fetches only
+its newest `limit` emails older than its own cursor. The pages are then
+merged by date with a heap, so a unified page takes as long as the
+slowest account instead of the sum of them all.
+
+Accounts that fail or do not answer within `UNIFIED_MAILBOX_TIMEOUT`
+are reported and left out of the page. Their cursors are not advanced,
+so their emails are picked up by the next page.
+"""
+from __future__ import annotations
+import json
+import heapq
+import base64
+import binascii
+import concurrent.futures
+from dataclasses import dataclass, field
+from typing import Callable, Iterator
+
+from src.modules.openmail.types import Email, Mailbox
+from src.modules.openmail.utils import get_timestamp
+
+"""
+Types
+"""
+@dataclass
+class UnifiedEmail:
+    account: str
+    email: Email
+
+@dataclass
+class UnifiedMailbox:
+    folder: str
+    # Emails of all the accounts, newest first.
+    emails: list[UnifiedEmail]
+    # Number of the emails in the folder of each account.
+    totals: dict[str, int] = field(default_factory=dict)
+    # Accounts that are left out of the page, with their errors.
+    failed: dict[str, str] = field(default_factory=dict)
+    # Cursor of the next page, empty if every account is exhausted.
+    cursor: str = ""
+
+"""
+Constants
+"""
+# Timers in seconds
+UNIFIED_MAILBOX_TIMEOUT = 10
+
+def encode_cursor(cursors: dict[str, str | None]) -> str:
+    """
+    Encode the cursor of each account, the uid of its oldest email that
+    is returned so far, an empty string if none of its emails is
+    returned yet, or None if it has no more emails.
+    """
+    if not cursors or all(uid is None for uid in cursors.values()):
+        return ""
+    return base64.urlsafe_b64encode(
+        json.dumps(cursors, sort_keys=True).encode("utf-8")
+    ).decode("ascii")
+
+def decode_cursor(cursor: str) -> dict[str, str | None]:
+    """
+    Decode the cursors of the accounts encoded with `encode_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    if not cursor:
+        return {}
+    try:
+        cursors = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: `{cursor}`.") from e
+    if not isinstance(cursors, dict) or not all(
+        uid is None or (isinstance(uid, str) and (uid == "" or uid.isdigit()))
+        for uid in cursors.values()
+    ):
+        raise ValueError(f"Invalid cursor: `{cursor}`.")
+    return cursors
+
+def _merge_by_date(mailboxes: dict[str, Mailbox]) -> Iterator[UnifiedEmail]:
+    """
+    Merge the emails of the accounts, newest first. Emails of each
+    account keep their order, so the emails taken from an account are
+    always the newest ones of its page, and its cursor can be moved to
+    the last of them.
+    """
+    return heapq.merge(
+        *(
+            [UnifiedEmail(account, email) for email in mailbox.emails]
+            for account, mailbox in mailboxes.items()
+        ),
+        key=lambda unified_email: -get_timestamp(unified_email.email.date)
+    )
+
+def get_unified_mailbox(
+    accounts: list[str],
+    fetch_page: Callable[[str, str | None, int], Mailbox],
+    limit: int,
+    cursor: str = "",
+    timeout: float = UNIFIED_MAILBOX_TIMEOUT
+) -> UnifiedMailbox:
+    """
+    Fetch the newest `limit` emails of the accounts that are older than
+    the ones returned with `cursor`.
+
+    Args:
+        accounts (list[str]): Email addresses of the accounts.
+        fetch_page (Callable[[str, str | None, int], Mailbox]): Fetches
+        the newest emails of an account, called with the account, the
+        uid the emails must be older than, or None for the newest ones,
+        and the number of emails, see `IMAPManager.get_emails_before`.
+        limit (int): Number of the emails of the page.
+        cursor (str, optional): Cursor of the previous page. Defaults to
+        the first page.
+        timeout (float, optional): Seconds to wait for the accounts.
+        Defaults to UNIFIED_MAILBOX_TIMEOUT.
+
+    Raises:
+        ValueError: If `limit` is less than 1 or `cursor` is malformed.
+
+    Example:
+        >>> get_unified_mailbox(["a@gmail.com", "b@outlook.com"], fetch_page, 2)
+        UnifiedMailbox(folder='INBOX', emails=[UnifiedEmail(account='b@outlook.com', ...),
+        UnifiedEmail(account='a@gmail.com', ...)], totals={'a@gmail.com': 120, 'b@outlook.com': 48},
+        failed={}, cursor='eyJhQGdtYWlsLmNvbSI6ICIxMjAiLC...')
+    """
+    if limit < 1:
+        raise ValueError(f"Invalid `limit`: {limit}. `limit` must be greater than or equal to 1.")
+
+    cursors = decode_cursor(cursor)
+    # Accounts of the previous pages that have no more emails are skipped.
+    accounts = [
+        account for account in dict.fromkeys(accounts)
+        if not (account in cursors and cursors[account] is None)
+    ]
+    unified_mailbox = UnifiedMailbox(folder="", emails=[])
+    if not accounts:
+        return unified_mailbox
+
+    mailboxes: dict[str, Mailbox] = {}
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(accounts))
+    try:
+        future_to_account = {
+            executor.submit(fetch_page, account, cursors.get(account) or None, limit): account
+            for account in accounts
+        }
+        done, not_done = concurrent.futures.wait(future_to_account, timeout)
+        for future in not_done:
+            unified_mailbox.failed[future_to_account[future]] = f"Timed out after {timeout} seconds."
+        for future in done:
+            account = future_to_account[future]
+            try:
+                mailboxes[account] = future.result()
+            except Exception as e:
+                unified_mailbox.failed[account] = str(e)
+    finally:
+        # Slow accounts finish in the background, the page does not wait for them.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    # Order of the accounts is kept for the emails of the same date.
+    mailboxes = {account: mailboxes[account] for account in accounts if account in mailboxes}
+    unified_mailbox.emails = [
+        unified_email for unified_email, _ in zip(_merge_by_date(mailboxes), range(limit))
+    ]
+    unified_mailbox.folder = next((mailbox.folder for mailbox in mailboxes.values()), "")
+    unified_mailbox.totals = {account: mailbox.total for account, mailbox in mailboxes.items()}
+
+    # Accounts that failed keep their cursors, or start from their
+    # newest emails if they have none yet.
+    next_cursors = {**cursors, **{account: cursors.get(account, "") for account in accounts}}
+    for account, mailbox in mailboxes.items():
+        taken = [
+            unified_email.email for unified_email in unified_mailbox.emails
+            if unified_email.account == account
+        ]
+        if taken:
+            next_cursors[account] = taken[-1].uid
+        # Fewer emails than asked for, the account has no more emails
+        # once all of them are taken.
+        if len(taken) == len(mailbox.emails) and len(mailbox.emails) < limit:
+            next_cursors[account] = None
+    unified_mailbox.cursor = encode_cursor(next_cursors)
+    return unified_mailbox
+
+__all__ = [
+    "UnifiedMailbox",
+    "UnifiedEmail",
+    "get_unified_mailbox",
+    "encode_cursor",
+    "decode_cursor",
+    "UNIFIED_MAILBOX_TIMEOUT",
+]
@@ -0,0 +1,297 @@
+"""
+UploadSpool
+Resumable upload sessions for outgoing attachments. A session is created
+with the name, type and size of the file, its content is uploaded in
+chunks at given offsets and the session is finalized once every byte is
+received. Finalized uploads are referenced by their id while sending,
+replying, forwarding or saving a draft, and their content is streamed
+from disk, so it is never held in memory as a whole.
+
+Every session is a directory under `~/.openmail/uploads` containing
+`meta.json` and the received content. The number of received bytes is
+the size of the content file, so an interrupted upload is resumed from
+where it was left without any bookkeeping.
+"""
+from __future__ import annotations
+import os
+import json
+import time
+import shutil
+import threading
+from typing import BinaryIO, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+
+from src.internal.file_system import DirObject, fsync_dir, write_durably
+from src.modules.openmail.types import Attachment
+from src.utils import generate_random_id
+
+"""
+Errors
+"""
+class UploadSessionNotFound(Exception):
+    def __init__(self, msg: str = "Upload session could not be found.", *args, **kwargs):
+        super().__init__(msg, *args, **kwargs)
+
+class UploadSessionBusy(Exception):
+    def __init__(self, msg: str = "Another chunk of the upload session is being uploaded.", *args, **kwargs):
+        super().__init__(msg, *args, **kwargs)
+
+class UploadOffsetMismatch(Exception):
+    def __init__(self, msg: str = "Chunk offset does not match the received size of the upload.", *args, **kwargs):
+        super().__init__(msg, *args, **kwargs)
+
+class UploadSizeExceeded(Exception):
+    def __init__(self, msg: str = "Chunk exceeds the declared size of the upload.", *args, **kwargs):
+        super().__init__(msg, *args, **kwargs)
+
+class UploadNotFinalized(Exception):
+    def __init__(self, msg: str = "Upload is not finalized yet.", *args, **kwargs):
+        super().__init__(msg, *args, **kwargs)
+
+"""
+Types
+"""
+@dataclass
+class UploadSession:
+    id: str
+    name: str
+    type: str
+    size: int
+    received: int = 0
+    is_finalized: bool = False
+    created_at: float = field(default_factory=time.time)
+
+    def to_dict(self) -> dict:
+        """Fields that are stored in `meta.json`, `received` is read from the content."""
+        session = asdict(self)
+        session.pop("received")
+        return session
+
+    @classmethod
+    def from_dict(cls, session: dict, received: int = 0) -> UploadSession:
+        return cls(**session, received=received)
+
+    def to_status(self) -> dict:
+        return asdict(self)
+
+"""
+Constants
+"""
+META_FILENAME = "meta.json"
+CONTENT_FILENAME = "content"
+TEMP_SUFFIX = ".tmp"
+COPY_CHUNK_SIZE = 1024 * 1024 # 1MB
+# Timers in seconds
+UPLOAD_EXPIRY = 24 * 60 * 60
+
+class UploadChunkWriter:
+    """Writes a chunk of an upload session, see `UploadSpool.open_chunk`."""
+    def __init__(self, file: BinaryIO, offset: int, limit: int):
+        self._file = file
+        self._position = offset
+        self._limit = limit
+
+    @property
+    def position(self) -> int:
+        return self._position
+
+    def write(self, data: bytes) -> None:
+        if self._position + len(data) > self._limit:
+            raise UploadSizeExceeded
+        self._file.write(data)
+        self._position += len(data)
+
+class UploadSpool:
+    """Upload sessions on disk, one directory per session under `root`."""
+    def __init__(self, root: DirObject):
+        self._root = root
+        self._lock = threading.RLock()
+        self._writing: set[str] = set()
+
+    def _get_session_dir(self, upload_id: str) -> str:
+        if not upload_id or os.path.basename(upload_id) != upload_id:
+            raise UploadSessionNotFound
+        return os.path.join(self._root.fullpath, upload_id)
+
+    def _get_content_path(self, upload_id: str) -> str:
+        return os.path.join(self._get_session_dir(upload_id), CONTENT_FILENAME)
+
+    def create(self, name: str, type: str, size: int) -> UploadSession:
+        """Create an empty upload session and remove the expired ones."""
+        if size < 0:
+            raise ValueError(f"Invalid upload size: {size}")
+
+        self.remove_expired()
+        session = UploadSession(
+            id=generate_random_id(),
+            name=name,
+            type=type or "application/octet-stream",
+            size=size,
+        )
+        session_dir = self._get_session_dir(session.id)
+        temp_dir = session_dir + TEMP_SUFFIX
+        os.makedirs(temp_dir, exist_ok=True)
+        try:
+            write_durably(os.path.join(temp_dir, CONTENT_FILENAME), b"")
+            write_durably(
+                os.path.join(temp_dir, META_FILENAME),
+                json.dumps(session.to_dict()).encode("utf-8")
+            )
+            fsync_dir(temp_dir)
+            os.rename(temp_dir, session_dir)
+            fsync_dir(self._root.fullpath)
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+
+        return session
+
+    def add_file(self, name: str, type: str, file: BinaryIO) -> UploadSession:
+        """
+        Create a finalized upload session from a file object, copied
+        chunk by chunk. Used for attachments that are not uploaded in
+        chunks, like the ones sent within a form.
+        """
+        session = self.create(name, type, 0)
+        try:
+            content_path = self._get_content_path(session.id)
+            with open(content_path, "wb") as f:
+                shutil.copyfileobj(file, f, COPY_CHUNK_SIZE)
+                f.flush()
+                os.fsync(f.fileno())
+            session.size = os.path.getsize(content_path)
+            session.is_finalized = True
+            self._save(session)
+        except Exception:
+            self.remove(session.id)
+            raise
+
+        return self.get(session.id)
+
+    def _save(self, session: UploadSession) -> None:
+        """Replace `meta.json` of the session atomically."""
+        session_dir = self._get_session_dir(session.id)
+        temp_path = os.path.join(session_dir, META_FILENAME + TEMP_SUFFIX)
+        write_durably(temp_path, json.dumps(session.to_dict()).encode("utf-8"))
+        os.replace(temp_path, os.path.join(session_dir, META_FILENAME))
+
+    def get(self, upload_id: str) -> UploadSession:
+        session_dir = self._get_session_dir(upload_id)
+        try:
+            with open(os.path.join(session_dir, META_FILENAME), "r", encoding="utf-8") as f:
+                return UploadSession.from_dict(
+                    json.load(f),
+                    os.path.getsize(os.path.join(session_dir, CONTENT_FILENAME))
+                )
+        except FileNotFoundError:
+            raise UploadSessionNotFound from None
+
+    @contextmanager
+    def open_chunk(self, upload_id: str, offset: int) -> Iterator[UploadChunkWriter]:
+        """
+        Open the content of the session to write a chunk starting from
+        `offset`. A chunk can start anywhere up to the received size, so
+        a chunk that was interrupted can be sent again. Content is
+        flushed to disk when the chunk is closed, also on errors, so the
+        received size always tells where to resume from.
+
+        Raises:
+            UploadSessionBusy: If another chunk of the session is open.
+            UploadOffsetMismatch: If `offset` is beyond the received size.
+        """
+        with self._lock:
+            if upload_id in self._writing:
+                raise UploadSessionBusy
+            session = self.get(upload_id)
+            if session.is_finalized:
+                raise UploadOffsetMismatch("Upload is already finalized.")
+            if offset < 0 or offset > session.received:
+                raise UploadOffsetMismatch(
+                    f"Chunk offset `{offset}` does not match the received size of the upload `{session.received}`."
+                )
+            self._writing.add(upload_id)
+
+        try:
+            with open(self._get_content_path(upload_id), "r+b") as f:
+                f.seek(offset)
+                try:
+                    yield UploadChunkWriter(f, offset, session.size)
+                finally:
+                    f.flush()
+                    os.fsync(f.fileno())
+        finally:
+            with self._lock:
+                self._writing.discard(upload_id)
+
+    def finalize(self, upload_id: str) -> UploadSession:
+        """
+        Mark the upload as complete, the content can not be changed
+        after this point.
+
+        Raises:
+            UploadNotFinalized: If some of the content is not received yet.
+        """
+        with self._lock:
+            if upload_id in self._writing:
+                raise UploadSessionBusy
+            session = self.get(upload_id)
+            if session.is_finalized:
+                return session
+            if session.received != session.size:
+                raise UploadNotFinalized(
+                    f"Upload is incomplete, {session.received} of {session.size} bytes are received."
+                )
+            session.is_finalized = True
+            self._save(session)
+            return session
+
+    def get_attachment(self, upload_id: str) -> Attachment:
+        """Attachment that is read from the content of a finalized upload."""
+        session = self.get(upload_id)
+        if not session.is_finalized:
+            raise UploadNotFinalized
+        return Attachment(
+            name=session.name,
+            size=session.size,
+            type=session.type,
+            path=self._get_content_path(upload_id),
+        )
+
+    def remove(self, upload_id: str) -> None:
+        session_dir = self._get_session_dir(upload_id)
+        if not os.path.exists(session_dir):
+            raise UploadSessionNotFound
+        shutil.rmtree(session_dir, ignore_errors=True)
+
+    def remove_expired(self) -> None:
+        """Remove sessions that are older than `UPLOAD_EXPIRY`, finalized or not."""
+        if not os.path.exists(self._root.fullpath):
+            return
+
+        expired_before = time.time() - UPLOAD_EXPIRY
+        with self._lock:
+            for item in os.scandir(self._root.fullpath):
+                if not item.is_dir() or item.name in self._writing:
+                    continue
+                try:
+                    if item.stat().st_mtime < expired_before and (
+                        item.name.endswith(TEMP_SUFFIX)
+                        or self.get(item.name).created_at < expired_before
+                    ):
+                        shutil.rmtree(item.path, ignore_errors=True)
+                except UploadSessionNotFound:
+                    shutil.rmtree(item.path, ignore_errors=True)
+                except Exception as e:
+                    print(f"Upload session `{item.path}` could not be checked for expiry: {str(e)}")
+
+__all__ = [
+    "UploadSpool",
+    "UploadSession",
+    "UploadChunkWriter",
+    "UploadSessionNotFound",
+    "UploadSessionBusy",
+    "UploadOffsetMismatch",
+    "UploadSizeExceeded",
+    "UploadNotFinalized",
+]
@@ -14,8 +14,11 @@ from fastapi.middleware.trustedhost import TrustedHostMiddleware
 
 from src.internal.client_handler import ClientHandler
 from src.internal.account_manager import AccountManager
+from src.internal.outbox import Outbox
+from src.internal.bulk_sender import BulkSender
 from src.internal.file_system import FileObject, Root
-from src.routers import account_tasks, mailbox_tasks
+from src.modules.openmail.search_index import set_search_index_dir
+from src.routers import account_tasks, mailbox_tasks, diagnostic_tasks
 from src.helpers.uvicorn_logger import UvicornLogger
 from src.helpers.port_scanner import PortScanner
 
@@ -30,6 +33,8 @@ WHITELISTED_IPS = DEFAULT_WHITELISTED_IPS
 
 client_handler = ClientHandler()
 account_manager = AccountManager()
+outbox = Outbox()
+bulk_sender = BulkSender()
 uvicorn_logger = UvicornLogger()
 
 
@@ -37,14 +42,18 @@ uvicorn_logger = UvicornLogger()
 async def lifespan(app: FastAPI):
     try:
         client_handler.create_openmail_clients()
+        outbox.start()
         yield
     finally:
+        bulk_sender.shutdown()
+        outbox.shutdown()
         client_handler.shutdown()
 
 
 app = FastAPI(lifespan=lifespan)
 app.include_router(account_tasks.router)
 app.include_router(mailbox_tasks.router)
+app.include_router(diagnostic_tasks.router)
 
 def setup_api_middlewares(**kwargs):
     app.add_middleware(
@@ -156,6 +165,8 @@ def main():
     uvicorn_info = FileObject("uvicorn.info")
     etc.append(uvicorn_info)
     uvicorn_info.write(f"URL=http://{host}:{str(port)}\nPID={pid}\n")
+    # Local search index of the accounts outlives the server.
+    set_search_index_dir(Root("index").fullpath)
 
     # Start server
     uvicorn_logger.info("Starting server at http://%s:%d | PID: %s", host, port, pid)
@@ -0,0 +1,173 @@
+"""
+Conversations
+Orders the emails of a conversation into a reply tree with the JWZ
+threading algorithm, see https://www.jwz.org/doc/threading.html, over
+their `Message-ID`, `In-Reply-To` and `References` headers.
+
+Which emails belong to the same conversation is kept incrementally by
+`SearchIndex` as the emails are indexed, so a conversation is threaded
+on its own emails instead of the whole mailbox.
+
+Primarily designed for use by the `SearchIndex` and `IMAPManager` classes.
+"""
+from __future__ import annotations
+import re
+from typing import Iterable
+
+from .types import ConversationEmail, Email
+from .utils import get_timestamp
+
+"""
+Custom consts
+"""
+MESSAGE_ID_PATTERN = re.compile(r"<[^<>\s]+>")
+# Prefixes of replies and forwards, like `Re:`, `Fwd:`, `AW:` or `Re[2]:`.
+REPLY_PREFIX_PATTERN = re.compile(r"^\s*(re|fwd?|aw|sv|antw)(\[\d+\])?\s*:\s*", re.IGNORECASE)
+
+def parse_message_ids(header: str | None) -> list[str]:
+    """
+    Get the message ids of a `Message-ID`, `In-Reply-To` or
+    `References` header, in order.
+
+    Example:
+        >>> parse_message_ids("<a@mail.com> <b@mail.com>")
+        ['<a@mail.com>', '<b@mail.com>']
+    """
+    return MESSAGE_ID_PATTERN.findall(header or "")
+
+def get_references(email: Email) -> list[str]:
+    """
+    Get the message ids of the ancestors of the email, the oldest first
+    and the parent last. `In-Reply-To` is used if `References` is missing
+    or does not end with it.
+    """
+    references = parse_message_ids(email.references)
+    in_reply_to = parse_message_ids(email.in_reply_to)
+    if in_reply_to and in_reply_to[0] not in references:
+        references.append(in_reply_to[0])
+    message_id = email.message_id.strip()
+    return [reference for reference in dict.fromkeys(references) if reference != message_id]
+
+def get_base_subject(subject: str | None) -> tuple[str, bool]:
+    """
+    Get the subject without its reply and forward prefixes, and whether
+    it had any.
+
+    Example:
+        >>> get_base_subject("Re: Fwd: Meeting notes")
+        ('meeting notes', True)
+    """
+    base_subject = subject or ""
+    is_reply = False
+    while match := REPLY_PREFIX_PATTERN.match(base_subject):
+        base_subject = base_subject[match.end():]
+        is_reply = True
+    return " ".join(base_subject.split()).lower(), is_reply
+
+class _Container:
+    __slots__ = ("message", "parent", "children")
+
+    def __init__(self):
+        self.message: ConversationEmail | None = None
+        self.parent: _Container | None = None
+        self.children: list[_Container] = []
+
+    def is_descendant_of(self, container: _Container) -> bool:
+        ancestor: _Container | None = self
+        while ancestor is not None:
+            if ancestor is container:
+                return True
+            ancestor = ancestor.parent
+        return False
+
+    def set_parent(self, parent: _Container | None) -> None:
+        if self.parent is not None:
+            self.parent.children.remove(self)
+        self.parent = parent
+        if parent is not None:
+            parent.children.append(self)
+
+    def get_timestamp(self) -> float:
+        """Date of the email, or of the oldest reply of an email that is not known."""
+        if self.message is not None:
+            return get_timestamp(self.message.email.date)
+        return min((child.get_timestamp() for child in self.children), default=0)
+
+def thread_emails(emails: Iterable[ConversationEmail]) -> list[ConversationEmail]:
+    """
+    Order the emails of a conversation as a reply tree, every email is
+    followed by its replies, oldest first, and its `depth` is set.
+    Emails whose parent is not among `emails` keep their place in the
+    tree through their other ancestors, or start a new root. Copies of
+    an email in several folders are returned once, the first one is kept.
+
+    Example:
+        >>> [(email.email.subject, email.depth) for email in thread_emails(emails)]
+        [('Meeting', 0), ('Re: Meeting', 1), ('Re: Re: Meeting', 2), ('Re: Meeting', 1)]
+    """
+    containers: dict[str, _Container] = {}
+    def get_container(message_id: str) -> _Container:
+        if message_id not in containers:
+            containers[message_id] = _Container()
+        return containers[message_id]
+
+    for conversation_email in emails:
+        # Emails without a Message-ID can only be roots.
+        message_id = conversation_email.email.message_id.strip() or (
+            f"<{conversation_email.folder}/{conversation_email.email.uid}>"
+        )
+        container = get_container(message_id)
+        if container.message is not None:
+            continue
+        container.message = conversation_email
+
+        # Link the references as a chain, without breaking the links
+        # that are already made and without creating loops.
+        parent: _Container | None = None
+        for reference in get_references(conversation_email.email):
+            reference_container = get_container(reference)
+            if (
+                parent is not None
+                and reference_container.parent is None
+                and not parent.is_descendant_of(reference_container)
+            ):
+                reference_container.set_parent(parent)
+            parent = reference_container
+
+        # The last reference is the parent of the email itself.
+        if parent is not None and parent.is_descendant_of(container):
+            parent = None
+        container.set_parent(parent)
+
+    # Emails that are not known are replaced by their replies.
+    def prune(containers: list[_Container]) -> list[_Container]:
+        pruned = []
+        for container in containers:
+            children = prune(container.children)
+            container.children = children
+            if container.message is None:
+                pruned.extend(children)
+            else:
+                pruned.append(container)
+        return sorted(pruned, key=_Container.get_timestamp)
+
+    threaded_emails: list[ConversationEmail] = []
+    def flatten(containers: list[_Container], depth: int) -> None:
+        for container in containers:
+            message = container.message
+            # Emails that are not known are pruned already.
+            if message is None:
+                continue
+            message.depth = depth
+            threaded_emails.append(message)
+            flatten(container.children, depth + 1)
+
+    flatten(prune([container for container in containers.values() if container.parent is None]), 0)
+    return threaded_emails
+
+__all__ = [
+    "thread_emails",
+    "parse_message_ids",
+    "get_references",
+    "get_base_subject",
+]
@@ -0,0 +1,141 @@
+"""
+FlagChanges
+Coalesces the flag changes of an IMAP session that arrive within a
+short window, like a user selecting messages one by one and marking
+them as read, or toggling a flag back and forth. Changes of the window
+are merged per folder and flag, the last change of a uid wins, and each
+merged change is sent as a single `UID STORE` instead of one command
+per call. Changes that can not be merged, like `1:*`, are sent in their
+place among the others, so the merged changes before them are sent
+before and the ones after them are sent after.
+
+The first change of a window waits `FLAG_CHANGE_WINDOW` and sends the
+merged changes, the ones that arrive meanwhile wait for it and share
+the result of the command that carried them.
+
+Primarily designed for use by the `IMAPManager` class.
+"""
+from __future__ import annotations
+import time
+import threading
+from typing import Callable
+
+from .uid_set import UIDSet
+
+"""
+Custom consts
+"""
+# Timers in seconds
+FLAG_CHANGE_WINDOW = 0.05
+
+# (folder, flag) -> (uids to add the flag to, uids to remove it from)
+type _MergedChanges = dict[tuple[str, str], tuple[UIDSet, UIDSet]]
+# (folder, sequence set, command, flag) of a sequence set that can not
+# be merged, like `1:*`.
+type _UnmergedChange = tuple[str, str, str, str]
+
+class _FlagChangeBatch:
+    def __init__(self):
+        # In arrival order, the changes between two unmerged changes are
+        # merged together.
+        self.changes: list[_MergedChanges | _UnmergedChange] = []
+        self.results: dict[tuple[int | str, ...], tuple[bool, str] | Exception] = {}
+        self.done = threading.Event()
+
+    def add(self, folder: str, sequence_set: str, command: str, flag: str) -> tuple[int | str, ...]:
+        """Add the change and return the key of its result."""
+        try:
+            uids = UIDSet.parse(sequence_set)
+        except ValueError:
+            self.changes.append((folder, sequence_set, command, flag))
+            return (len(self.changes) - 1, folder, sequence_set, command, flag)
+
+        merged_changes = self.changes[-1] if self.changes else None
+        if not isinstance(merged_changes, dict):
+            merged_changes = {}
+            self.changes.append(merged_changes)
+        added, removed = merged_changes.get((folder, flag), (UIDSet(), UIDSet()))
+        if command == "+FLAGS":
+            added, removed = added | uids, removed - uids
+        else:
+            added, removed = added - uids, removed | uids
+        merged_changes[(folder, flag)] = (added, removed)
+        return (len(self.changes) - 1, folder, flag, command)
+
+class FlagChanges:
+    """
+    Merges the flag changes that arrive within `window` seconds.
+
+    Args:
+        store (Callable[[str, str, str, str], tuple[bool, str]]): Sends
+        a change, called with the folder, the sequence set, `+FLAGS` or
+        `-FLAGS` and the flag.
+        window (float, optional): Seconds to wait for the other changes.
+        Defaults to FLAG_CHANGE_WINDOW.
+    """
+    def __init__(
+        self,
+        store: Callable[[str, str, str, str], tuple[bool, str]],
+        window: float = FLAG_CHANGE_WINDOW
+    ):
+        self._store = store
+        self._window = window
+        self._lock = threading.Lock()
+        self._batch: _FlagChangeBatch | None = None
+
+    def change(self, folder: str, sequence_set: str, command: str, flag: str) -> tuple[bool, str]:
+        """
+        Add `flag` to the emails of `sequence_set` if `command` is
+        `+FLAGS`, remove it if it is `-FLAGS`, and return the result of
+        the command that carried the change.
+
+        Raises:
+            Exception: The error of the command that carried the change.
+        """
+        with self._lock:
+            batch = self._batch
+            is_leader = batch is None
+            if is_leader:
+                batch = self._batch = _FlagChangeBatch()
+            key = batch.add(folder, sequence_set, command, flag)
+
+        if is_leader:
+            time.sleep(self._window)
+            with self._lock:
+                self._batch = None
+            try:
+                self._send(batch)
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+
+        # Overridden by a later change of the window, nothing was sent.
+        result = batch.results.get(key, (True, ""))
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _send(self, batch: _FlagChangeBatch) -> None:
+        for index, changes in enumerate(batch.changes):
+            if not isinstance(changes, dict):
+                folder, sequence_set, command, flag = changes
+                batch.results[(index, *changes)] = self._call_store(folder, sequence_set, command, flag)
+                continue
+            for (folder, flag), (added, removed) in changes.items():
+                for command, uids in (("+FLAGS", added), ("-FLAGS", removed)):
+                    if uids:
+                        batch.results[(index, folder, flag, command)] = self._call_store(
+                            folder, str(uids), command, flag
+                        )
+
+    def _call_store(self, *args: str) -> tuple[bool, str] | Exception:
+        try:
+            return self._store(*args)
+        except Exception as e:
+            return e
+
+__all__ = [
+    "FlagChanges",
+    "FLAG_CHANGE_WINDOW",
+]
@@ -7,6 +7,7 @@ add new features.
 Key features include:
 - Automated server selection based on email domain.
 - Support for idling and event-driven response handling on separate threads.
+- Priority scheduling of the commands of interactive and background work.
 - New abstractions for managing email folders, marks, and search criteria.
 - Built-in utility methods for email parsing, attachment handling, and UTF-8 compatibility.
 - Custom error handling.
@@ -16,21 +17,32 @@ Primarily designed for use by the `Openmail` class.
 Author: <berkaykayaforbusiness@outlook.com>
 """
 
+from email import policy as email_policy
 from email.message import EmailMessage
 import imaplib
 import re
 import threading
 import time
 from zoneinfo import ZoneInfo
-from typing import Callable, override, List
+from typing import BinaryIO, Callable, Iterator, override, List
 from enum import Enum
 from ssl import SSLContext
 from types import MappingProxyType
 from datetime import datetime, timedelta
 from dataclasses import dataclass
+from collections import deque
 from email.utils import parsedate_to_datetime
 
 from .parser import MessageDecoder, MessageParser
+from .tls import get_ssl_context
+from .rate_limiter import RateLimit, find_rate_limit, get_rate_limiter, is_throttle_message
+from .scheduler import CommandScheduler, Lane
+from .search_cache import SearchCache
+from .search_index import get_search_index, has_only_text_criteria
+from .conversations import thread_emails
+from .flag_changes import FlagChanges
+from .uid_set import UIDSet
+from .mime_writer import MIMEWriter, TransferMode
 from .utils import (
     add_quotes_if_str,
     convert_to_imap_date,
@@ -39,7 +51,7 @@ from .utils import (
     extract_email_addresses,
 )
 from .utils import contains_non_ascii
-from .types import SearchCriteria, Attachment, Mailbox, Email, Flags, Mark, Folder
+from .types import SearchCriteria, Attachment, Mailbox, Email, Flags, Mark, Folder, Conversation, MessageLocation
 
 """
 Exceptions
@@ -55,6 +67,8 @@ class IMAPManagerLoggedOutException(IMAPManagerException):
 Types, that are only used in this module
 """
 type IMAPCommandResult = tuple[bool, str]
+# (selected folder, search query, UIDVALIDITY, EXISTS, HIGHESTMODSEQ)
+type SearchCacheKey = tuple[tuple[str, bool] | None, str | bytes, str | None, int, str | None]
 
 """
 General consts, avoid changing
@@ -69,6 +83,17 @@ IMAP_SERVERS = MappingProxyType(
     }
 )
 IMAP_PORT = 993
+# Commands per second of the providers, keys are the same as `IMAP_SERVERS`.
+IMAP_RATE_LIMITS = MappingProxyType(
+    {
+        "gmail": RateLimit(rate=10, burst=20),
+        "yahoo": RateLimit(rate=5, burst=10),
+        "outlook": RateLimit(rate=10, burst=20),
+        "hotmail": RateLimit(rate=10, burst=20),
+        "yandex": RateLimit(rate=5, burst=10),
+    }
+)
+DEFAULT_IMAP_RATE_LIMIT = RateLimit(rate=10, burst=20)
 
 # Regex Patterns
 SEQUENCE_SET_PATTERN = re.compile(
@@ -81,6 +106,11 @@ SEQUENCE_SET_PATTERN = re.compile(
 """,
     re.VERBOSE,
 )
+FETCH_UID_PATTERN = re.compile(rb"UID (\d+)")
+FLAG_SEARCH_KEY_PATTERN = re.compile(
+    rb"\b(UN)?(SEEN|ANSWERED|FLAGGED|DELETED|DRAFT|KEYWORD)\b|\b(RECENT|NEW|OLD)\b",
+    re.IGNORECASE
+)
 
 # Typo prevention
 CRLF = b"\r\n"
@@ -94,7 +124,17 @@ Custom consts
 """
 GET_EMAILS_OFFSET_START = 1
 GET_EMAILS_OFFSET_END = 10
+KEYSET_MIN_UID_WINDOW = 100
+# Number of the newest uids a search loads when the server supports
+# PARTIAL, the rest is loaded window by window as it is paged through.
+SEARCH_PARTIAL_WINDOW_SIZE = 50
 SHORT_BODY_TEXT_CHUNK_SIZE = 4096  # in bytes
+LITERAL_SEND_CHUNK_SIZE = 64 * 1024  # in bytes
+# Servers may reject longer command lines, see RFC 7162 section 4.
+MAX_COMMAND_LINE_LENGTH = 8192  # in bytes
+MAX_PIPELINED_COMMANDS = 8
+BULK_FETCH_CHUNK_SIZE = 50  # in emails
+BULK_FLAGS_FETCH_CHUNK_SIZE = 1000  # in emails
 EMAIL_LOOKBACK_WINDOW = 5  # minutes
 # Character counts
 SHORT_BODY_MAX_LENGTH = 100
@@ -105,6 +145,10 @@ IDLE_TIMEOUT = 29 * 60
 JOIN_TIMEOUT = 1
 WAIT_RESPONSE_TIMEOUT = 30
 IDLE_ACTIVATION_INTERVAL = 60
+RATE_LIMIT_TIMEOUT = 60
+# Results of the folders without HIGHESTMODSEQ are reused for this long,
+# flag changes of the other clients can not be detected in them.
+UNVERSIONED_SEARCH_RESULT_TTL = 60
 
 
 class IMAPManager(imaplib.IMAP4_SSL):
@@ -123,6 +167,19 @@ class IMAPManager(imaplib.IMAP4_SSL):
         tag: bytes
         start_time: float
 
+    class FileLiteral:
+        """
+        Literal of a command that is sent from a file instead of
+        memory, see `append_file`.
+        """
+
+        def __init__(self, file: BinaryIO, size: int):
+            self.file = file
+            self.size = size
+
+        def __len__(self) -> int:
+            return self.size
+
     class WaitResponse(Enum):
         """
         Enum for waiting for a response from the server.
@@ -145,10 +202,16 @@ class IMAPManager(imaplib.IMAP4_SSL):
     @dataclass
     class SearchedEmails:
         """Dataclass for storing searched emails."""
-        uids: List[str]
+        # Only the newest `SEARCH_PARTIAL_WINDOW_SIZE` of `count` if
+        # the server supports PARTIAL, see `search_folder`.
+        uids: UIDSet
         count: int
         folder: str
         search_query: str
+        # Selection the search is made in, see `get_emails`.
+        selected_folder: tuple[str, bool] | None = None
+        # See `search_folder`.
+        cursor: str = ""
 
     def __init__(
         self,
@@ -188,16 +251,34 @@ class IMAPManager(imaplib.IMAP4_SSL):
         self._release_idle_loops_event = threading.Event()
         self._idle_command_in_process_event = threading.Event()
         self._idle_command_in_process_event.set()
+        # Commands are granted the session by lane, see `handle_idle`.
+        self._scheduler = CommandScheduler(email_address)
+        # Shared by every session of the account, see `_simple_command`.
+        self._rate_limiter = get_rate_limiter(
+            email_address,
+            self._host,
+            find_rate_limit(self._host, IMAP_SERVERS, IMAP_RATE_LIMITS, DEFAULT_IMAP_RATE_LIMIT)
+        )
 
         super().__init__(
             self._host,
             self._port,
-            ssl_context=ssl_context,
+            # Shared per host, so reconnects can resume the TLS session.
+            ssl_context=ssl_context or get_ssl_context(self._host),
             timeout=choose_positive(timeout, CONN_TIMEOUT),
         )
 
         self._is_idle_supported = self.is_supported("IDLE")
         self._searched_emails: IMAPManager.SearchedEmails | None = None
+        self._search_cache: SearchCache[SearchCacheKey, IMAPManager.SearchedEmails] = SearchCache()
+        # Shared by every session of the account, see `search_local`.
+        self._search_index = get_search_index(email_address)
+        self._flag_changes = FlagChanges(self._store_flags)
+        # (requested folder, encoded) -> folder, see `find_matching_folder`.
+        self._matching_folders: dict[tuple[str, bool], bytes | str] = {}
+        self._selected_folder: tuple[str, bool] | None = None
+        # UIDVALIDITY, EXISTS, HIGHESTMODSEQ and UIDNEXT of the selected folder.
+        self._selected_folder_state: tuple[str | None, int, str | None, str | None] | None = None
         self._hierarchy_delimiter = ""
 
         self.login(email_address, password)
@@ -349,6 +430,14 @@ class IMAPManager(imaplib.IMAP4_SSL):
         """
 
         def wrapper(self, *args, **kwargs):
+            # Commands of the same session must not interleave, waiting
+            # ones go in the order of their lanes, see `scheduler.lane`.
+            # Health probes of other threads skip the session while it
+            # is busy.
+            with self._scheduler.slot():
+                return run_imap4_cmd(self, *args, **kwargs)
+
+        def run_imap4_cmd(self, *args, **kwargs):
             def is_logout_error(err_msg: str) -> bool:
                 """Checks the imap connection whether it still connected with err_msg."""
                 return self.state == "LOGOUT" and any(
@@ -391,6 +480,12 @@ class IMAPManager(imaplib.IMAP4_SSL):
 
             try:
                 result = imap4_cmd(self, *args, **kwargs)
+            except (imaplib.IMAP4.abort, OSError) as e:
+                # Transport is gone, session can not be used anymore.
+                self.state = "LOGOUT"
+                raise IMAPManagerLoggedOutException(
+                    f"Connection lost while running command `{imap4_cmd.__name__}`: {str(e)}"
+                ) from None
             except Exception as e:
                 if is_logout_error(str(e).lower()):
                     raise IMAPManagerLoggedOutException(
@@ -425,6 +520,63 @@ class IMAPManager(imaplib.IMAP4_SSL):
     def append(self, mailbox: str, flags: str, date_time: str, message):
         return super().append(mailbox, flags, date_time, message)
 
+    @handle_idle
+    def append_file(self, mailbox: str, flags: str, date_time: str, file: BinaryIO, size: int):
+        """
+        Same as `append` but the message is sent from `file` chunk by
+        chunk. `file` must contain `size` bytes with CRLF line endings.
+        """
+        if self.utf8_enabled:
+            # imaplib wraps UTF-8 literals, so they are sent from memory.
+            file.seek(0)
+            return super().append(mailbox, flags, date_time, file.read())
+
+        if flags and (flags[0], flags[-1]) != ("(", ")"):
+            flags = f"({flags})"
+        self.literal = IMAPManager.FileLiteral(file, size)
+        return self._simple_command(
+            "APPEND",
+            mailbox or INBOX,
+            flags or None,
+            imaplib.Time2Internaldate(date_time) if date_time else None
+        )
+
+    @override
+    def _simple_command(self, name, *args):
+        """
+        Every command except LOGOUT waits for the rate limiter of the
+        account, and the response of the server adapts the limiter.
+        """
+        if name != "LOGOUT" and not self._rate_limiter.acquire(timeout=RATE_LIMIT_TIMEOUT):
+            raise IMAPManagerException(
+                f"Rate limit of {self._host} is exceeded, `{name}` could not be sent."
+            )
+
+        try:
+            typ, data = super()._simple_command(name, *args)
+        except imaplib.IMAP4.error as e:
+            if is_throttle_message(str(e)):
+                self._rate_limiter.on_throttle()
+            raise
+
+        if typ != "OK" and is_throttle_message(
+            b" ".join(item for item in data if isinstance(item, bytes))
+        ):
+            self._rate_limiter.on_throttle()
+        else:
+            self._rate_limiter.on_success()
+        return typ, data
+
+    @override
+    def send(self, data):
+        """Send `data` to the server, file literals are sent chunk by chunk."""
+        if not isinstance(data, IMAPManager.FileLiteral):
+            return super().send(data)
+
+        data.file.seek(0)
+        while chunk := data.file.read(LITERAL_SEND_CHUNK_SIZE):
+            super().send(chunk)
+
     @override
     @handle_idle
     def capability(self):
@@ -448,11 +600,13 @@ class IMAPManager(imaplib.IMAP4_SSL):
     @override
     @handle_idle
     def create(self, mailbox: str):
+        self._matching_folders.clear()
         return super().create(mailbox)
 
     @override
     @handle_idle
     def delete(self, mailbox: str):
+        self._matching_folders.clear()
         return super().delete(mailbox)
 
     @override
@@ -603,6 +757,7 @@ class IMAPManager(imaplib.IMAP4_SSL):
     @override
     @handle_idle
     def rename(self, oldmailbox: str, newmailbox: str):
+        self._matching_folders.clear()
         return super().rename(oldmailbox, newmailbox)
 
     @override
@@ -620,8 +775,9 @@ class IMAPManager(imaplib.IMAP4_SSL):
             self._encode_folder(folder) if isinstance(folder, str) else folder
         )  # type: ignore
 
+        select_result = super().select(folder, readonly)
         result = self._parse_command_result(
-            super().select(folder, readonly),
+            select_result,
             success_message=f"Successfully selected {folder}",
             failure_message=f"Error while selecting folder `{folder}`",
         )
@@ -629,6 +785,18 @@ class IMAPManager(imaplib.IMAP4_SSL):
         if not result[0]:
             raise IMAPManagerException(result[1])
 
+        def get_response_code(name: str) -> str | None:
+            value = self.untagged_responses.get(name, [None])[-1]
+            return value.decode() if isinstance(value, bytes) else value
+
+        exists = select_result[1][0] if select_result[1] else None
+        self._selected_folder = (folder, readonly)
+        self._selected_folder_state = (
+            get_response_code("UIDVALIDITY"),
+            int(exists) if exists else 0,
+            get_response_code("HIGHESTMODSEQ"),
+            get_response_code("UIDNEXT"),
+        )
         return result
 
     @override
@@ -723,19 +891,39 @@ class IMAPManager(imaplib.IMAP4_SSL):
         return keyword in data[0].decode()
 
     def is_logged_out(self) -> bool:
-        """Check if imap connection is terminated"""
+        """
+        Check if imap connection is terminated. Sends NOOP unless the
+        session is idling or busy with another command, in which case
+        the connection is evidently alive and considered logged in.
+        """
+        if self.state == "LOGOUT":
+            return True
+        if not self._scheduler.acquire(blocking=False):
+            return False
         try:
             if self.is_idle() or self.is_idle_activation_countdown_continue():
                 return False
-            start_time = time.time()
-            print("calling noop at ", start_time)
-            noop_response = super().noop()[0] != "OK"
-            end_time = time.time()
-            print("noop response at ", end_time)
-            print("total time: ", end_time - start_time)
-            return noop_response
+            return super().noop()[0] != "OK"
         except Exception:
+            self.state = "LOGOUT"
             return True
+        finally:
+            self._scheduler.release()
+
+    def restore_session_state(self, other: "IMAPManager") -> None:
+        """
+        Carry over the selected folder and the searches of `other`
+        so this session can continue where `other` left off. Used when
+        promoting a standby session in place of a dropped one.
+
+        Args:
+            other (IMAPManager): Session to take the state from.
+        """
+        self._searched_emails = other._searched_emails
+        self._search_cache = other._search_cache
+        if other._selected_folder:
+            folder, readonly = other._selected_folder
+            self.select(folder, readonly)
 
     def is_idle_supported(self) -> bool:
         """Check if idle is supported"""
@@ -1073,9 +1261,11 @@ class IMAPManager(imaplib.IMAP4_SSL):
         """
         print(f"'BYE' message of server catched at {datetime.now()}.")
         self._wait_response = IMAPManager.WaitResponse.BYE
+        # Lets `is_logged_out` answer without a round trip.
+        self.state = "LOGOUT"
 
         if not self._idling_event.is_set():
-            self.idling_event.set()
+            self._idling_event.set()
         if self._idling_thread.is_alive():
             self._idling_thread.join(timeout=JOIN_TIMEOUT)
         self._release_readline_for_imap4()
@@ -1084,13 +1274,13 @@ class IMAPManager(imaplib.IMAP4_SSL):
             f"'BYE' response received from server at {datetime.now()}. IMAPManager connection closed safely."
         ) from None
 
-    def _is_sequence_set_valid(self, sequence_set: str, uids: List[str]) -> bool:
+    def _is_sequence_set_valid(self, sequence_set: str, uids: UIDSet | List[str]) -> bool:
         """
         Validates whether the given `sequence_set` correctly represents a subset of the provided `uids`.
 
         Args:
             sequence_set (str): A string representing a set of sequences as defined in RFC 9051.
-            uids (list[int]): A sorted list of integer UIDs to validate against.
+            uids (UIDSet | list[str]): UIDs to validate against.
 
         Returns:
             bool: `True` if all UIDs derived from the `sequence_set` are present in the `uids` list.
@@ -1111,35 +1301,169 @@ class IMAPManager(imaplib.IMAP4_SSL):
         if not SEQUENCE_SET_PATTERN.match(sequence_set):
             return False
 
-        max_uid = uids[-1]
-        expanded = set()
+        if not isinstance(uids, UIDSet):
+            uids = UIDSet(uid for uid in uids if uid)
+        if not uids:
+            return False
+
+        return UIDSet.parse(sequence_set, uids.max).issubset(uids)
+
+    def _split_sequence_set(self, sequence_set: str, reserved_length: int = 0) -> List[str]:
+        """
+        Compress `sequence_set` into ranges and split it into sequence
+        sets that fit into a command line of `MAX_COMMAND_LINE_LENGTH`
+        together with `reserved_length` bytes of the rest of the command.
+        Segments that contain `*` are kept as they are, and malformed
+        sequence sets are not split, the server rejects them.
+
+        Example:
+            >>> _split_sequence_set("1,2,3,5,7,9,...,99999")
+            ['1:3,5,7,...,16383', '16385,...,99999']
+            >>> _split_sequence_set("4,1,2,3,9:*")
+            ['1:4,9:*']
+        """
+        if not SEQUENCE_SET_PATTERN.match(sequence_set):
+            return [sequence_set]
+
+        max_length = MAX_COMMAND_LINE_LENGTH - reserved_length
         segments = sequence_set.split(",")
+        open_segments = [segment for segment in segments if "*" in segment]
+        sequence_sets = []
+        if len(open_segments) < len(segments):
+            sequence_sets = [
+                str(uids) for uids in UIDSet.parse(
+                    ",".join(segment for segment in segments if "*" not in segment)
+                ).split(max_length)
+            ]
+        for segment in open_segments:
+            if sequence_sets and len(sequence_sets[-1]) + len(segment) < max_length:
+                sequence_sets[-1] += f",{segment}"
+            else:
+                sequence_sets.append(segment)
+        return sequence_sets
 
-        for segment in segments:
-            if ":" in segment:
-                parts = segment.split(":")
-                if parts[0] == "*":
-                    start = int(max_uid)
-                else:
-                    start = int(parts[0])
+    @handle_idle
+    def _uid_batched(
+        self, command: str, sequence_set: str, *args: str | bytes
+    ) -> tuple[str, List[bytes | None]]:
+        """
+        Same as `uid` but `sequence_set` is split into batches that fit
+        into a command line, see `_split_sequence_set`. The batches are
+        pipelined, up to `MAX_PIPELINED_COMMANDS` of them are sent before
+        their responses are read, and their results are merged like the
+        result of a single command.
 
-                if parts[-1] == "*":
-                    end = int(max_uid)
-                else:
-                    end = int(parts[-1])
+        Returns:
+            tuple[str, list[bytes | None]]: `OK` and the untagged responses
+            of every batch, or the result of the first failed batch.
+
+        Example:
+            >>> _uid_batched("STORE", "1,3,5,...,199999", "+FLAGS", "\\Seen")
+            ("OK", [b'1 (UID 1 FLAGS (\\Seen))', ...])
+        """
+        command = command.upper()
+        commands = self._split_uid_command(command, sequence_set, *args)
+        if len(commands) == 1:
+            return self.uid(*commands[0])
+
+        results = self._uid_pipelined(commands)
+        name = command if command in ("SEARCH", "SORT", "THREAD") else "FETCH"
+        untagged_responses = self.untagged_responses.pop(name, [None])
+        for typ, data in results:
+            if typ != "OK":
+                return typ, data
+        return "OK", untagged_responses
+
+    def _split_uid_command(
+        self, command: str, sequence_set: str, *args: str | bytes
+    ) -> List[tuple[str | bytes, ...]]:
+        """
+        Split `UID <command> <sequence_set> <args>` into commands whose
+        lines fit into `MAX_COMMAND_LINE_LENGTH`, see `_split_sequence_set`.
 
-                expanded.update(list(range(start, end + 1)), [max(start, end)])
+        Example:
+            >>> _split_uid_command("EXPUNGE", "1,3,5,...,199999")
+            [("EXPUNGE", "1,3,5,...,16383"), ("EXPUNGE", "16385,...,199999")]
+        """
+        return [
+            (command, batch, *args)
+            for batch in self._split_sequence_set(
+                sequence_set,
+                # Tag of any batch, `UID`, the command, the arguments and CRLF.
+                len(self.tagpre) + 10 + len(f" UID {command} ")
+                + sum(len(arg) + 1 for arg in args) + 2
+            )
+        ]
+
+    @handle_idle
+    def _uid_pipelined(
+        self, commands: List[tuple[str | bytes, ...]]
+    ) -> List[tuple[str, List[bytes | None]]]:
+        """
+        Send the `UID` commands in order without waiting for the response
+        of each, up to `MAX_PIPELINED_COMMANDS` of them are in flight. The
+        untagged responses are collected in `untagged_responses` as usual.
+
+        Args:
+            commands (list[tuple]): Commands like `("STORE", "1:5", "+FLAGS", "\\Seen")`.
+
+        Returns:
+            list[tuple[str, list[bytes | None]]]: Status and the tagged
+            response of every sent command, in order.
+        """
+        def complete(tag: bytes) -> None:
+            try:
+                typ, data = self._command_complete("UID", tag)
+            except imaplib.IMAP4.abort:
+                raise
+            except imaplib.IMAP4.error as e:
+                typ, data = "BAD", [str(e).encode()]
+
+            if typ != "OK" and is_throttle_message(
+                b" ".join(item for item in data if isinstance(item, bytes))
+            ):
+                self._rate_limiter.on_throttle()
             else:
-                if segment == "*":
-                    expanded.add(max_uid)
-                else:
-                    expanded.add(segment)
+                self._rate_limiter.on_success()
+            results.append((typ, data))
 
-        for sequence_set_uid in map(str, expanded):
-            if sequence_set_uid not in uids:
-                return False
+        pending_tags: deque[bytes] = deque()
+        results: List[tuple[str, List[bytes | None]]] = []
+        try:
+            for command in commands:
+                # Responses are read while sending, so neither side
+                # blocks on a full socket buffer.
+                if len(pending_tags) >= MAX_PIPELINED_COMMANDS:
+                    complete(pending_tags.popleft())
+                if not self._rate_limiter.acquire(timeout=RATE_LIMIT_TIMEOUT):
+                    raise IMAPManagerException(
+                        f"Rate limit of {self._host} is exceeded, `UID {command[0]}` could not be sent."
+                    )
+                pending_tags.append(self._command("UID", *command))
+        finally:
+            # Responses of the sent commands must be read even if the
+            # rest could not be sent.
+            while pending_tags:
+                complete(pending_tags.popleft())
 
-        return True
+        return results
+
+    def _compress_sequence_set(self, sequence_set: str) -> str:
+        """
+        Merge the consecutive uids of `sequence_set` into ranges, so
+        the command sent to the server stays short. Sequence sets that
+        contain `*` or are malformed are returned as they are, the server
+        resolves or rejects them.
+
+        Example:
+            >>> _compress_sequence_set("4,1,2,3,9")
+            '1:4,9'
+            >>> _compress_sequence_set("1,3:*")
+            '1,3:*'
+        """
+        if "*" in sequence_set or not SEQUENCE_SET_PATTERN.match(sequence_set):
+            return sequence_set
+        return str(UIDSet.parse(sequence_set))
 
     @handle_idle
     def find_matching_folder(
@@ -1164,10 +1488,19 @@ class IMAPManager(imaplib.IMAP4_SSL):
             b'"[Gmail]/Y\xc4\xb1ld\xc4\xb1zl\xc4\xb1"'
             >>> find_matching_folder(Folder.Flagged, encoded=False)
             b'"[Gmail]/Yıldızlı"' # Flagged in Turkish
+
+        Notes:
+            - Matches are kept until a folder is created, renamed or
+            deleted, so selecting a standard folder does not list the
+            folders every time.
         """
         if requested_folder.lower() not in FOLDER_LIST:
             return None
 
+        cache_key = (requested_folder.lower(), encoded)
+        if cache_key in self._matching_folders:
+            return self._matching_folders[cache_key]
+
         status, folders_as_bytes = self.list()
         if status == "OK" and folders_as_bytes and isinstance(folders_as_bytes, list):
             for folder_as_bytes in folders_as_bytes:
@@ -1176,11 +1509,13 @@ class IMAPManager(imaplib.IMAP4_SSL):
                     in self._decode_folder(folder_as_bytes).upper()
                 ):
                     if encoded:
-                        return self._encode_folder(
+                        matching_folder = self._encode_folder(
                             self._extract_folder_name(folder_as_bytes)
                         )
                     else:
-                        return self._extract_folder_name(folder_as_bytes)
+                        matching_folder = self._extract_folder_name(folder_as_bytes)
+                    self._matching_folders[cache_key] = matching_folder
+                    return matching_folder
         return None
 
     def _encode_folder(self, folder: str) -> bytes:
@@ -1356,6 +1691,32 @@ class IMAPManager(imaplib.IMAP4_SSL):
         )
         return folder_list
 
+    def get_searchable_folders(self) -> List[str]:
+        """
+        Folders to search when a search is not limited to a folder. The
+        folder of all emails is used if the server has one, like Gmail's
+        `[Gmail]/All Mail`, otherwise every selectable folder except trash
+        and junk.
+
+        Example:
+            >>> get_searchable_folders() # Gmail
+            ['[Gmail]/All Mail']
+            >>> get_searchable_folders()
+            ['INBOX', 'Archive', 'Sent', 'My Custom Folder']
+
+        References:
+            https://datatracker.ietf.org/doc/html/rfc6154#section-2
+        """
+        all_folder = self.find_matching_folder(Folder.All, encoded=False)
+        if all_folder:
+            return [str(all_folder)]
+
+        excluded_folders = [
+            self.find_matching_folder(Folder.Trash, encoded=False),
+            self.find_matching_folder(Folder.Junk, encoded=False),
+        ]
+        return [folder for folder in self.get_folders() if folder not in excluded_folders]
+
     def build_search_criteria_query(self, search_criteria: SearchCriteria | str) -> str:
         """
         Builds an IMAP-compatible search criteria query string based on given search parameters.
@@ -1550,27 +1911,33 @@ class IMAPManager(imaplib.IMAP4_SSL):
             >>> search_emails("MyCustomFolder", SearchCriteria(senders=['a@mail.com'])) # Search emails from 'a@mail.com'.
             ["1", "2", "3", "4"]
         """
+        return self.search_folder(folder, search, all_uids=True).uids.newest()
 
-        def save_search_result(
-            uids: List[str], folder: str | Folder, search_query: str
-        ):
-            """
-            Save emails to a specified folder for later use.
+    @handle_idle
+    def search_folder(
+        self,
+        folder: str | None = None,
+        search: str | SearchCriteria = "",
+        all_uids: bool = False
+    ) -> "IMAPManager.SearchedEmails":
+        """
+        Same as `search_emails` but returns the whole result, including
+        its cursor that the emails are fetched with, see `get_emails`.
 
-            Args:
-                uids (list[str]): A list of email uids to save.
-                folder (str): The folder to save the emails to.
-                search_query (str): The search query used to fetch the emails.
-            """
-            self._searched_emails = IMAPManager.SearchedEmails(
-                folder=self._extract_folder_name(
-                    self.find_matching_folder(str(folder), encoded=False) or folder
-                ),
-                search_query=search_query,
-                uids=uids,
-                count=len(uids)
-            )
+        Results are cached, the same search in the same folder is not
+        sent to the server again unless the folder has changed since,
+        see `SearchCache`. If the server supports PARTIAL, only the
+        count and the newest page of the uids are loaded, so the first
+        page does not get slower as the folder grows.
+
+        Args:
+            all_uids (bool, optional): Load every matching uid instead of
+            only the newest page. Defaults to False.
 
+        Example:
+            >>> search_folder("INBOX")
+            SearchedEmails(uids=UIDSet('1:3'), count=3, folder="INBOX", ..., cursor="9f2c...")
+        """
         if not folder:
             folder = Folder.All if search else Folder.Inbox
 
@@ -1583,26 +1950,161 @@ class IMAPManager(imaplib.IMAP4_SSL):
         else:
             search_criteria_query = "ALL"
 
-        # Searching emails
+        # Same search on the same state of the folder has the same result.
+        uidvalidity, exists, highest_modseq, _ = self._selected_folder_state or (None, 0, None, None)
+        cache_key: SearchCacheKey = (
+            self._selected_folder, search_criteria_query, uidvalidity, exists, highest_modseq
+        )
+        searched_emails = self._search_cache.get(
+            cache_key, None if uidvalidity and highest_modseq else UNVERSIONED_SEARCH_RESULT_TTL
+        )
+        if searched_emails:
+            if all_uids and len(searched_emails.uids) < searched_emails.count:
+                searched_emails.count, searched_emails.uids = self._search_uids(
+                    searched_emails.search_query
+                )
+            self._searched_emails = searched_emails
+            return searched_emails
+
+        count, uids = self._search_uids(
+            search_criteria_query,
+            None if all_uids else (1, SEARCH_PARTIAL_WINDOW_SIZE)
+        )
+        searched_emails = IMAPManager.SearchedEmails(
+            folder=self._extract_folder_name(
+                self.find_matching_folder(str(folder), encoded=False) or folder
+            ),
+            search_query=search_criteria_query,
+            uids=uids,
+            count=count,
+            selected_folder=self._selected_folder
+        )
+        searched_emails.cursor = self._search_cache.put(cache_key, searched_emails)
+        self._searched_emails = searched_emails
+        return searched_emails
+
+    def _search_uids(
+        self,
+        search_criteria_query: str | bytes,
+        window: tuple[int, int] | None = None,
+        from_oldest: bool = False
+    ) -> tuple[int, UIDSet]:
+        """
+        Search the selected folder with `ESEARCH` if the server supports
+        it, so the uids are returned as ranges like `1:500,502` instead
+        of one by one, otherwise with plain `SEARCH`.
+
+        Args:
+            search_criteria_query (str | bytes): Search criteria query.
+            window (tuple[int, int], optional): 1-based positions of the
+            first and the last uid to return, counted from the newest. Only
+            the uids within are returned if the server supports PARTIAL,
+            otherwise every uid is returned. Defaults to every uid.
+            from_oldest (bool, optional): Count the positions of `window`
+            from the oldest instead. Defaults to False.
+
+        Returns:
+            tuple[int, UIDSet]: Number of the matches and the matching uids.
+
+        Example:
+            >>> _search_uids("ALL", (1, 3)) # PARTIAL is supported.
+            (1204, UIDSet('1202:1204'))
+            >>> _search_uids("ALL", (1, 3)) # PARTIAL is not supported.
+            (1204, UIDSet('1:1204'))
+
+        References:
+            https://datatracker.ietf.org/doc/html/rfc4731
+            https://datatracker.ietf.org/doc/html/rfc9394
+        """
+        if window and self.is_supported("PARTIAL"):
+            sign = "" if from_oldest else "-"
+            return_options = f"COUNT PARTIAL {sign}{window[0]}:{sign}{window[1]}"
+        elif self.is_supported("ESEARCH"):
+            return_options = "COUNT ALL"
+        else:
+            return_options = ""
+
+        esearch_responses: list[bytes] = []
+        uids: list[bytes] = []
         try:
-            search_status, uids = self.uid("search", None, search_criteria_query)
+            if return_options:
+                search_status, _ = self.uid(
+                    "search", None, f"RETURN ({return_options})", search_criteria_query
+                )
+                # imaplib does not return ESEARCH responses of UID SEARCH.
+                esearch_responses = self.untagged_responses.pop("ESEARCH", [])
+            else:
+                search_status, uids = self.uid("search", None, search_criteria_query)
 
             if search_status != "OK":
                 raise IMAPManagerException(
                     f"Error while getting email uids, search query was `{search_criteria_query}` and error is `{search_status}.`"
                 )
 
-            if not uids or not uids[0]:
-                return uids
+            if return_options:
+                esearch_response = esearch_responses[-1] if esearch_responses else b""
+                esearch_uids = MessageParser.get_esearch_uids(esearch_response)
+                count = MessageParser.get_esearch_count(esearch_response)
+                return (len(esearch_uids) if count == -1 else count), esearch_uids
 
-            uids = uids[0].decode().split()[::-1]
-            save_search_result(uids, folder, search_criteria_query)
-            return uids
+            searched_uids = UIDSet(uids[0].split() if uids and uids[0] else [])
+            return len(searched_uids), searched_uids
+        except IMAPManagerException:
+            raise
         except Exception as e:
             raise IMAPManagerException(
                 f"Error while getting email uids, search query was `{search_criteria_query}` and error is `{str(e)}.`"
             )
 
+    def _get_searched_uids(
+        self,
+        searched_emails: "IMAPManager.SearchedEmails",
+        offset_start: int,
+        offset_end: int
+    ) -> List[str]:
+        """
+        Get the uids of the search between the 0-based `offset_start`
+        and the 1-based `offset_end`, loads them from the server if they
+        are not loaded by `search_folder` yet. The folder of the search must be
+        selected.
+
+        Returns:
+            list[str]: Uids, newest first.
+        """
+        if offset_end <= len(searched_emails.uids):
+            return searched_emails.uids.newest(offset_start, offset_end)
+
+        _, uids = self._search_uids(
+            searched_emails.search_query, (offset_start + 1, offset_end)
+        )
+        # PARTIAL is not supported, every uid is returned.
+        if len(uids) > offset_end - offset_start:
+            return uids.newest(offset_start, offset_end)
+        return uids.newest()
+
+    def _get_searched_emails(self, cursor: str | None = None) -> "IMAPManager.SearchedEmails":
+        """
+        Get the result of the search of `cursor`, or the last search if
+        `cursor` is not given.
+
+        Raises:
+            IMAPManagerException: If no emails have been searched yet or
+            the result of the cursor is not cached anymore.
+        """
+        if cursor:
+            searched_emails = self._search_cache.get_by_cursor(cursor)
+            if not searched_emails:
+                raise IMAPManagerException(
+                    f"Search cursor `{cursor}` is expired, search again to get a new one."
+                )
+            return searched_emails
+
+        if not self._searched_emails:
+            raise IMAPManagerException(
+                "No emails have been searched yet. Call `search_emails` first."
+            )
+        return self._searched_emails
+
     @handle_idle
     def is_email_exists(self, folder: str, sequence_set: str) -> bool:
         """
@@ -1634,17 +2136,23 @@ class IMAPManager(imaplib.IMAP4_SSL):
 
         self.select(folder, readonly=True)
 
-        status, data = self.uid("search", f"UID {sequence_set}")
-        if not status:
+        try:
+            uids = UIDSet()
+            for batch in self._split_sequence_set(
+                sequence_set, len("A0000 UID SEARCH RETURN (COUNT ALL) UID \r\n")
+            ):
+                uids |= self._search_uids(f"UID {batch}")[1]
+        except IMAPManagerException as e:
             raise IMAPManagerException(
-                f"Error while checking emails `{sequence_set}`: `{status}`"
-            )
+                f"Error while checking emails `{sequence_set}`: `{str(e)}`"
+            ) from e
 
-        return self._is_sequence_set_valid(sequence_set, data[0].decode().split(" "))
+        return self._is_sequence_set_valid(sequence_set, uids)
 
     def _resolve_offsets(self,
         offset_start: int | None = None,
-        offset_end: int | None = None
+        offset_end: int | None = None,
+        searched_emails: "IMAPManager.SearchedEmails | None" = None
     ):
         """
         Validate search results and prepare offset parameters for email pagination.
@@ -1652,6 +2160,7 @@ class IMAPManager(imaplib.IMAP4_SSL):
         Args:
            offset_start (int, optional): Starting position for email range (1-based). Defaults to configured value.
            offset_end (int, optional): Ending position for email range (1-based). Defaults to configured value.
+           searched_emails (SearchedEmails, optional): Search result to paginate. Defaults to the last search.
 
         Returns:
            tuple[int, int]: Validated and normalized offset values (0-based start index, 1-based end index).
@@ -1667,10 +2176,7 @@ class IMAPManager(imaplib.IMAP4_SSL):
            >>> validate_and_prepare_offsets(100, 110)  # If only 50 emails found
            (49, 50)
         """
-        if not self._searched_emails:
-            raise IMAPManagerException(
-                "No emails have been searched yet. Call `search_emails` first."
-            )
+        searched_emails = searched_emails or self._get_searched_emails()
 
         if offset_start and offset_end and offset_start > offset_end:
             raise ValueError(
@@ -1691,7 +2197,7 @@ class IMAPManager(imaplib.IMAP4_SSL):
                 f"Invalid `offset_end`: {offset_end}. `offset_end` must be greater than or equal to 1."
             )
 
-        uids_len = self._searched_emails.count
+        uids_len = searched_emails.count
         offset_start = (
             uids_len - 1 if offset_start >= uids_len else offset_start
         ) - 1
@@ -1701,7 +2207,8 @@ class IMAPManager(imaplib.IMAP4_SSL):
     @handle_idle
     def get_emails(self,
         offset_start: int | None = None,
-        offset_end: int | None = None
+        offset_end: int | None = None,
+        cursor: str | None = None
     ) -> Mailbox:
         """
         Fetch emails from a list of uids.
@@ -1709,6 +2216,8 @@ class IMAPManager(imaplib.IMAP4_SSL):
         Args:
             offset_start (int, optional): Starting index of the emails to fetch. Defaults to 1.
             offset_end (int, optional): Ending index of the emails to fetch. Defaults to 10.
+            cursor (str, optional): Cursor of the search to fetch the emails of, see
+            `search_folder`. Defaults to the last search.
 
         Returns:
             Mailbox: Dataclass containing the fetched emails, folder, and total number of emails.
@@ -1718,39 +2227,69 @@ class IMAPManager(imaplib.IMAP4_SSL):
             Mailbox(folder='INBOX', emails=[Email(uid="1", sender="a@gmail.com", ...),
             Email(uid="2", sender="b@gmail.com", ...)], total=2)
         """
-        if not self._searched_emails:
-            raise IMAPManagerException(
-                "No emails have been searched yet. Call `search_emails` first."
+        searched_emails = self._get_searched_emails(cursor)
+        if searched_emails.count == 0:
+            return Mailbox(
+                folder=searched_emails.folder, emails=[], total=0, cursor=searched_emails.cursor
             )
 
-        if self._searched_emails.count == 0:
-            return Mailbox(folder=self._searched_emails.folder, emails=[], total=0)
+        offset_start, offset_end = self._resolve_offsets(offset_start, offset_end, searched_emails)
 
-        offset_start, offset_end = self._resolve_offsets(offset_start, offset_end)
+        # Commands of other lanes may have selected another folder
+        # since the search, see `iter_email_sources`.
+        if (
+            searched_emails.selected_folder
+            and self._selected_folder != searched_emails.selected_folder
+        ):
+            self.select(*searched_emails.selected_folder)
+
+        return Mailbox(
+            folder=searched_emails.folder,
+            emails=self._fetch_emails(
+                self._get_searched_uids(searched_emails, offset_start, offset_end),
+                searched_emails.folder
+            ),
+            total=searched_emails.count,
+            cursor=searched_emails.cursor
+        )
+
+    def _fetch_emails(self, uids: List[str], folder: str) -> List[Email]:
+        """
+        Fetch the headers, flags, attachment list and the body of the
+        emails in the selected folder.
+
+        Args:
+            uids (list[str]): Uids of the emails, newest first.
+            folder (str): Name of the selected folder, used in errors.
+
+        Returns:
+            list[Email]: Emails in the same order as `uids`.
+        """
+        if not uids:
+            return []
 
         # Fetching emails
         sequence_set = ""
         messages = []
         emails = []
+        sizes: dict[str, int] = {}
         try:
-            sequence_set = ",".join(
-                map(str, self._searched_emails.uids[offset_start:offset_end][::-1])
-            )
-            status, messages = self.uid(
+            sequence_set = str(UIDSet(uids))
+            status, messages = self._uid_batched(
                 "FETCH",
                 sequence_set,
                 "(BODY.PEEK[HEADER.FIELDS (FROM TO SUBJECT DATE CC BCC MESSAGE-ID "
                 "IN-REPLY-TO REFERENCES LIST-UNSUBSCRIBE LIST-UNSUBSCRIBE-POST)] "
-                "FLAGS BODYSTRUCTURE)",
+                "FLAGS BODYSTRUCTURE RFC822.SIZE)",
             )
 
             if status != "OK":
                 raise IMAPManagerException(
-                    f"`{sequence_set}` in folder `{self._searched_emails.folder}` could not fetched `{len(emails)}`: `{status}`"
+                    f"`{sequence_set}` in folder `{folder}` could not fetched `{len(emails)}`: `{status}`"
                 )
 
             if not messages or not messages[0]:
-                return Mailbox(folder=self._searched_emails.folder, emails=[], total=0)
+                return []
 
             grouped_messages = MessageParser.group_messages(messages)[::-1]
             fetchs = {}
@@ -1769,6 +2308,7 @@ class IMAPManager(imaplib.IMAP4_SSL):
             for index, grouped_message in enumerate(grouped_messages):
                 uid = MessageParser.get_uid(grouped_message)
                 email_uid_map[uid] = index
+                sizes[uid] = MessageParser.get_size(grouped_message)
                 headers = MessageParser.get_headers(grouped_message)
                 emails.append(
                     Email(
@@ -1788,6 +2328,14 @@ class IMAPManager(imaplib.IMAP4_SSL):
                     )
                 )
 
+                # Copies of the email in other folders, like the other
+                # Gmail labels of it or the folder another client moved
+                # it from, are already fetched.
+                email_copy = self._search_index.get_copy(emails[-1].message_id, sizes[uid])
+                if email_copy is not None:
+                    emails[-1].body = email_copy.body
+                    continue
+
                 body_part = (
                     MessageParser.get_part(grouped_message, ["TEXT", "PLAIN"]) or
                     MessageParser.get_part(grouped_message, ["TEXT", "HTML"]) or
@@ -1802,7 +2350,7 @@ class IMAPManager(imaplib.IMAP4_SSL):
             messages.clear()
             for body_part, uids in fetchs.items():
                 uids = sorted(uids, key=int)
-                status, bodies = self.uid(
+                status, bodies = self._uid_batched(
                     "FETCH",
                     ",".join(uids),
                     f"(BODY.PEEK[{body_part}] BODY.PEEK[{body_part}.MIME])",
@@ -1823,14 +2371,500 @@ class IMAPManager(imaplib.IMAP4_SSL):
         except Exception as e:
             fetched_email_count = len(emails)
             raise IMAPManagerException(
-                f"Error while fetching emails `{sequence_set}` in folder `{self._searched_emails.folder}`, fetched email length was `{fetched_email_count}`"
+                f"Error while fetching emails `{sequence_set}` in folder `{folder}`, fetched email length was `{fetched_email_count}`"
             ) from e
         finally:
             del messages
 
+        if self._selected_folder_state:
+            self._search_index.add(folder, self._selected_folder_state[0], emails, sizes)
+            self._search_index.set_folder_state(folder, self._selected_folder_state)
+        return emails
+
+    def _search_uid_window(
+        self,
+        search_criteria_query: str | bytes,
+        limit: int,
+        before: int | None = None,
+        after: int | None = None
+    ) -> List[str]:
+        """
+        Find the `limit` uids of the selected folder that are right
+        before `before`, or right after `after`, and match the query.
+        If the server supports PARTIAL, the page is found with a single
+        search. Otherwise uid ranges are searched instead of the whole
+        folder, the range is doubled until enough uids are found, so the
+        transfer depends on the page size rather than the folder size.
+
+        Returns:
+            list[str]: Found uids, newest first.
+        """
+        _, exists, _, uidnext = self._selected_folder_state or (None, 0, None, None)
+        if not exists:
+            return []
+
+        def with_uid_range(uid_range: str) -> str | bytes:
+            criteria = search_criteria_query or "ALL"
+            if isinstance(criteria, bytes):
+                return f"UID {uid_range} ".encode() + criteria
+            return f"UID {uid_range} {criteria}"
+
+        if self.is_supported("PARTIAL"):
+            if after is None:
+                if before is not None and before <= 1:
+                    return []
+                _, partial_uids = self._search_uids(
+                    with_uid_range(f"1:{before - 1}") if before else search_criteria_query or "ALL",
+                    (1, limit)
+                )
+                return partial_uids.newest()
+
+            # `n:*` matches the last uid even if it is lower than `n`.
+            _, partial_uids = self._search_uids(
+                with_uid_range(f"{after + 1}:*"), (1, limit), from_oldest=True
+            )
+            return [uid for uid in partial_uids.newest() if int(uid) > after]
+
+        if uidnext:
+            max_uid = int(uidnext) - 1
+        else:
+            status, data = self.uid("SEARCH", None, "UID *")
+            if status != "OK" or not data or not data[0]:
+                raise IMAPManagerException(f"Could not find the last uid: `{status}`")
+            max_uid = int(data[0].split()[-1])
+
+        def search_range(start: int, end: int) -> List[int]:
+            status, data = self.uid(
+                "SEARCH", None, f"UID {start}:{end}", search_criteria_query or "ALL"
+            )
+            if status != "OK":
+                raise IMAPManagerException(
+                    f"Error while searching uids `{start}:{end}`, search query was `{search_criteria_query}`: `{status}`"
+                )
+            return list(map(int, data[0].split())) if data and data[0] else []
+
+        window = max(limit * 2, KEYSET_MIN_UID_WINDOW)
+        uids: List[int] = []
+        if after is None:
+            end = min(before - 1, max_uid) if before else max_uid
+            while end >= 1 and len(uids) < limit:
+                start = max(1, end - window + 1)
+                uids.extend(sorted(search_range(start, end), reverse=True))
+                end, window = start - 1, window * 2
+            return [str(uid) for uid in uids[:limit]]
+
+        start = after + 1
+        while start <= max_uid and len(uids) < limit:
+            end = min(max_uid, start + window - 1)
+            uids.extend(sorted(search_range(start, end)))
+            start, window = end + 1, window * 2
+        return [str(uid) for uid in uids[:limit][::-1]]
+
+    def _get_emails_by_uid(
+        self,
+        folder: str | None,
+        search: str | SearchCriteria,
+        limit: int,
+        before: str | None = None,
+        after: str | None = None
+    ) -> Mailbox:
+        if not folder:
+            folder = Folder.All if search else Folder.Inbox
+        if limit < 1:
+            raise ValueError(f"Invalid `limit`: {limit}. `limit` must be greater than or equal to 1.")
+
+        self.select(folder, readonly=True)
+        search_criteria_query = (
+            self.build_search_criteria_query(search).encode("utf-8") if search else ""
+        )
+        uids = self._search_uid_window(
+            search_criteria_query,
+            limit,
+            int(before) if before else None,
+            int(after) if after else None
+        )
+        folder_name = self._extract_folder_name(
+            self.find_matching_folder(str(folder), encoded=False) or folder
+        )
+        _, exists, _, _ = self._selected_folder_state or (None, 0, None, None)
         return Mailbox(
-            folder=self._searched_emails.folder, emails=emails, total=self._searched_emails.count
+            folder=folder_name,
+            emails=self._fetch_emails(uids, folder_name),
+            total=-1 if search else exists
+        )
+
+    def search_local(
+        self,
+        folder: str | None = None,
+        search: str | SearchCriteria = "",
+        limit: int = GET_EMAILS_OFFSET_END
+    ) -> Mailbox | None:
+        """
+        Search the emails of the folder in the local index, see
+        `SearchIndex`, instead of on the server.
+
+        If every email of the folder is indexed, see `sync_search_index`,
+        any search criteria is answered without a command. Otherwise only
+        text criteria are searched among the emails that are fetched so
+        far, and the matches are checked against the uids of the folder
+        on the server with a single `UID SEARCH`, the ones that no longer
+        exist are dropped.
+
+        Args:
+            folder (str, optional): Folder to search. Defaults to inbox.
+            search (str | SearchCriteria, optional): Text to search in every
+            field, or search criteria.
+            limit (int, optional): Maximum number of emails to return.
+            Defaults to 10.
+
+        Returns:
+            Mailbox | None: Matches, newest first, `total` is -1 since the
+            matches are not counted. None if the search has to be made on
+            the server, the folder is not completely indexed and `search`
+            has criteria other than text, like flags or dates.
+
+        Example:
+            >>> search_local("INBOX", SearchCriteria(subject="invo"))
+            Mailbox(folder='INBOX', emails=[Email(uid="1499", subject="Invoice of March", ...)], total=-1)
+        """
+        folder = folder or Folder.Inbox
+        folder_name = self._get_folder_name(folder)
+        if self._search_index.is_complete(folder_name):
+            emails = self._search_index.search(folder_name, search, limit)
+            if emails is not None:
+                return Mailbox(folder=folder_name, emails=emails, total=-1)
+
+        if not has_only_text_criteria(search):
+            return None
+
+        return self._search_fetched_emails(folder, folder_name, search, limit)
+
+    @handle_idle
+    def _search_fetched_emails(
+        self,
+        folder: str,
+        folder_name: str,
+        search: str | SearchCriteria,
+        limit: int
+    ) -> Mailbox | None:
+        """See `search_local`."""
+        self.select(folder, readonly=True)
+        if self._selected_folder_state:
+            self._search_index.set_folder_state(folder_name, self._selected_folder_state)
+
+        while True:
+            emails = self._search_index.search(folder_name, search, limit)
+            if emails is None:
+                return None
+            if not emails:
+                break
+
+            uids = UIDSet(email.uid for email in emails)
+            _, existing_uids = self._search_uids(f"UID {uids}")
+            if existing_uids == uids:
+                break
+            # Search again, the emails after the removed ones fill the page.
+            self._search_index.remove(folder_name, uids - existing_uids)
+
+        return Mailbox(folder=folder_name, emails=emails, total=-1)
+
+    @handle_idle
+    def get_emails_before(
+        self,
+        folder: str | None = None,
+        uid: str | None = None,
+        limit: int = GET_EMAILS_OFFSET_END,
+        search: str | SearchCriteria = ""
+    ) -> Mailbox:
+        """
+        Fetch the emails that are older than `uid`, newest first. Pages
+        are anchored to uids instead of positions, so they do not shift
+        when emails arrive or are deleted between page loads.
+
+        Args:
+            folder (str, optional): Folder to fetch the emails of, defaults
+            like in `search_emails`.
+            uid (str, optional): Uid of the oldest email of the previous
+            page. Defaults to None, the newest emails are fetched.
+            limit (int, optional): Maximum number of emails to fetch.
+            Defaults to 10.
+            search (str | SearchCriteria, optional): Search criteria. Defaults to "ALL".
+
+        Returns:
+            Mailbox: Fetched emails, `total` is the number of emails in the
+            folder, or -1 if `search` is given since the matches are not
+            counted.
+
+        Example:
+            >>> get_emails_before("INBOX", "1500", 2)
+            Mailbox(folder='INBOX', emails=[Email(uid="1499", ...), Email(uid="1496", ...)], total=1320)
+        """
+        return self._get_emails_by_uid(folder, search, limit, before=uid)
+
+    @handle_idle
+    def get_emails_after(
+        self,
+        folder: str | None,
+        uid: str,
+        limit: int = GET_EMAILS_OFFSET_END,
+        search: str | SearchCriteria = ""
+    ) -> Mailbox:
+        """
+        Fetch the emails that are newer than `uid`, newest first, e.g.
+        the emails that arrived after the first page is loaded. See
+        `get_emails_before`.
+
+        Example:
+            >>> get_emails_after("INBOX", "1500", 2)
+            Mailbox(folder='INBOX', emails=[Email(uid="1502", ...), Email(uid="1501", ...)], total=1322)
+        """
+        return self._get_emails_by_uid(folder, search, limit, after=uid)
+
+    def iter_email_sources(
+        self,
+        folder: str,
+        chunk_size: int = BULK_FETCH_CHUNK_SIZE
+    ) -> Iterator[tuple[str, bytes]]:
+        """
+        Fetch the source of every email in a folder, `chunk_size` emails
+        per command, in the bulk lane. The session is released between
+        the chunks, so commands of the other lanes, like opening an email
+        while a large folder is being exported, wait for the chunk in
+        flight at most.
+
+        Args:
+            folder (str): Folder to fetch the emails of.
+            chunk_size (int, optional): Number of emails fetched per command.
+            Defaults to BULK_FETCH_CHUNK_SIZE.
+
+        Yields:
+            tuple[str, bytes]: Uid and the source of the email, oldest first.
+
+        Example:
+            >>> for uid, source in iter_email_sources("INBOX"):
+            ...     print(uid, len(source))
+            1 2048
+            2 4096
+        """
+        chunk_size = choose_positive(chunk_size, BULK_FETCH_CHUNK_SIZE)
+        with self._scheduler.slot(Lane.Bulk):
+            self.select(folder, readonly=True)
+            selected_folder = self._selected_folder
+            _, uids = self._search_uids("ALL")
+
+        for chunk in uids.chunks(chunk_size):
+            sequence_set = str(chunk)
+            with self._scheduler.slot(Lane.Bulk):
+                # Commands of the other lanes may have selected another
+                # folder between the chunks.
+                if self._selected_folder != selected_folder:
+                    self.select(*selected_folder)
+                status, messages = self.uid("FETCH", sequence_set, "(BODY.PEEK[])")
+            if status != "OK":
+                raise IMAPManagerException(
+                    f"`{sequence_set}` in folder `{folder}` could not fetched: `{status}`"
+                )
+
+            for message in messages:
+                if isinstance(message, tuple) and (
+                    match := FETCH_UID_PATTERN.search(message[0])
+                ):
+                    yield match.group(1).decode(), message[1]
+
+    def sync_search_index(
+        self,
+        folder: str,
+        chunk_size: int = BULK_FETCH_CHUNK_SIZE
+    ) -> int:
+        """
+        Index every email of the folder, so any search of the folder is
+        answered locally by `search_local` until the folder changes on
+        the server. Only the emails that are not indexed yet are fetched,
+        `chunk_size` emails per command, the flags of the indexed ones are
+        refreshed and the ones that no longer exist are removed. Commands
+        are run in the bulk lane like in `iter_email_sources`.
+
+        Conversations of the emails are linked by their headers as they
+        are indexed, and by `THREAD=REFERENCES` of the server too if it is
+        supported, see `get_conversation`.
+
+        Args:
+            folder (str): Folder to index.
+            chunk_size (int, optional): Number of emails fetched per command.
+            Defaults to BULK_FETCH_CHUNK_SIZE.
+
+        Returns:
+            int: Number of the emails that are newly indexed.
+
+        Example:
+            >>> sync_search_index("INBOX")
+            1204
+            >>> sync_search_index("INBOX")
+            0
+        """
+        chunk_size = choose_positive(chunk_size, BULK_FETCH_CHUNK_SIZE)
+        folder_name = self._get_folder_name(folder)
+        with self._scheduler.slot(Lane.Bulk):
+            self.select(folder, readonly=True)
+            selected_folder = self._selected_folder
+            folder_state = self._selected_folder_state or (None, 0, None, None)
+            self._search_index.check_uid_validity(folder_name, folder_state[0])
+            _, uids = self._search_uids("ALL")
+
+        indexed_uids = self._search_index.get_uids(folder_name)
+        self._search_index.remove(folder_name, indexed_uids - uids)
+
+        def run_in_chunks(chunks: Iterator[UIDSet], command: Callable[[UIDSet], object]) -> None:
+            for chunk in chunks:
+                with self._scheduler.slot(Lane.Bulk):
+                    # Commands of the other lanes may have selected another
+                    # folder between the chunks.
+                    if self._selected_folder != selected_folder:
+                        self.select(*selected_folder)
+                    command(chunk)
+
+        run_in_chunks(
+            (uids & indexed_uids).chunks(BULK_FLAGS_FETCH_CHUNK_SIZE),
+            lambda chunk: self._search_index.set_flags(folder_name, {
+                flags.uid: flags.flags for flags in self.get_email_flags(str(chunk))
+            })
+        )
+        new_uids = uids - indexed_uids
+        run_in_chunks(
+            new_uids.chunks(chunk_size),
+            lambda chunk: self._fetch_emails([str(uid) for uid in reversed(chunk)], folder_name)
+        )
+
+        if self.is_supported("THREAD=REFERENCES"):
+            # Server also threads the emails that do not refer to each
+            # other, like the replies of the clients that drop references.
+            with self._scheduler.slot(Lane.Bulk):
+                if self._selected_folder != selected_folder:
+                    self.select(*selected_folder)
+                self._link_server_threads(folder_name)
+
+        self._search_index.set_folder_state(folder_name, folder_state, complete=True)
+        return len(new_uids)
+
+    def _link_server_threads(self, folder_name: str) -> None:
+        status, threads = self.uid("THREAD", "REFERENCES", "UTF-8", "ALL")
+        if status != "OK":
+            return
+        for thread_uids in MessageParser.get_thread_uids(threads):
+            if len(thread_uids) > 1:
+                self._search_index.link(folder_name, thread_uids)
+
+    def get_conversation(self, folder: str, uid: str) -> Conversation:
+        """
+        Get the emails of the conversation of the email across folders,
+        like its replies in Sent, ordered as a reply tree with the JWZ
+        algorithm, see `thread_emails`.
+
+        Conversations are linked in the local index as the emails are
+        fetched or indexed with `sync_search_index`, so only the emails
+        that are indexed are in the conversation and nothing is threaded
+        again. Emails of each folder are refreshed with a single pipelined
+        `UID FETCH` of their flags, the ones that no longer exist are left
+        out.
+
+        Args:
+            folder (str): Folder containing the email.
+            uid (str): Uid of the email.
+
+        Returns:
+            Conversation: Emails of the conversation, the first email
+            first, every email followed by its replies.
+
+        Raises:
+            IMAPManagerException: If the email does not exist.
+
+        Example:
+            >>> get_conversation("INBOX", "1499")
+            Conversation(emails=[ConversationEmail(folder='INBOX', email=Email(uid="1499", subject="Meeting", ...), depth=0),
+            ConversationEmail(folder='Sent', email=Email(uid="87", subject="Re: Meeting", ...), depth=1)])
+        """
+        folder_name = self._get_folder_name(folder)
+        conversation_emails = self._search_index.get_conversation(folder_name, uid)
+        if conversation_emails is None:
+            self._fetch_conversation_email(folder, uid)
+            conversation_emails = self._search_index.get_conversation(folder_name, uid)
+            if not conversation_emails:
+                raise IMAPManagerException(f"Email `{uid}` in folder `{folder}` could not be found.")
+
+        folder_uids: dict[str, list[str]] = {}
+        for conversation_email in conversation_emails:
+            folder_uids.setdefault(conversation_email.folder, []).append(conversation_email.email.uid)
+        existing_uids = {
+            email_folder: self._refresh_conversation_emails(email_folder, UIDSet(uids))
+            for email_folder, uids in folder_uids.items()
+        }
+
+        conversation_emails = self._search_index.get_conversation(folder_name, uid) or []
+        return Conversation(emails=thread_emails(
+            conversation_email for conversation_email in conversation_emails
+            if int(conversation_email.email.uid) in existing_uids.get(conversation_email.folder, UIDSet())
+        ))
+
+    def locate_email(self, message_id: str) -> List[MessageLocation]:
+        """
+        Find every copy of the email with the Message-ID across folders.
+        Copies are looked up in the local index, which is updated by every
+        header fetch and by `sync_search_index`. Folders are searched on
+        the server with `UID SEARCH HEADER MESSAGE-ID` only if the email is
+        not indexed at all, and the copies that are found are indexed.
+
+        Args:
+            message_id (str): Message-ID of the email, like `<caef..@dom.com>`.
+
+        Returns:
+            list[MessageLocation]: Folders, UIDVALIDITY and uids of the copies,
+            empty if the email is not found.
+
+        Example:
+            >>> locate_email("<caef..@dom.com>")
+            [MessageLocation(folder='INBOX', uid_validity='7', uid='1499'),
+            MessageLocation(folder='Sent', uid_validity='2', uid='87')]
+        """
+        locations = self._search_index.locate(message_id)
+        if locations or not message_id.strip():
+            return locations
+
+        for folder in self.get_searchable_folders():
+            self._index_emails_by_message_id(folder, message_id.strip())
+        return self._search_index.locate(message_id)
+
+    @handle_idle
+    def _index_emails_by_message_id(self, folder: str, message_id: str) -> None:
+        """Fetch the emails of the folder with the Message-ID to index them, see `locate_email`."""
+        self.select(folder, readonly=True)
+        _, uids = self._search_uids(
+            self.build_search_criteria_query(SearchCriteria(message_id=[message_id])).encode("utf-8")
         )
+        self._fetch_emails([str(uid) for uid in reversed(uids)], self._get_folder_name(folder))
+
+    @handle_idle
+    def _fetch_conversation_email(self, folder: str, uid: str) -> None:
+        """Fetch the email to index it, see `get_conversation`."""
+        self.select(folder, readonly=True)
+        self._fetch_emails([uid], self._get_folder_name(folder))
+
+    @handle_idle
+    def _refresh_conversation_emails(self, folder_name: str, uids: UIDSet) -> UIDSet:
+        """
+        Refresh the flags of the indexed emails of the folder and remove
+        the ones that no longer exist, see `get_conversation`.
+
+        Returns:
+            UIDSet: Uids of the emails that exist.
+        """
+        self.select(folder_name, readonly=True)
+        if self._selected_folder_state:
+            self._search_index.check_uid_validity(folder_name, self._selected_folder_state[0])
+        flags = self.get_email_flags(str(uids))
+        existing_uids = UIDSet(email_flags.uid for email_flags in flags)
+        self._search_index.set_flags(folder_name, {email_flags.uid: email_flags.flags for email_flags in flags})
+        self._search_index.remove(folder_name, uids - existing_uids)
+        return existing_uids
 
     def any_new_email(self) -> bool:
         """
@@ -1855,7 +2889,7 @@ class IMAPManager(imaplib.IMAP4_SSL):
             [Email(uid="2", sender="b@gmail.com", ...), Email(uid="3", sender="c@gmail.com", ...)]
         """
         search_start_time = min(self._new_message_timestamps)
-        self.search_emails(
+        self.search_folder(
             Folder.Inbox,
             SearchCriteria(
                 # search_start_time must be converted to an IMAP-compatible date format
@@ -2039,7 +3073,7 @@ class IMAPManager(imaplib.IMAP4_SSL):
                 "Folder should be selected before fetching flags."
             )
 
-        status, message = self.uid("FETCH", sequence_set, "(FLAGS)")
+        status, message = self._uid_batched("FETCH", sequence_set, "(FLAGS)")
 
         try:
             flags_list = []
@@ -2188,12 +3222,20 @@ class IMAPManager(imaplib.IMAP4_SSL):
         draft_mailbox_name = self.find_matching_folder(Folder.Drafts)
         self.select(draft_mailbox_name)
 
-        status, data = self.append(
-            draft_mailbox_name,
-            "",
-            imaplib.Time2Internaldate(time.time()),
-            email.as_string().encode("utf-8"),
-        )  # type: ignore
+        # Attachments are streamed from their files, see `MIMEWriter`.
+        spool, _ = MIMEWriter.spool(
+            email,
+            email_policy.SMTPUTF8 if self.utf8_enabled else email_policy.SMTP,
+            TransferMode.EightBit
+        )
+        with spool:
+            status, data = self.append_file(
+                draft_mailbox_name,
+                "",
+                imaplib.Time2Internaldate(time.time()),
+                spool,
+                spool.seek(0, 2)
+            )  # type: ignore
         if not status:
             raise IMAPManagerException(f"Error while saving email as draft: `{status}`")
 
@@ -2201,7 +3243,6 @@ class IMAPManager(imaplib.IMAP4_SSL):
             MessageParser.group_messages(data)[0]
         )
 
-    @handle_idle
     def _mark_email(
         self,
         folder: str,
@@ -2212,7 +3253,9 @@ class IMAPManager(imaplib.IMAP4_SSL):
         err_msg: str,
     ) -> IMAPCommandResult:
         """
-        Mark an email with a specific flag with given `command`.
+        Mark an email with a specific flag with given `command`. Changes
+        that arrive within `FLAG_CHANGE_WINDOW` are sent together, see
+        `FlagChanges`, so it must not be called while holding the session.
 
         Args:
             folder (str): Folder containing the email.
@@ -2227,19 +3270,56 @@ class IMAPManager(imaplib.IMAP4_SSL):
                 - A bool indicating whether the email was marked successfully.
                 - A string containing a success message or an error message.
         """
-        self.select(folder)
-
         if not mark:
             raise IMAPManagerException("`mark` cannot be empty.")
 
-        mark_result = self._parse_command_result(
-            self.uid("STORE", sequence_set, command, mark), success_msg, err_msg
+        status, message = self._flag_changes.change(
+            folder, self._compress_sequence_set(sequence_set), command, str(mark)
         )
+        return (True, success_msg) if status else (False, f"{err_msg}: {message}")
 
-        if mark_result[0]:
-            return self._parse_command_result(self.expunge(), success_msg, err_msg)
+    @handle_idle
+    def _store_flags(
+        self, folder: str, sequence_set: str, command: str, flag: str
+    ) -> IMAPCommandResult:
+        """
+        Add or remove `flag` of the emails with `UID STORE`. The server
+        does not send the new flags back, and the folder is not expunged,
+        so the emails that other clients marked as `\\Deleted` stay.
 
-        return mark_result
+        Args:
+            folder (str): Folder containing the emails.
+            sequence_set (str): Sequence set of the emails.
+            command (str): `+FLAGS` or `-FLAGS`.
+            flag (str): Flag to add or remove.
+        """
+        self.select(folder)
+        # Flag changes do not change EXISTS, which cached searches of
+        # the folders without HIGHESTMODSEQ rely on, so the searches
+        # of the folder that depend on flags are dropped.
+        selected_folder = self._selected_folder[0] if self._selected_folder else None
+        def is_flag_search(key: SearchCacheKey) -> bool:
+            searched_folder, search_criteria_query, *_ = key
+            if searched_folder is None or searched_folder[0] != selected_folder:
+                return False
+            if isinstance(search_criteria_query, str):
+                search_criteria_query = search_criteria_query.encode()
+            return bool(FLAG_SEARCH_KEY_PATTERN.search(search_criteria_query))
+        self._search_cache.discard(is_flag_search)
+
+        store_result = self._parse_command_result(
+            self._uid_batched("STORE", sequence_set, f"{command}.SILENT", flag)
+        )
+        if store_result[0]:
+            folder_name = self._get_folder_name(folder)
+            try:
+                self._search_index.change_flag(
+                    folder_name, UIDSet.parse(sequence_set), flag, command == "+FLAGS"
+                )
+            except ValueError:
+                # `*` can not be resolved, e.g. `1:*`.
+                self._search_index.mark_incomplete(folder_name)
+        return store_result
 
     def mark_email(
         self, sequence_set: str, mark: str | Mark, folder: str = Folder.Inbox
@@ -2356,21 +3436,92 @@ class IMAPManager(imaplib.IMAP4_SSL):
                 f"Destination folder `{destination_folder}` is the same as the source folder `{source_folder}`.",
             )
 
-        self.select(source_folder)
+        sequence_set = self._compress_sequence_set(sequence_set)
 
         succes_msg = f"Email(s) `{sequence_set}` moved successfully from `{source_folder}` to `{destination_folder}`."
         err_msg = f"Failed to move email(s) `{sequence_set}` from `{source_folder}` to `{destination_folder}`."
 
-        move_result = self._parse_command_result(
-            self.uid("MOVE", sequence_set, self._encode_folder(destination_folder)),
-            succes_msg,
-            err_msg,
+        move_result, _ = self._move_emails(source_folder, destination_folder, sequence_set)
+        return self._parse_command_result(move_result, succes_msg, err_msg)
+
+    def _move_emails(
+        self, source_folder: str, destination_folder: str | bytes, sequence_set: str
+    ) -> tuple[tuple[str, List[bytes | None]], UIDSet | None]:
+        """
+        Move the emails with `UID MOVE`, which expunges them from the
+        source folder itself. If the server does not support MOVE, they
+        are copied and expunged from the source folder instead.
+
+        Returns:
+            tuple: Result of the move and the uids of the emails in the
+            destination folder, None if the server does not report them
+            (UIDPLUS).
+
+        References:
+            https://datatracker.ietf.org/doc/html/rfc6851
+            https://datatracker.ietf.org/doc/html/rfc4315
+        """
+        self.select(source_folder)
+        if isinstance(destination_folder, str):
+            destination_folder = self._encode_folder(destination_folder)
+
+        self.untagged_responses.pop("COPYUID", None)
+        if self.is_supported("MOVE"):
+            result = self._uid_batched("MOVE", sequence_set, destination_folder)
+        else:
+            result = self._uid_batched("COPY", sequence_set, destination_folder)
+            if result[0] == "OK":
+                result = self._expunge_emails(sequence_set)
+
+        if result[0] == "OK":
+            self._remove_from_search_index(source_folder, sequence_set)
+
+        copyuid_responses = self.untagged_responses.pop("COPYUID", [])
+        if not copyuid_responses:
+            return result, None
+
+        destination_uids = UIDSet()
+        for copyuid_response in copyuid_responses:
+            destination_uids |= MessageParser.get_copied_uids(copyuid_response)[1]
+        return result, destination_uids
+
+    def _get_folder_name(self, folder: str | Folder) -> str:
+        """Name of the folder as in `Mailbox.folder`, e.g. `Inbox` -> `INBOX`."""
+        return self._extract_folder_name(
+            self.find_matching_folder(str(folder), encoded=False) or folder
         )
 
-        if move_result[0]:
-            return self._parse_command_result(self.expunge(), succes_msg, err_msg)
+    def _remove_from_search_index(self, folder: str, sequence_set: str) -> None:
+        folder_name = self._get_folder_name(folder)
+        try:
+            self._search_index.remove(folder_name, UIDSet.parse(sequence_set))
+        except ValueError:
+            # `*` can not be resolved, e.g. `1:*`.
+            self._search_index.clear(folder_name)
+
+    def _expunge_emails(self, sequence_set: str) -> tuple[str, List[bytes | None]]:
+        """
+        Permanently remove the emails of the selected folder. Only the
+        given emails are expunged with `UID EXPUNGE` if the server
+        supports UIDPLUS, otherwise the whole folder is expunged. Commands
+        are pipelined, see `_uid_pipelined`.
+
+        Returns:
+            tuple[str, list[bytes | None]]: Result of the first failed
+            command, or of the last one.
+        """
+        commands = self._split_uid_command("STORE", sequence_set, "+FLAGS.SILENT", "\\Deleted")
+        if self.is_supported("UIDPLUS"):
+            results = self._uid_pipelined(
+                commands + self._split_uid_command("EXPUNGE", sequence_set)
+            )
+        else:
+            results = self._uid_pipelined(commands)
+            if all(typ == "OK" for typ, _ in results):
+                results.append(self.expunge())
 
-        return move_result
+        self.untagged_responses.pop("EXPUNGE", None)
+        return next((result for result in results if result[0] != "OK"), results[-1])
 
     @handle_idle
     def copy_email(
@@ -2406,21 +3557,17 @@ class IMAPManager(imaplib.IMAP4_SSL):
         self._check_folder_names(source_folder, destination_folder)
 
         self.select(source_folder)
+        sequence_set = self._compress_sequence_set(sequence_set)
 
         succes_message = f"Email(s) `{sequence_set}` copied successfully from `{source_folder}` to `{destination_folder}`."
         err_msg = f"Failed to copy email(s) `{sequence_set}` from `{source_folder}` to `{destination_folder}`."
 
-        copy_result = self._parse_command_result(
-            self.uid("COPY", sequence_set, self._encode_folder(destination_folder)),
+        return self._parse_command_result(
+            self._uid_batched("COPY", sequence_set, self._encode_folder(destination_folder)),
             succes_message,
             err_msg,
         )
 
-        if copy_result[0]:
-            return self._parse_command_result(self.expunge(), succes_message, err_msg)
-
-        return copy_result
-
     @handle_idle
     def delete_email(self, folder: str, sequence_set: str) -> IMAPCommandResult:
         """
@@ -2447,34 +3594,52 @@ class IMAPManager(imaplib.IMAP4_SSL):
             https://datatracker.ietf.org/doc/html/rfc9051#name-formal-syntax (check sequence-set for more information.)
         """
         self._check_folder_names(folder)
+        sequence_set = self._compress_sequence_set(sequence_set)
+
+        success_msg = f"Email(s) `{sequence_set}` deleted from `{folder}` successfully."
+        err_msg = f"There was an error while deleting the email(s) `{sequence_set}` from `{folder}`."
+
+        trash_mailbox_name = self.find_matching_folder(Folder.Trash, False)
+        if not trash_mailbox_name:
+            raise IMAPManagerException(
+                f"Error while deleting email(s) `{sequence_set}`, trash folder could not be found."
+            )
+
+        if folder in (trash_mailbox_name, Folder.Trash):
+            self.select(folder)
+            delete_result = self._parse_command_result(
+                self._expunge_emails(sequence_set), success_msg, err_msg
+            )
+            if delete_result[0]:
+                self._remove_from_search_index(folder, sequence_set)
+            return delete_result
 
         try:
-            trash_mailbox_name = self.find_matching_folder(Folder.Trash, False)
-            if folder != trash_mailbox_name or folder != Folder.Trash:
-                status, _ = self.move_email(folder, trash_mailbox_name, sequence_set)
-                if not status:
-                    raise IMAPManagerException(
-                        f"Error while moving email(s) `{sequence_set}` to trash folder for deletion."
-                    )
+            (status, data), trash_uids = self._move_emails(
+                folder, self._encode_folder(trash_mailbox_name), sequence_set
+            )
+            if status != "OK":
+                raise IMAPManagerException(
+                    f"Error while moving email(s) `{sequence_set}` to trash folder for deletion."
+                )
         except Exception as e:
             raise IMAPManagerException(
                 f"Error while moving email(s) `{sequence_set}` to trash folder for deletion: `{str(e)}`."
             ) from e
 
-        self.select(self._encode_folder(trash_mailbox_name))
-
-        success_msg = f"Email(s) `{sequence_set}` deleted from `{folder}` successfully."
-        err_msg = f"There was an error while deleting the email(s) `{sequence_set}` from `{folder}`."
+        if trash_uids is None:
+            # Emails can not be told apart from the rest of the trash
+            # folder without UIDPLUS, expunging it would remove them too.
+            return (
+                True,
+                f"Email(s) `{sequence_set}` moved from `{folder}` to `{trash_mailbox_name}` successfully."
+            )
 
-        delete_result = self._parse_command_result(
-            self.uid("STORE", sequence_set, "+FLAGS", "\\Deleted"), success_msg, err_msg
+        self.select(self._encode_folder(trash_mailbox_name))
+        return self._parse_command_result(
+            self._expunge_emails(str(trash_uids)), success_msg, err_msg
         )
 
-        if delete_result[0]:
-            return self._parse_command_result(self.expunge(), success_msg, err_msg)
-
-        return delete_result
-
     @handle_idle
     def create_folder(
         self, folder_name: str, parent_folder: str | None = None
@@ -0,0 +1,139 @@
+"""
+MailMerge
+Renders personalized emails from a template `Draft` for every
+`MergeRecipient`. Placeholders like `{{ name }}` in the subject and the
+body are replaced with the variables of the recipient, `{{ address }}`
+is always available. Values are HTML escaped if the body is HTML.
+
+Attachments of the template are base64 encoded once when the merge is
+created, and every rendered email shares the same encoded files instead
+of encoding them again, see `MIMEWriter.add_file_attachment`.
+
+Primarily designed for use by `SMTPPool.send_bulk`.
+"""
+from __future__ import annotations
+import io
+import os
+import re
+import html
+import base64
+from typing import BinaryIO
+from dataclasses import replace
+from email.message import EmailMessage
+
+from .smtp import SMTPManager, MAX_ATTACHMENT_SIZE
+from .mime_writer import MIMEWriter
+from .parser import HTMLParser
+from .types import Draft, Attachment, MergeRecipient
+
+"""
+Exceptions
+"""
+class MailMergeException(Exception):
+    """Custom exception for MailMerge class."""
+
+"""
+Custom consts
+"""
+PLACEHOLDER_PATTERN = re.compile(r"\{\{\s*([\w.-]+)\s*\}\}")
+ADDRESS_VARIABLE = "address"
+
+class MailMerge:
+    """
+    Template of a mail merge with its pre-encoded attachments. Must be
+    closed after use to remove the encoded attachments, can be used as
+    a context manager.
+
+    Args:
+        template (Draft): Draft whose `subject` and `body` contain the
+        placeholders, `receivers` is ignored.
+    """
+    def __init__(self, template: Draft):
+        self._template = replace(template, attachments=[])
+        self._is_html = HTMLParser.is_html(template.body)
+        self._attachments: list[tuple[Attachment, str]] = []
+        try:
+            for attachment in template.attachments or []:
+                self._attachments.append((attachment, self._encode_attachment(attachment)))
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self) -> MailMerge:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @staticmethod
+    def _encode_attachment(attachment: Attachment) -> str:
+        if attachment.size > MAX_ATTACHMENT_SIZE:
+            raise MailMergeException(
+                f"Attachment size `{attachment.size}` is too large. Max size is {MAX_ATTACHMENT_SIZE}."
+            )
+
+        file: BinaryIO
+        if attachment.data:
+            data = attachment.data
+            file = io.BytesIO(base64.b64decode(data) if isinstance(data, str) else data)
+        elif attachment.path and os.path.isfile(attachment.path):
+            file = open(attachment.path, "rb")
+        else:
+            raise MailMergeException(f"Attachment `{attachment.name}` has no content.")
+
+        with file:
+            return MIMEWriter.encode_file(file)
+
+    def _substitute(self, text: str, recipient: MergeRecipient, escape: bool) -> str:
+        variables = {**(recipient.variables or {}), ADDRESS_VARIABLE: recipient.address}
+
+        def replace_placeholder(match: re.Match) -> str:
+            name = match.group(1)
+            if name not in variables:
+                raise MailMergeException(
+                    f"Variable `{name}` is missing for {recipient.address}."
+                )
+            value = str(variables[name])
+            return html.escape(value) if escape else value
+
+        return PLACEHOLDER_PATTERN.sub(replace_placeholder, text)
+
+    def render(self, recipient: MergeRecipient) -> EmailMessage:
+        """
+        Create the email of `recipient`.
+
+        Raises:
+            MailMergeException: If a variable of the template is missing.
+        """
+        msg = SMTPManager.create_email(replace(
+            self._template,
+            receivers=recipient.address,
+            subject=self._substitute(self._template.subject, recipient, False),
+            body=self._substitute(self._template.body, recipient, self._is_html),
+        ))
+
+        for attachment, encoded_path in self._attachments:
+            maintype, subtype = (attachment.type or "application/octet-stream").split("/")
+            MIMEWriter.add_file_attachment(
+                msg,
+                encoded_path,
+                maintype,
+                subtype,
+                attachment.name,
+                is_encoded=True
+            ).add_header("Content-Length", str(attachment.size))
+
+        return msg
+
+    def close(self) -> None:
+        for _, encoded_path in self._attachments:
+            try:
+                os.remove(encoded_path)
+            except OSError:
+                pass
+        self._attachments.clear()
+
+__all__ = [
+    "MailMerge",
+    "MailMergeException",
+]
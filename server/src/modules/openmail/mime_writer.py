@@ -0,0 +1,284 @@
+"""
+MIMEWriter
+Writes an `EmailMessage` to a file object part by part instead of
+flattening it into a single string. Attachments that are added with
+`MIMEWriter.add_file_attachment` are not loaded into memory at all,
+they are base64 encoded straight from their file while writing.
+
+Bodies are written with the cheapest transfer encoding the given
+`TransferMode` allows: 8bit text instead of quoted-printable/base64
+when the server accepts 8BITMIME, and raw binary attachments when it
+accepts BINARYMIME over CHUNKING.
+
+Primarily designed for use by the `SMTPManager` class, the message is
+written to a spooled temporary file which is then fed to DATA/BDAT.
+"""
+import os
+import copy
+import base64
+import shutil
+import uuid
+import tempfile
+from enum import IntEnum
+from typing import BinaryIO
+from email import policy as email_policy
+from email.policy import Policy
+from email.generator import BytesGenerator
+from email.message import EmailMessage, Message
+
+"""
+Enums
+"""
+class TransferMode(IntEnum):
+    """
+    What the body of the message is allowed to contain, ordered from
+    the most to the least restrictive.
+    """
+    SevenBit = 0
+    EightBit = 1 # 8BITMIME
+    Binary = 2 # BINARYMIME, requires CHUNKING
+
+"""
+Constants
+"""
+CRLF = b"\r\n"
+# RFC 5322, excluding CRLF
+MAX_LINE_LENGTH = 998
+STREAM_PATH_ATTR = "_openmail_stream_path"
+ENCODED_PATH_ATTR = "_openmail_encoded_path"
+BASE64_LINE_LENGTH = 76
+# 57 raw bytes are encoded to exactly one 76 character line.
+BASE64_READ_SIZE = 57 * 1024
+SPOOL_MAX_MEMORY = 1024 * 1024 # 1MB
+
+class MIMEWriter:
+    """A static class for writing MIME messages with bounded memory."""
+
+    @staticmethod
+    def add_file_attachment(
+        msg: EmailMessage,
+        path: str,
+        maintype: str,
+        subtype: str,
+        filename: str,
+        cid: str | None = None,
+        is_encoded: bool = False,
+    ) -> Message:
+        """
+        Add an attachment whose content is going to be read from `path`
+        while writing, instead of being kept in `msg`. If `is_encoded`
+        is True, `path` is a file created with `encode_file` and it is
+        copied as it is, so the same file can be shared by many messages
+        without being encoded again.
+
+        Returns:
+            Message: The attachment part that is added to `msg`.
+        """
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Attachment could not be found: {path}")
+
+        msg.add_attachment(
+            b"",
+            maintype=maintype,
+            subtype=subtype,
+            cid=cid,
+            filename=filename,
+        )
+        part = msg.get_payload(-1)
+        setattr(part, ENCODED_PATH_ATTR if is_encoded else STREAM_PATH_ATTR, path)
+        return part
+
+    @staticmethod
+    def is_streamed(part: Message) -> bool:
+        return bool(
+            getattr(part, STREAM_PATH_ATTR, None) or getattr(part, ENCODED_PATH_ATTR, None)
+        )
+
+    @staticmethod
+    def encode_file(file: BinaryIO) -> str:
+        """
+        Base64 encode `file` into a temporary file to be attached with
+        `add_file_attachment(..., is_encoded=True)`. The caller is
+        responsible for removing the returned file.
+
+        Returns:
+            str: Path of the encoded file.
+        """
+        with tempfile.NamedTemporaryFile(suffix=".b64", delete=False) as encoded_file:
+            try:
+                MIMEWriter._write_base64(file, encoded_file)
+            except Exception:
+                encoded_file.close()
+                os.remove(encoded_file.name)
+                raise
+        return encoded_file.name
+
+    @staticmethod
+    def _write_headers(
+        part: Message,
+        fp: BinaryIO,
+        policy: Policy,
+        transfer_encoding: str | None = None
+    ) -> None:
+        for name, value in part.raw_items():
+            if transfer_encoding and name.lower() == "content-transfer-encoding":
+                value = transfer_encoding
+            fp.write(policy.fold_binary(name, value))
+        fp.write(CRLF)
+
+    @staticmethod
+    def _is_8bit_safe(text: str) -> bool:
+        """Check if `text` can be sent as is with 8bit transfer encoding."""
+        return "\0" not in text and all(
+            len(line.encode("utf-8")) <= MAX_LINE_LENGTH for line in text.splitlines()
+        )
+
+    @staticmethod
+    def _write_leaf(
+        part: Message,
+        fp: BinaryIO,
+        policy: Policy,
+        mode: TransferMode
+    ) -> TransferMode:
+        """Write an in memory, non multipart part with the cheapest allowed encoding."""
+        transfer_encoding = (part.get("Content-Transfer-Encoding") or "7bit").lower()
+        if (
+            isinstance(part, EmailMessage)
+            and part.get_content_maintype() == "text"
+            and not part.is_attachment()
+        ):
+            text = part.get_content()
+            target_encoding = transfer_encoding
+            if mode >= TransferMode.EightBit and transfer_encoding != "8bit":
+                if not text.isascii() and MIMEWriter._is_8bit_safe(text):
+                    target_encoding = "8bit"
+            elif mode == TransferMode.SevenBit and transfer_encoding == "8bit":
+                target_encoding = "quoted-printable"
+
+            if target_encoding != transfer_encoding:
+                reencoded_part = copy.copy(part)
+                reencoded_part.set_content(
+                    text,
+                    subtype=part.get_content_subtype(),
+                    cte=target_encoding
+                )
+                part, transfer_encoding = reencoded_part, target_encoding
+        elif mode == TransferMode.Binary and transfer_encoding == "base64":
+            MIMEWriter._write_headers(part, fp, policy, "binary")
+            fp.write(part.get_payload(decode=True))
+            return TransferMode.Binary
+
+        BytesGenerator(fp, policy=policy).flatten(part, linesep="\r\n")
+        return TransferMode.EightBit if transfer_encoding == "8bit" else TransferMode.SevenBit
+
+    @staticmethod
+    def _write_base64(file: BinaryIO, fp: BinaryIO) -> None:
+        while chunk := file.read(BASE64_READ_SIZE):
+            encoded = base64.b64encode(chunk)
+            for i in range(0, len(encoded), BASE64_LINE_LENGTH):
+                fp.write(encoded[i:i + BASE64_LINE_LENGTH])
+                fp.write(CRLF)
+
+    @staticmethod
+    def _write_part(
+        part: Message,
+        fp: BinaryIO,
+        policy: Policy,
+        mode: TransferMode
+    ) -> TransferMode:
+        if encoded_path := getattr(part, ENCODED_PATH_ATTR, None):
+            MIMEWriter._write_headers(part, fp, policy)
+            with open(encoded_path, "rb") as file:
+                shutil.copyfileobj(file, fp)
+            return TransferMode.SevenBit
+
+        if MIMEWriter.is_streamed(part):
+            path = getattr(part, STREAM_PATH_ATTR)
+            if mode == TransferMode.Binary:
+                MIMEWriter._write_headers(part, fp, policy, "binary")
+                with open(path, "rb") as file:
+                    shutil.copyfileobj(file, fp)
+                return TransferMode.Binary
+            MIMEWriter._write_headers(part, fp, policy)
+            with open(path, "rb") as file:
+                MIMEWriter._write_base64(file, fp)
+            return TransferMode.SevenBit
+
+        if not part.is_multipart():
+            # Leaves other than streamed attachments are already in memory.
+            return MIMEWriter._write_leaf(part, fp, policy, mode)
+
+        boundary = part.get_boundary()
+        if not boundary:
+            boundary = "=" * 15 + uuid.uuid4().hex + "=="
+            part.set_boundary(boundary)
+
+        MIMEWriter._write_headers(part, fp, policy)
+        if part.preamble:
+            fp.write(part.preamble.encode("utf-8") + CRLF)
+
+        encoded_boundary = boundary.encode("ascii")
+        used_mode = TransferMode.SevenBit
+        for subpart in part.get_payload():
+            fp.write(b"--" + encoded_boundary + CRLF)
+            used_mode = max(used_mode, MIMEWriter._write_part(subpart, fp, policy, mode))
+            fp.write(CRLF)
+        fp.write(b"--" + encoded_boundary + b"--" + CRLF)
+
+        if part.epilogue:
+            fp.write(part.epilogue.encode("utf-8") + CRLF)
+
+        return used_mode
+
+    @staticmethod
+    def write(
+        msg: Message,
+        fp: BinaryIO,
+        policy: Policy = email_policy.SMTP,
+        mode: TransferMode = TransferMode.SevenBit
+    ) -> TransferMode:
+        """
+        Write `msg` to `fp` with CRLF line endings.
+
+        Args:
+            msg (Message): Message to write.
+            fp (BinaryIO): File object to write to.
+            policy (Policy, optional): Policy used to fold headers and
+            encode in memory parts. Defaults to `email.policy.SMTP`.
+            mode (TransferMode, optional): Most permissive body content
+            the receiving server accepts. Defaults to `TransferMode.SevenBit`.
+
+        Returns:
+            TransferMode: Body content that is actually written, tells which
+            BODY parameter must be declared in MAIL FROM.
+        """
+        return MIMEWriter._write_part(msg, fp, policy, mode)
+
+    @staticmethod
+    def spool(
+        msg: Message,
+        policy: Policy = email_policy.SMTP,
+        mode: TransferMode = TransferMode.SevenBit,
+        max_memory: int = SPOOL_MAX_MEMORY
+    ) -> tuple[tempfile.SpooledTemporaryFile, TransferMode]:
+        """
+        Write `msg` to a temporary file that is kept in memory up to
+        `max_memory` bytes and rolled over to disk after that.
+
+        Returns:
+            tuple[SpooledTemporaryFile, TransferMode]: File positioned at the
+            start of the message and the body content that is written.
+        """
+        spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        try:
+            used_mode = MIMEWriter.write(msg, spool, policy, mode)
+            spool.seek(0)
+        except Exception:
+            spool.close()
+            raise
+        return spool, used_mode
+
+__all__ = [
+    "MIMEWriter",
+    "TransferMode",
+]
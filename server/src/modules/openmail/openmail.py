@@ -11,8 +11,10 @@ Author: <berkaykayaforbusiness@outlook.com>
 """
 
 import threading
+from typing import Callable
 from .imap import IMAPManager, IMAPManagerException
 from .smtp import SMTPManager, SMTPManagerException
+from .smtp_pool import SMTPPool, SMTP_IDLE_TIMEOUT
 
 class Openmail:
     """
@@ -29,21 +31,34 @@ class Openmail:
 
         Connections will be established when connect() method is called.
         """
-        self._imap = None
-        self._smtp = None
+        self._imap: IMAPManager | None = None
+        self._smtp: SMTPPool | None = None
+        self._imap_standby: IMAPManager | None = None
+        self._imap_factory: Callable[[], IMAPManager] | None = None
+        self._standby_lock = threading.RLock()
+        self._is_standby_building = False
 
     @property
     def imap(self) -> IMAPManager:
-        """Get the IMAPManager instance."""
+        """
+        Get the IMAPManager instance. If the active session has been
+        logged out and a standby session is ready, the standby session
+        is promoted first.
+        """
         if not self._imap:
             raise IMAPManagerException(
                 "IMAP connection is not established. Please call the 'connect' method first."
             )
+        if self._imap.state == "LOGOUT" and self._imap_standby:
+            self.failover()
         return self._imap
 
     @property
-    def smtp(self) -> SMTPManager:
-        """Get the SMTPManager instance."""
+    def smtp(self) -> SMTPPool:
+        """
+        Get the SMTP connection pool. Connections are opened on demand
+        and shared by the sending methods of the pool.
+        """
         if not self._smtp:
             raise SMTPManagerException(
                 "SMTP connection is not established. Please call the 'connect' method first."
@@ -61,9 +76,13 @@ class Openmail:
         imap_ssl_context=None,
         imap_enable_idle_optimization=False,
         imap_listen_new_messages=False,
+        imap_enable_standby=False,
         smtp_host: str = "",
         smtp_port: int = 587,
         smtp_local_hostname: str | None = None,
+        smtp_ssl_context=None,
+        smtp_lazy_connect=False,
+        smtp_idle_timeout: float = SMTP_IDLE_TIMEOUT,
         timeout: int = 30,
     ) -> tuple[bool, str]:
         """
@@ -74,8 +93,18 @@ class Openmail:
             password (str): Email account password
             imap_host (str, optional): IMAP server hostname. Defaults to "".
             imap_port (int, optional): IMAP server port. Defaults to 993.
+            imap_ssl_context (SSLContext, optional): Context of the IMAP connection.
+            Defaults to the shared context of the host, see `tls.get_ssl_context`.
             smtp_host (str, optional): SMTP server hostname. Defaults to "".
+            imap_enable_standby (bool, optional): Keep a second, pre-authenticated
+            IMAP session to take over when the active one drops. Defaults to False.
             smtp_port (int, optional): SMTP server port. Defaults to 587.
+            smtp_ssl_context (SSLContext, optional): Context of STARTTLS. Defaults to
+            the shared context of the host.
+            smtp_lazy_connect (bool, optional): Open SMTP connection on the first send
+            instead of now, credentials are not verified until then. Defaults to False.
+            smtp_idle_timeout (float, optional): Seconds an unused SMTP connection is kept
+            warm before being closed. Defaults to SMTP_IDLE_TIMEOUT.
             try_limit (int, optional): Number of connection retry attempts. Defaults to 3.
             timeout (int, optional): Connection timeout in seconds. Defaults to 30.
 
@@ -83,8 +112,10 @@ class Openmail:
             tuple[bool, str]: A tuple containing connection status (True/False)
                                and a status message
         """
-        def setup_imap():
-            self._imap = IMAPManager(
+        imap_error = smtp_error = None
+
+        def create_imap() -> IMAPManager:
+            return IMAPManager(
                 email_address,
                 password,
                 imap_host,
@@ -95,11 +126,35 @@ class Openmail:
                 listen_new_messages=imap_listen_new_messages,
             )
 
-        def setup_smtp():
-            self._smtp = SMTPManager(
-                email_address, password, smtp_host, smtp_port, smtp_local_hostname, timeout
+        def setup_imap():
+            nonlocal imap_error
+            try:
+                self._imap = create_imap()
+            except Exception as e:
+                imap_error = str(e)
+
+        def create_smtp() -> SMTPManager:
+            return SMTPManager(
+                email_address,
+                password,
+                smtp_host,
+                smtp_port,
+                smtp_local_hostname,
+                timeout,
+                ssl_context=smtp_ssl_context,
             )
 
+        smtp_pool = self._smtp = SMTPPool(create_smtp, idle_timeout=smtp_idle_timeout)
+
+        def setup_smtp():
+            nonlocal smtp_error
+            if smtp_lazy_connect:
+                return
+            try:
+                smtp_pool.open()
+            except Exception as e:
+                smtp_error = str(e)
+
         imap_thread = threading.Thread(target=setup_imap)
         smtp_thread = threading.Thread(target=setup_smtp)
 
@@ -109,8 +164,110 @@ class Openmail:
         imap_thread.join()
         smtp_thread.join()
 
+        connect_msg = ""
+        if imap_error:
+            connect_msg = f"Could not connect to the IMAP server. Reason: {imap_error}"
+        if smtp_error:
+            connect_msg += f"\nCould not connect to the SMTP server. Reason: {smtp_error}"
+
+        if connect_msg:
+            return False, connect_msg.strip()
+
+        if imap_enable_standby:
+            self._imap_factory = create_imap
+            self._build_standby_in_background()
+
         return True, "Connected successfully"
 
+    def _build_standby(self) -> None:
+        """Create a new standby IMAP session, does nothing if one is being built."""
+        with self._standby_lock:
+            if self._is_standby_building or not self._imap_factory:
+                return
+            self._is_standby_building = True
+
+        standby = None
+        try:
+            standby = self._imap_factory()
+        except Exception as e:
+            print(f"Standby IMAP session could not be created: {str(e)}")
+        finally:
+            with self._standby_lock:
+                self._is_standby_building = False
+                if standby and self._imap_factory:
+                    previous_standby = self._imap_standby
+                    self._imap_standby = standby
+                    standby = None
+                else:
+                    previous_standby = None
+
+        # Connection was closed while building or a dead standby replaced.
+        for session in (standby, previous_standby):
+            if session:
+                self._dispose_imap(session)
+
+    def _build_standby_in_background(self) -> None:
+        threading.Thread(target=self._build_standby, daemon=True).start()
+
+    def _dispose_imap(self, session: IMAPManager) -> None:
+        try:
+            if session.state != "LOGOUT":
+                session.logout()
+            else:
+                session.shutdown()
+        except Exception:
+            pass
+
+    def keep_standby_alive(self) -> bool:
+        """
+        Send NOOP over the standby IMAP session so it is not dropped
+        for inactivity, and rebuild it if it has been dropped anyway.
+
+        Returns:
+            bool: True if standby session is ready to take over.
+        """
+        if not self._imap_factory:
+            return False
+
+        standby = self._imap_standby
+        if standby and not standby.is_logged_out():
+            return True
+
+        self._build_standby()
+        return self._imap_standby is not None
+
+    def failover(self) -> bool:
+        """
+        Promote the standby IMAP session in place of the active one.
+        Selected folder and the last search are carried over, so paging
+        continues from where it left off. A new standby session is built
+        in the background.
+
+        Returns:
+            bool: True if standby session is promoted.
+        """
+        with self._standby_lock:
+            standby = self._imap_standby
+            if not standby or standby.state == "LOGOUT":
+                return False
+            if self._imap and self._imap.state != "LOGOUT":
+                # Another thread has already promoted the standby.
+                return True
+
+            previous = self._imap
+            if previous:
+                try:
+                    standby.restore_session_state(previous)
+                except Exception as e:
+                    print(f"Session state could not be carried over to standby: {str(e)}")
+            self._imap = standby
+            self._imap_standby = None
+
+        if previous:
+            threading.Thread(target=self._dispose_imap, args=(previous,), daemon=True).start()
+        self._build_standby_in_background()
+        return True
+
     def disconnect(self) -> tuple[bool, str]:
         """
         Close both IMAP and SMTP connections in parallel using threads.
@@ -118,6 +275,12 @@ class Openmail:
         imap_stat = smtp_stat = True
         imap_error = smtp_error = None
 
+        with self._standby_lock:
+            self._imap_factory = None
+            standby, self._imap_standby = self._imap_standby, None
+        if standby:
+            threading.Thread(target=self._dispose_imap, args=(standby,), daemon=True).start()
+
         def disconnect_imap():
             nonlocal imap_stat, imap_error
             try:
@@ -18,6 +18,8 @@ from email.header import decode_header
 from html.parser import HTMLParser as BuiltInHTMLParser
 from collections.abc import MutableSequence, Iterable
 
+from .uid_set import UIDSet
+
 """
 General Fetch Constants
 """
@@ -27,6 +29,11 @@ APPENDUID_PATTERN = re.compile(br'\[APPENDUID \d+ (\d+)\]')
 SIZE_PATTERN = re.compile(rb"RFC822\.SIZE (\d+)")
 DATA_SIZE_PATTERN = re.compile(rb"\{(\d+)\}$")
 EXISTS_SIZE_PATTERN = re.compile(rb'\* (\d+) EXISTS')
+ESEARCH_COUNT_PATTERN = re.compile(rb'\bCOUNT (\d+)', re.IGNORECASE)
+ESEARCH_ALL_PATTERN = re.compile(rb'\bALL ([\d:,]+)', re.IGNORECASE)
+ESEARCH_PARTIAL_PATTERN = re.compile(rb'\bPARTIAL \(-?\d+:-?\d+ ([\d:,]+|NIL)\)', re.IGNORECASE)
+COPYUID_PATTERN = re.compile(rb'(?:\[COPYUID )?\d+ ([\d:,]+) ([\d:,]+)')
+THREAD_TOKEN_PATTERN = re.compile(rb'\(|\)|\d+')
 FLAGS_PATTERN = re.compile(rb'FLAGS \((.*?)\)', re.DOTALL | re.IGNORECASE)
 BODYSTRUCTURE_PATTERN = re.compile(r"BODYSTRUCTURE\s+(.*)", re.DOTALL | re.IGNORECASE)
 HIERARCHY_DELIMITER_PATTERN = re.compile(rb'\(""\s*"(.?)"\)')
@@ -244,6 +251,12 @@ class MessageParser:
                         current = GroupedMessage([part_item])
                     else:
                         current.append(part_item)
+            elif isinstance(part, bytes) and GROUP_PATTERN.match(part):
+                # Messages without literals, like `(FLAGS)` fetches, are
+                # not tuples.
+                if current:
+                    grouped.append(current)
+                current = GroupedMessage([part])
             else:
                 current.append(part)
 
@@ -325,6 +338,109 @@ class MessageParser:
 
         return -1
 
+    @staticmethod
+    def get_esearch_count(message: bytes) -> int:
+        """
+        Get number of the matches from `ESEARCH` server response.
+
+        Args:
+            message (bytes): Raw `ESEARCH` response.
+
+        Returns:
+            int: Number of the matches, -1 if `COUNT` is not returned.
+
+        Example:
+            >>> get_esearch_count(b'(TAG "A5") UID COUNT 1204 PARTIAL (-1:-3 1201:1203)')
+            1204
+        """
+        count_match = ESEARCH_COUNT_PATTERN.search(message)
+        return int(count_match.group(1)) if count_match else -1
+
+    @staticmethod
+    def get_esearch_uids(message: bytes) -> UIDSet:
+        """
+        Get matching uids from `ALL` or `PARTIAL` result of `ESEARCH`
+        server response, without expanding the ranges of it.
+
+        Args:
+            message (bytes): Raw `ESEARCH` response.
+
+        Returns:
+            UIDSet: Matching uids.
+
+        Example:
+            >>> get_esearch_uids(b'(TAG "A5") UID COUNT 1204 PARTIAL (-1:-4 1199,1201:1203)')
+            UIDSet('1199,1201:1203')
+            >>> get_esearch_uids(b'(TAG "A6") UID COUNT 0 PARTIAL (-1:-4 NIL)')
+            UIDSet('')
+        """
+        uids_match = ESEARCH_PARTIAL_PATTERN.search(message) or ESEARCH_ALL_PATTERN.search(message)
+        if not uids_match or uids_match.group(1).upper() == b"NIL":
+            return UIDSet()
+
+        return UIDSet.parse(uids_match.group(1).decode())
+
+    @staticmethod
+    def get_copied_uids(message: bytes) -> tuple[UIDSet, UIDSet]:
+        """
+        Get the uids of the copied or moved emails in the source and
+        the destination folders from `COPYUID` response code.
+
+        Args:
+            message (bytes): Raw `COPYUID` response code.
+
+        Returns:
+            tuple[UIDSet, UIDSet]: Uids in the source and the destination
+            folders, empty if `COPYUID` is not found.
+
+        Example:
+            >>> get_copied_uids(b'38505 304,319:320 3956:3958')
+            (UIDSet('304,319:320'), UIDSet('3956:3958'))
+
+        References:
+            https://datatracker.ietf.org/doc/html/rfc4315#section-3
+        """
+        copyuid_match = COPYUID_PATTERN.search(message)
+        if not copyuid_match:
+            return UIDSet(), UIDSet()
+
+        return (
+            UIDSet.parse(copyuid_match.group(1).decode()),
+            UIDSet.parse(copyuid_match.group(2).decode())
+        )
+
+    @staticmethod
+    def get_thread_uids(message: list[bytes | None]) -> list[list[str]]:
+        """
+        Get the uids of each thread from `THREAD` response, the replies
+        of a thread are flattened.
+
+        Args:
+            message (list[bytes | None]): Raw `THREAD` response.
+
+        Returns:
+            list[list[str]]: Uids of the threads, the root of a thread first.
+
+        Example:
+            >>> get_thread_uids([b'(2)(3 6 (4 23)(44 7 96))'])
+            [['2'], ['3', '6', '4', '23', '44', '7', '96']]
+
+        References:
+            https://datatracker.ietf.org/doc/html/rfc5256#section-4
+        """
+        threads: list[list[str]] = []
+        depth = 0
+        for token in THREAD_TOKEN_PATTERN.findall(b"".join(part for part in message if part)):
+            if token == b"(":
+                if depth == 0:
+                    threads.append([])
+                depth += 1
+            elif token == b")":
+                depth = max(depth - 1, 0)
+            elif depth > 0:
+                threads[-1].append(token.decode())
+        return [uids for uids in threads if uids]
+
     @staticmethod
     def get_hierarchy_delimiter(grouped_message: GroupedMessage) -> str:
         """
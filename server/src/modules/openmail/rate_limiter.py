@@ -0,0 +1,204 @@
+"""
+RateLimiter
+This module keeps a process-wide token bucket per account and host, so
+every connection of an account to the same server, interactive or
+background, draws from the same budget.
+
+Buckets start at the known limit of the provider and adapt to the
+server AIMD style: the rate is halved when the server throttles, and
+increased step by step while commands succeed. The increase stops just
+under the rate the server throttled at, and probes past it again only
+after a quiet period, so throughput settles under the limit instead of
+oscillating into lockouts.
+
+Primarily designed for use by the `IMAPManager` and `SMTPManager`
+classes.
+"""
+from __future__ import annotations
+import re
+import time
+import threading
+from dataclasses import dataclass
+from typing import Mapping
+
+"""
+Types
+"""
+@dataclass(frozen=True)
+class RateLimit:
+    """Sustained rate in operations per second and the burst allowed on top of it."""
+    rate: float
+    burst: float
+
+@dataclass
+class RateLimiterStats:
+    """Current state of the limiter of an account and host."""
+    account: str
+    host: str
+    rate: float
+    max_rate: float
+    throttles: int
+    waited: float
+
+"""
+Custom consts
+"""
+THROTTLE_PATTERN = re.compile(r"\[(THROTTLED|LIMIT|OVERQUOTA)\]", re.IGNORECASE)
+DECREASE_FACTOR = 0.5
+# Ratios of the provider rate
+INCREASE_RATIO = 0.02
+MIN_RATE_RATIO = 0.05
+SAFETY_MARGIN = 0.9
+# Timers in seconds
+THROTTLE_COOLDOWN = 1
+CEILING_RESET_INTERVAL = 10 * 60
+
+def find_rate_limit(
+    host: str,
+    servers: Mapping[str, str],
+    limits: Mapping[str, RateLimit],
+    default: RateLimit
+) -> RateLimit:
+    """
+    Find the limit of the provider whose server is `host`.
+
+    Args:
+        host (str): Hostname of the server, e.g. "imap.gmail.com".
+        servers (Mapping[str, str]): Provider to host map, like `IMAP_SERVERS`.
+        limits (Mapping[str, RateLimit]): Provider to limit map.
+        default (RateLimit): Limit of the unknown providers.
+    """
+    for provider, provider_host in servers.items():
+        if provider_host == host and provider in limits:
+            return limits[provider]
+    return default
+
+def is_throttle_message(message: str | bytes) -> bool:
+    """Check if the server response tells that the client is throttled."""
+    if isinstance(message, bytes):
+        message = message.decode("utf-8", errors="replace")
+    return bool(THROTTLE_PATTERN.search(message))
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose rate is adjusted with `on_success` and
+    `on_throttle`.
+
+    Args:
+        limit (RateLimit): Limit of the provider, the rate never exceeds it.
+    """
+    def __init__(self, limit: RateLimit):
+        self._max_rate = limit.rate
+        self._burst = max(limit.burst, 1)
+        self._rate = limit.rate
+        self._ceiling = limit.rate
+        self._tokens = self._burst
+        self._last_refill_at = time.monotonic()
+        self._last_throttle_at = 0.0
+        self._lock = threading.Lock()
+        self.throttles = 0
+        self.waited = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    @property
+    def max_rate(self) -> float:
+        return self._max_rate
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(
+            self._burst, self._tokens + (now - self._last_refill_at) * self._rate
+        )
+        self._last_refill_at = now
+
+    def acquire(self, cost: float = 1, timeout: float | None = None) -> bool:
+        """
+        Wait until `cost` tokens are available and take them.
+
+        Returns:
+            bool: False if the tokens could not be taken within `timeout`.
+        """
+        started_at = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= cost:
+                    self._tokens -= cost
+                    self.waited += now - started_at
+                    return True
+                wait = (cost - self._tokens) / self._rate
+
+            if timeout is not None:
+                remaining = started_at + timeout - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    def on_success(self) -> None:
+        """Increase the rate additively, up to just under the last throttled rate."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_throttle_at >= CEILING_RESET_INTERVAL:
+                self._ceiling = self._max_rate
+            if self._rate < self._ceiling:
+                self._refill(now)
+                self._rate = min(self._ceiling, self._rate + self._max_rate * INCREASE_RATIO)
+
+    def on_throttle(self) -> None:
+        """
+        Decrease the rate multiplicatively. Throttled responses of the
+        commands that were already in flight count once.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_throttle_at < THROTTLE_COOLDOWN:
+                return
+            self._refill(now)
+            self._ceiling = max(self._rate * SAFETY_MARGIN, self._max_rate * MIN_RATE_RATIO)
+            self._rate = max(self._rate * DECREASE_FACTOR, self._max_rate * MIN_RATE_RATIO)
+            self._tokens = min(self._tokens, 0)
+            self._last_throttle_at = now
+            self.throttles += 1
+
+_limiters: dict[tuple[str, str], AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(account: str, host: str, limit: RateLimit) -> AdaptiveRateLimiter:
+    """
+    Get the shared limiter of the account on the host, creates one
+    with `limit` if there is none.
+
+    Args:
+        account (str): Email address of the account.
+        host (str): Hostname of the server, e.g. "imap.gmail.com".
+        limit (RateLimit): Limit of the provider, see `find_rate_limit`.
+    """
+    key = (account.lower(), host.lower())
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = AdaptiveRateLimiter(limit)
+        return _limiters[key]
+
+def get_rate_limiter_stats() -> list[RateLimiterStats]:
+    """Get the current rate of every account and host."""
+    with _limiters_lock:
+        return [
+            RateLimiterStats(
+                account, host, limiter.rate, limiter.max_rate, limiter.throttles, limiter.waited
+            )
+            for (account, host), limiter in _limiters.items()
+        ]
+
+__all__ = [
+    "RateLimit",
+    "RateLimiterStats",
+    "AdaptiveRateLimiter",
+    "find_rate_limit",
+    "is_throttle_message",
+    "get_rate_limiter",
+    "get_rate_limiter_stats",
+]
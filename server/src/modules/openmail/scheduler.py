@@ -0,0 +1,246 @@
+"""
+Scheduler
+Decides which thread runs the next command on an IMAP session when
+more than one thread is waiting for it. Waiting commands are queued in
+lanes, and the session is given to the highest lane first, so a user
+opening a message does not wait behind background work.
+
+Bulk work, like exporting a folder, runs its commands in chunks and
+releases the session between them, so an interactive command waits at
+most for the chunk in flight. Lower lanes are never starved: a waiter
+goes next regardless of its lane once `STARVATION_LIMIT` commands went
+before it or it has waited `STARVATION_TIMEOUT`.
+
+The lane of the commands of a thread is set with `lane`, it is
+`Lane.Interactive` unless set otherwise.
+
+Primarily designed for use by the `IMAPManager` class.
+"""
+from __future__ import annotations
+import time
+import threading
+import contextvars
+from enum import IntEnum
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
+
+"""
+Enums, Types
+"""
+class Lane(IntEnum):
+    """Lanes of the scheduler, ordered from the highest to the lowest priority."""
+    Interactive = 0
+    Prefetch = 1
+    Bulk = 2
+
+    def __str__(self) -> str:
+        return self.name.lower()
+
+@dataclass
+class LaneStats:
+    """Wait times of the commands of an account in a lane."""
+    account: str
+    lane: str
+    grants: int
+    waiting: int
+    avg_wait: float
+    p95_wait: float
+    max_wait: float
+
+"""
+Custom consts
+"""
+STARVATION_LIMIT = 8
+# Number of the most recent waits that percentiles are calculated from.
+LATENCY_WINDOW_SIZE = 256
+# Timers in seconds
+STARVATION_TIMEOUT = 10
+
+_current_lane: contextvars.ContextVar[Lane] = contextvars.ContextVar(
+    "openmail_lane", default=Lane.Interactive
+)
+
+@contextmanager
+def lane(lane: Lane) -> Iterator[None]:
+    """
+    Run the commands within the block in `lane`.
+
+    Example:
+        >>> with lane(Lane.Prefetch):
+        ...     client.imap.get_recent_emails()
+    """
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+def current_lane() -> Lane:
+    return _current_lane.get()
+
+class _LaneLatency:
+    def __init__(self):
+        self.grants = 0
+        self.waiting = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent_waits: deque[float] = deque(maxlen=LATENCY_WINDOW_SIZE)
+
+    def start_waiting(self) -> None:
+        with _latencies_lock:
+            self.waiting += 1
+
+    def stop_waiting(self) -> None:
+        with _latencies_lock:
+            self.waiting -= 1
+
+    def record(self, wait: float) -> None:
+        with _latencies_lock:
+            self.grants += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.recent_waits.append(wait)
+
+_latencies: dict[tuple[str, Lane], _LaneLatency] = {}
+_latencies_lock = threading.Lock()
+
+def _get_lane_latency(account: str, lane: Lane) -> _LaneLatency:
+    key = (account.lower(), lane)
+    with _latencies_lock:
+        if key not in _latencies:
+            _latencies[key] = _LaneLatency()
+        return _latencies[key]
+
+class _Waiter:
+    __slots__ = ("lane", "enqueued_at", "skipped")
+
+    def __init__(self, lane: Lane):
+        self.lane = lane
+        self.enqueued_at = time.monotonic()
+        self.skipped = 0
+
+    def is_starving(self, now: float) -> bool:
+        return (
+            self.skipped >= STARVATION_LIMIT
+            or now - self.enqueued_at >= STARVATION_TIMEOUT
+        )
+
+class CommandScheduler:
+    """
+    Reentrant lock of a session that is granted by lane instead of
+    arrival order. A thread that holds it can acquire it again, e.g.
+    `get_emails` calling `uid`, without waiting.
+
+    Args:
+        account (str): Email address of the account, wait times are
+        reported per account, see `get_scheduler_stats`.
+    """
+    def __init__(self, account: str):
+        self._account = account
+        self._condition = threading.Condition(threading.Lock())
+        self._owner: int | None = None
+        self._depth = 0
+        # In arrival order.
+        self._waiters: list[_Waiter] = []
+
+    def _next_waiter(self) -> _Waiter:
+        now = time.monotonic()
+        for waiter in self._waiters:
+            if waiter.is_starving(now):
+                return waiter
+        return min(self._waiters, key=lambda waiter: waiter.lane)
+
+    def acquire(self, lane: Lane | None = None, blocking: bool = True) -> bool:
+        """
+        Wait until the session is granted to the calling thread.
+
+        Args:
+            lane (Lane, optional): Lane to wait in. Defaults to the lane
+            of the calling thread, see `lane`.
+            blocking (bool, optional): If False, returns immediately
+            instead of waiting. Defaults to True.
+
+        Returns:
+            bool: False if `blocking` is False and the session is busy.
+        """
+        thread_id = threading.get_ident()
+        lane = current_lane() if lane is None else lane
+        with self._condition:
+            if self._owner == thread_id:
+                self._depth += 1
+                return True
+
+            if self._owner is None and not self._waiters:
+                self._owner, self._depth = thread_id, 1
+                if blocking:
+                    _get_lane_latency(self._account, lane).record(0)
+                return True
+
+            if not blocking:
+                return False
+
+            latency = _get_lane_latency(self._account, lane)
+            waiter = _Waiter(lane)
+            self._waiters.append(waiter)
+            latency.start_waiting()
+            try:
+                while self._owner is not None or self._next_waiter() is not waiter:
+                    self._condition.wait()
+            finally:
+                self._waiters.remove(waiter)
+                latency.stop_waiting()
+                # Others may go next if this waiter is interrupted.
+                self._condition.notify_all()
+
+            for other in self._waiters:
+                if other.lane > waiter.lane:
+                    other.skipped += 1
+            self._owner, self._depth = thread_id, 1
+            latency.record(time.monotonic() - waiter.enqueued_at)
+            return True
+
+    def release(self) -> None:
+        with self._condition:
+            if self._owner != threading.get_ident():
+                raise RuntimeError("Scheduler can only be released by the thread that acquired it.")
+            self._depth -= 1
+            if self._depth == 0:
+                self._owner = None
+                self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, lane: Lane | None = None) -> Iterator[None]:
+        """Hold the session within the block, see `acquire`."""
+        self.acquire(lane)
+        try:
+            yield
+        finally:
+            self.release()
+
+def get_scheduler_stats() -> list[LaneStats]:
+    """Get the wait times of every account and lane."""
+    stats = []
+    with _latencies_lock:
+        for (account, lane), latency in _latencies.items():
+            recent_waits = sorted(latency.recent_waits)
+            stats.append(LaneStats(
+                account=account,
+                lane=str(lane),
+                grants=latency.grants,
+                waiting=latency.waiting,
+                avg_wait=latency.total_wait / latency.grants if latency.grants else 0,
+                p95_wait=recent_waits[int(len(recent_waits) * 0.95)] if recent_waits else 0,
+                max_wait=latency.max_wait,
+            ))
+    return stats
+
+__all__ = [
+    "Lane",
+    "LaneStats",
+    "CommandScheduler",
+    "lane",
+    "current_lane",
+    "get_scheduler_stats",
+]
@@ -0,0 +1,107 @@
+"""
+SearchCache
+Keeps the results of the recent searches of an IMAP session, so paging
+through a search or searching the same folder again does not run the
+search on the server again.
+
+Results are keyed by the folder, the search query and the state of the
+folder on the server, its UIDVALIDITY, EXISTS and HIGHESTMODSEQ, so a
+result is never returned once the folder has changed. Every result has
+an opaque cursor that pages are fetched with, a search in another
+folder creates another cursor instead of replacing the result of the
+previous one. The least recently used results are dropped first.
+
+Primarily designed for use by the `IMAPManager` class.
+"""
+from __future__ import annotations
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+T = TypeVar("T")
+
+"""
+Custom consts
+"""
+SEARCH_CACHE_SIZE = 32
+
+class SearchCache(Generic[K, T]):
+    """
+    LRU of search results that can be found by their key or their
+    cursor.
+
+    Args:
+        max_size (int, optional): Maximum number of results to keep.
+        Defaults to SEARCH_CACHE_SIZE.
+    """
+    def __init__(self, max_size: int = SEARCH_CACHE_SIZE):
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        # key -> (cursor, result, created_at)
+        self._results: OrderedDict[K, tuple[str, T, float]] = OrderedDict()
+        self._cursors: dict[str, K] = {}
+
+    def get(self, key: K, max_age: float | None = None) -> T | None:
+        """
+        Get the result of `key`, if it is not older than `max_age`
+        seconds.
+        """
+        with self._lock:
+            if key not in self._results:
+                return None
+            _, result, created_at = self._results[key]
+            if max_age is not None and time.monotonic() - created_at > max_age:
+                self._remove(key)
+                return None
+            self._results.move_to_end(key)
+            return result
+
+    def get_by_cursor(self, cursor: str) -> T | None:
+        with self._lock:
+            key = self._cursors.get(cursor)
+            if key is None:
+                return None
+            self._results.move_to_end(key)
+            return self._results[key][1]
+
+    def put(self, key: K, result: T) -> str:
+        """
+        Keep `result` under `key`, replacing the previous result of it.
+
+        Returns:
+            str: Cursor of the result.
+        """
+        cursor = uuid.uuid4().hex
+        with self._lock:
+            self._remove(key)
+            self._results[key] = (cursor, result, time.monotonic())
+            self._cursors[cursor] = key
+            while len(self._results) > self._max_size:
+                self._remove(next(iter(self._results)))
+        return cursor
+
+    def _remove(self, key: K) -> None:
+        if key in self._results:
+            cursor, _, _ = self._results.pop(key)
+            self._cursors.pop(cursor, None)
+
+    def discard(self, predicate: Callable[[K], bool]) -> None:
+        """Remove the results whose keys match `predicate`."""
+        with self._lock:
+            for key in [key for key in self._results if predicate(key)]:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+            self._cursors.clear()
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+__all__ = [
+    "SearchCache",
+]
@@ -0,0 +1,729 @@
+"""
+SearchIndex
+Local index of the emails that are fetched from the server. Subject,
+addresses, decoded text body and attachment names are kept in an SQLite
+FTS5 table, and the date, size, flags and addresses in indexed tables,
+so a `SearchCriteria` is answered with a single local query instead of
+a `UID SEARCH` on the server, which takes seconds on many providers and
+only matches substrings.
+
+The index only knows the emails that are fetched so far, emails are
+added as they are fetched and removed as they are moved or deleted.
+A folder is complete once all of its emails are indexed, see
+`IMAPManager.sync_search_index`, until the folder is seen to change on
+the server. Entries of a folder are dropped when its UIDVALIDITY changes.
+
+Emails are also linked into conversations across folders by their
+`Message-ID`, `In-Reply-To` and `References` headers as they are added,
+see `get_conversation`, and their copies in every folder are found by
+their `Message-ID` without searching the server, see `locate`.
+
+Indexes are kept in memory unless `set_search_index_dir` is given a
+directory to keep them in across restarts, and are closed and deleted
+with `remove_search_index` once their accounts are removed. Files of the
+indexes are not encrypted, they hold the fetched emails as they are.
+
+Primarily designed for use by the `IMAPManager` class.
+"""
+from __future__ import annotations
+import os
+import json
+import sqlite3
+import threading
+from dataclasses import asdict
+from datetime import datetime, timezone
+from urllib.parse import quote
+from typing import Callable, Iterable
+
+from .conversations import get_base_subject, get_references
+from .types import Attachment, ConversationEmail, Email, MessageLocation, SearchCriteria
+from .uid_set import UIDSet
+from .utils import extract_email_address, extract_email_addresses, get_timestamp
+
+"""
+Custom consts
+"""
+SEARCH_INDEX_PATH = ":memory:"
+# Lower than the limit of the oldest SQLite versions.
+SQL_VARIABLE_LIMIT = 900
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    folder TEXT PRIMARY KEY,
+    uid_validity TEXT,
+    -- EXISTS, HIGHESTMODSEQ and UIDNEXT the folder is last seen with.
+    exists_count INTEGER,
+    highest_modseq TEXT,
+    uid_next TEXT,
+    complete INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    folder TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    message_id TEXT NOT NULL,
+    date REAL NOT NULL,
+    size INTEGER NOT NULL,
+    has_attachments INTEGER NOT NULL,
+    -- Subject without `Re:` and `Fwd:` prefixes.
+    base_subject TEXT NOT NULL,
+    email TEXT NOT NULL,
+    UNIQUE (folder, uid)
+);
+CREATE INDEX IF NOT EXISTS messages_date ON messages (folder, date);
+CREATE INDEX IF NOT EXISTS messages_size ON messages (folder, size);
+CREATE INDEX IF NOT EXISTS messages_message_id ON messages (message_id);
+CREATE INDEX IF NOT EXISTS messages_base_subject ON messages (base_subject, date);
+-- Conversation of every known message id, including the ones that are
+-- only referenced, across folders. Kept when the emails are removed so
+-- the replies stay linked.
+CREATE TABLE IF NOT EXISTS message_threads (
+    message_id TEXT PRIMARY KEY,
+    thread TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS message_threads_thread ON message_threads (thread);
+CREATE TABLE IF NOT EXISTS message_flags (
+    message INTEGER NOT NULL REFERENCES messages (id) ON DELETE CASCADE,
+    flag TEXT NOT NULL,
+    PRIMARY KEY (flag, message)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS message_addresses (
+    message INTEGER NOT NULL REFERENCES messages (id) ON DELETE CASCADE,
+    -- from, to or cc
+    field TEXT NOT NULL,
+    address TEXT NOT NULL,
+    PRIMARY KEY (field, address, message)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE IF NOT EXISTS message_text USING fts5(
+    subject, sender, receivers, cc, body, attachments,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+def _get_day_timestamp(date: str) -> float:
+    """
+    Timestamp of the start of the day of `date`, in UTC.
+
+    Raises:
+        ValueError: If `date` is neither in ISO nor in IMAP format.
+    """
+    try:
+        day = datetime.fromisoformat(date)
+    except ValueError:
+        day = datetime.strptime(date, "%d-%b-%Y")
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp()
+
+def _load_email(email_json: str) -> Email:
+    email = json.loads(email_json)
+    email["attachments"] = [Attachment(**attachment) for attachment in email["attachments"] or []]
+    return Email(**email)
+
+def _normalize_flag(flag: str) -> str:
+    return flag.strip().lower()
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+def _escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _words_query(text: str) -> str:
+    """Every word of `text` as a prefix, so a word that is still being typed matches too."""
+    return " AND ".join(f"{_quote(word)}*" for word in text.split())
+
+def has_only_text_criteria(search: str | SearchCriteria) -> bool:
+    """
+    Whether `search` only has text criteria, the subject and the included
+    and excluded text. Matches of these are useful even if the folder is
+    not completely indexed, like while searching as you type.
+    """
+    if isinstance(search, str):
+        return True
+    return not (
+        search.message_id or search.senders or search.receivers or search.cc
+        or search.since or search.before
+        or search.smaller_than or search.larger_than
+        or search.included_flags or search.excluded_flags
+        or search.has_attachments
+    )
+
+def _compile(search: str | SearchCriteria) -> tuple[str, list]:
+    """
+    Compile `search` into the condition of the matching rows of
+    `messages` and its parameters.
+
+    Raises:
+        ValueError: If a date of `search` is malformed.
+
+    Example:
+        >>> _compile(SearchCriteria(senders=["a@mail.com"], subject="Hello wor", larger_than=1024))
+        ('(id IN (SELECT message FROM message_addresses WHERE field = ? AND address IN (?))) AND
+        ... size > ? AND id IN (SELECT rowid FROM message_text WHERE message_text MATCH ?)',
+        ['from', 'a@mail.com', 1024, 'subject : ("Hello"* AND "wor"*)'])
+    """
+    if isinstance(search, str):
+        search = SearchCriteria(include=search)
+
+    conditions: list[str] = []
+    params: list = []
+
+    def match(query: str, negate: bool = False) -> None:
+        conditions.append(
+            f"id {'NOT IN' if negate else 'IN'} (SELECT rowid FROM message_text WHERE message_text MATCH ?)"
+        )
+        params.append(query)
+
+    # Like FROM, TO and CC of IMAP, a term that is not a full address,
+    # like a name or a domain, matches a part of the field. Terms of a
+    # field are alternatives.
+    for field, column, terms in (
+        ("from", "sender", search.senders),
+        ("to", "receivers", search.receivers),
+        ("cc", "cc", search.cc),
+    ):
+        addresses: list[str] = []
+        parts: list[str] = []
+        for term in terms or []:
+            address = extract_email_address(term).lower()
+            local_part, _, domain = address.partition("@")
+            if local_part and domain:
+                addresses.append(address)
+            elif term.strip():
+                parts.append(term.strip())
+
+        alternatives: list[str] = []
+        if addresses:
+            alternatives.append(
+                "id IN (SELECT message FROM message_addresses WHERE field = ? "
+                f"AND address IN ({', '.join('?' * len(addresses))}))"
+            )
+            params.extend([field, *addresses])
+        for part in parts:
+            alternatives.append(
+                "id IN (SELECT message FROM message_addresses WHERE field = ? AND address LIKE ? ESCAPE '\\')"
+            )
+            params.extend([field, f"%{_escape_like(part.lower())}%"])
+            # Names are only in the text of the field.
+            if any(character.isalnum() for character in part):
+                alternatives.append("id IN (SELECT rowid FROM message_text WHERE message_text MATCH ?)")
+                params.append(f"{column} : ({_words_query(part)})")
+        if alternatives:
+            conditions.append(f"({' OR '.join(alternatives)})")
+
+    message_ids = [message_id.strip() for message_id in search.message_id or [] if message_id.strip()]
+    if message_ids:
+        conditions.append(f"message_id IN ({', '.join('?' * len(message_ids))})")
+        params.extend(message_ids)
+
+    # Dates are compared by day like SINCE and BEFORE of IMAP.
+    if search.since:
+        conditions.append("date >= ?")
+        params.append(_get_day_timestamp(search.since))
+    if search.before:
+        conditions.append("date < ?")
+        params.append(_get_day_timestamp(search.before))
+    if search.larger_than:
+        conditions.append("size > ?")
+        params.append(search.larger_than)
+    if search.smaller_than:
+        # Sizes of the emails that are indexed without one are -1.
+        conditions.append("size >= 0 AND size < ?")
+        params.append(search.smaller_than)
+    if search.has_attachments:
+        conditions.append("has_attachments = 1")
+
+    flags = [(flag, True) for flag in search.included_flags or []]
+    flags += [(flag, False) for flag in search.excluded_flags or []]
+    for flag, included in flags:
+        flag = _normalize_flag(flag)
+        # `\Unseen` is the absence of `\Seen`.
+        if flag in ("\\unseen", "\\unflagged", "\\unanswered"):
+            flag, included = "\\" + flag[3:], not included
+        conditions.append(
+            f"id {'IN' if included else 'NOT IN'} (SELECT message FROM message_flags WHERE flag = ?)"
+        )
+        params.append(flag)
+
+    if search.subject and search.subject.strip():
+        match(f"subject : ({_words_query(search.subject)})")
+    if search.include and search.include.strip():
+        match(_words_query(search.include))
+    if search.exclude and search.exclude.strip():
+        match(_words_query(search.exclude), negate=True)
+
+    return " AND ".join(conditions) or "1", params
+
+class SearchIndex:
+    """
+    Index of emails, per folder.
+
+    Args:
+        path (str, optional): Path of the SQLite database. Defaults to
+        SEARCH_INDEX_PATH, the index is kept in memory.
+
+    Example:
+        >>> search_index = SearchIndex()
+        >>> search_index.add("INBOX", "1", [Email(uid="5", subject="Invoice of March", ...)])
+        >>> search_index.search("INBOX", SearchCriteria(subject="invo", excluded_flags=["\\\\Seen"]))
+        [Email(uid="5", subject="Invoice of March", ...)]
+    """
+    def __init__(self, path: str = SEARCH_INDEX_PATH):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        if path != ":memory:":
+            # Every fetch is a transaction, readers must not wait for them.
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+    def add(
+        self,
+        folder: str,
+        uid_validity: str | None,
+        emails: Iterable[Email],
+        sizes: dict[str, int] | None = None
+    ) -> None:
+        """
+        Add the emails of the folder, or update them if they are already
+        added. Body and size of an email are kept if it is added again
+        without them. Emails of the folder are dropped first if
+        `uid_validity` has changed, their uids do not belong to the same
+        emails anymore.
+
+        Args:
+            folder (str): Folder of the emails.
+            uid_validity (str | None): UIDVALIDITY of the folder.
+            emails (Iterable[Email]): Emails to add.
+            sizes (dict[str, int], optional): Sizes of the emails by their uids.
+        """
+        sizes = sizes or {}
+        with self._lock, self._connection:
+            self._set_uid_validity(folder, uid_validity)
+            for email in emails:
+                row = self._connection.execute(
+                    "SELECT id, size FROM messages WHERE folder = ? AND uid = ?", (folder, int(email.uid))
+                ).fetchone()
+                body = email.body
+                size = sizes.get(email.uid, -1)
+                if row:
+                    if not body:
+                        body = self._connection.execute(
+                            "SELECT body FROM message_text WHERE rowid = ?", (row[0],)
+                        ).fetchone()[0]
+                    if size < 0:
+                        size = row[1]
+                    self._connection.execute("DELETE FROM messages WHERE id = ?", (row[0],))
+                    self._connection.execute("DELETE FROM message_text WHERE rowid = ?", (row[0],))
+
+                base_subject, is_reply = get_base_subject(email.subject)
+                rowid = self._connection.execute(
+                    "INSERT INTO messages (folder, uid, message_id, date, size, has_attachments, base_subject, email) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        folder,
+                        int(email.uid),
+                        email.message_id.strip(),
+                        get_timestamp(email.date),
+                        size,
+                        int(bool(email.attachments)),
+                        base_subject,
+                        json.dumps({**asdict(email), "body": body}),
+                    )
+                ).lastrowid
+                self._link_email(email, base_subject, is_reply)
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO message_flags (message, flag) VALUES (?, ?)",
+                    [(rowid, _normalize_flag(flag)) for flag in email.flags or []]
+                )
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO message_addresses (message, field, address) VALUES (?, ?, ?)",
+                    [
+                        (rowid, field, address.lower())
+                        for field, addresses in (
+                            ("from", email.sender), ("to", email.receivers), ("cc", email.cc)
+                        )
+                        for address in extract_email_addresses((addresses or "").split(","))
+                        if address
+                    ]
+                )
+                self._connection.execute(
+                    "INSERT INTO message_text (rowid, subject, sender, receivers, cc, body, attachments) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        rowid,
+                        email.subject,
+                        email.sender,
+                        email.receivers,
+                        " ".join(filter(None, (email.cc, email.bcc))),
+                        body,
+                        " ".join(attachment.name for attachment in email.attachments or []),
+                    )
+                )
+
+    def _link_email(self, email: Email, base_subject: str, is_reply: bool) -> None:
+        message_id = email.message_id.strip()
+        if not message_id:
+            return
+
+        references = get_references(email)
+        threads = set()
+        if not references and is_reply and base_subject:
+            # Reply of a client that drops the references, it joins the
+            # latest conversation of the same subject.
+            row = self._connection.execute(
+                "SELECT message_threads.thread FROM messages JOIN message_threads "
+                "ON message_threads.message_id = messages.message_id "
+                "WHERE messages.base_subject = ? AND messages.message_id != ? "
+                "ORDER BY messages.date DESC LIMIT 1",
+                (base_subject, message_id)
+            ).fetchone()
+            if row:
+                threads.add(row[0])
+        self._link([*references, message_id], threads)
+
+    def _link(self, message_ids: list[str], threads: set[str] | None = None) -> None:
+        """Merge the conversations of the message ids, and of `threads`, into one."""
+        threads = set(threads or ())
+        for index in range(0, len(message_ids), SQL_VARIABLE_LIMIT):
+            chunk = message_ids[index:index + SQL_VARIABLE_LIMIT]
+            threads.update(thread for (thread,) in self._connection.execute(
+                "SELECT DISTINCT thread FROM message_threads "
+                f"WHERE message_id IN ({', '.join('?' * len(chunk))})",
+                chunk
+            ))
+        # Conversation is known by its oldest message id when it is new.
+        thread = min(threads) if threads else message_ids[0]
+        self._connection.executemany(
+            "UPDATE message_threads SET thread = ? WHERE thread = ?",
+            [(thread, other_thread) for other_thread in threads - {thread}]
+        )
+        self._connection.executemany(
+            "INSERT OR IGNORE INTO message_threads (message_id, thread) VALUES (?, ?)",
+            [(message_id, thread) for message_id in message_ids]
+        )
+
+    def link(self, folder: str, uids: Iterable[int | str]) -> None:
+        """
+        Merge the conversations of the emails of the folder, like the
+        ones the server threads together with `THREAD`. Emails that are
+        not indexed are skipped.
+        """
+        uids = [int(uid) for uid in uids]
+        with self._lock, self._connection:
+            message_ids = []
+            for index in range(0, len(uids), SQL_VARIABLE_LIMIT):
+                chunk = uids[index:index + SQL_VARIABLE_LIMIT]
+                message_ids.extend(message_id for (message_id,) in self._connection.execute(
+                    "SELECT message_id FROM messages WHERE folder = ? AND message_id != '' "
+                    f"AND uid IN ({', '.join('?' * len(chunk))})",
+                    [folder, *chunk]
+                ))
+            if len(message_ids) > 1:
+                self._link(message_ids)
+
+    def get_conversation(self, folder: str, uid: int | str) -> list[ConversationEmail] | None:
+        """
+        Get the indexed emails of the conversation of the email, across
+        folders, not ordered, see `thread_emails`.
+
+        Returns:
+            list[ConversationEmail] | None: Emails of the conversation, or
+            None if the email is not indexed.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT message_id, email FROM messages WHERE folder = ? AND uid = ?", (folder, int(uid))
+            ).fetchone()
+            if row is None:
+                return None
+            rows = self._connection.execute(
+                "SELECT messages.folder, messages.email FROM message_threads AS email_thread "
+                "JOIN message_threads ON message_threads.thread = email_thread.thread "
+                "JOIN messages ON messages.message_id = message_threads.message_id "
+                "WHERE email_thread.message_id = ? ORDER BY messages.date, messages.id",
+                (row[0],)
+            ).fetchall() if row[0] else []
+
+        return [
+            ConversationEmail(folder=email_folder, email=_load_email(email_json))
+            for email_folder, email_json in rows or [(folder, row[1])]
+        ]
+
+    def locate(self, message_id: str) -> list[MessageLocation]:
+        """
+        Find the indexed copies of the email with the Message-ID, in every
+        folder, without searching the folders on the server.
+
+        Example:
+            >>> locate("<caef..@dom.com>")
+            [MessageLocation(folder='INBOX', uid_validity='7', uid='1499'),
+            MessageLocation(folder='[Gmail]/All Mail', uid_validity='3', uid='40211')]
+        """
+        message_id = message_id.strip()
+        if not message_id:
+            return []
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT messages.folder, folders.uid_validity, messages.uid FROM messages "
+                "LEFT JOIN folders ON folders.folder = messages.folder "
+                "WHERE messages.message_id = ? ORDER BY messages.folder",
+                (message_id,)
+            ).fetchall()
+        return [MessageLocation(folder, uid_validity, str(uid)) for folder, uid_validity, uid in rows]
+
+    def get_email(self, folder: str, uid: int | str) -> Email | None:
+        """Get the indexed email of the folder, None if it is not indexed."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT email FROM messages WHERE folder = ? AND uid = ?", (folder, int(uid))
+            ).fetchone()
+        return _load_email(row[0]) if row else None
+
+    def get_copy(self, message_id: str, size: int) -> Email | None:
+        """
+        Get an indexed copy of the email with the Message-ID and the size
+        from any folder, like the same email under another Gmail label or
+        an email moved by another client. None if there is no copy.
+        """
+        message_id = message_id.strip()
+        if not message_id or size < 0:
+            return None
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT email FROM messages WHERE message_id = ? AND size = ? LIMIT 1", (message_id, size)
+            ).fetchone()
+        return _load_email(row[0]) if row else None
+
+    def set_flags(self, folder: str, flags: dict[str, list[str]]) -> None:
+        """Replace the flags of the emails of the folder, by their uids."""
+        with self._lock, self._connection:
+            for uid, email_flags in flags.items():
+                self._update_flags(folder, uid, lambda _: list(email_flags))
+
+    def change_flag(self, folder: str, uids: Iterable[int | str], flag: str, add: bool) -> None:
+        """Add `flag` to the emails of the folder, or remove it if `add` is False."""
+        def change(email_flags: list[str]) -> list[str]:
+            email_flags = [
+                email_flag for email_flag in email_flags
+                if _normalize_flag(email_flag) != _normalize_flag(flag)
+            ]
+            return email_flags + [flag] if add else email_flags
+
+        with self._lock, self._connection:
+            for uid in uids:
+                self._update_flags(folder, uid, change)
+
+    def _update_flags(
+        self, folder: str, uid: int | str, change: Callable[[list[str]], list[str]]
+    ) -> None:
+        row = self._connection.execute(
+            "SELECT id, email FROM messages WHERE folder = ? AND uid = ?", (folder, int(uid))
+        ).fetchone()
+        if not row:
+            return
+        email = json.loads(row[1])
+        email["flags"] = change(email["flags"] or [])
+        self._connection.execute("UPDATE messages SET email = ? WHERE id = ?", (json.dumps(email), row[0]))
+        self._connection.execute("DELETE FROM message_flags WHERE message = ?", (row[0],))
+        self._connection.executemany(
+            "INSERT OR IGNORE INTO message_flags (message, flag) VALUES (?, ?)",
+            [(row[0], _normalize_flag(flag)) for flag in email["flags"]]
+        )
+
+    def check_uid_validity(self, folder: str, uid_validity: str | None) -> None:
+        """Drop the emails of the folder if its UIDVALIDITY has changed."""
+        with self._lock, self._connection:
+            self._set_uid_validity(folder, uid_validity)
+
+    def _set_uid_validity(self, folder: str, uid_validity: str | None) -> None:
+        row = self._connection.execute(
+            "SELECT uid_validity FROM folders WHERE folder = ?", (folder,)
+        ).fetchone()
+        if row is None:
+            self._connection.execute(
+                "INSERT INTO folders (folder, uid_validity) VALUES (?, ?)", (folder, uid_validity)
+            )
+        elif row[0] != uid_validity:
+            self._remove_where("folder = ?", (folder,))
+            self._connection.execute(
+                "UPDATE folders SET uid_validity = ?, exists_count = NULL, highest_modseq = NULL, "
+                "uid_next = NULL, complete = 0 WHERE folder = ?",
+                (uid_validity, folder)
+            )
+
+    def set_folder_state(
+        self,
+        folder: str,
+        state: tuple[str | None, int, str | None, str | None],
+        complete: bool = False
+    ) -> None:
+        """
+        Record the state the folder is seen with on the server, its
+        UIDVALIDITY, EXISTS, HIGHESTMODSEQ and UIDNEXT. Folder is not
+        complete anymore if the state has changed, unless `complete` is
+        given once every email of `state` is indexed.
+        """
+        uid_validity, exists, highest_modseq, uid_next = state
+        with self._lock, self._connection:
+            self._set_uid_validity(folder, uid_validity)
+            self._connection.execute(
+                "UPDATE folders SET complete = CASE WHEN ? THEN 1 "
+                "WHEN exists_count IS ? AND highest_modseq IS ? AND uid_next IS ? THEN complete ELSE 0 END, "
+                "exists_count = ?, highest_modseq = ?, uid_next = ? WHERE folder = ?",
+                (
+                    complete, exists, highest_modseq, uid_next,
+                    exists, highest_modseq, uid_next, folder
+                )
+            )
+
+    def mark_incomplete(self, folder: str) -> None:
+        """Mark the folder as not complete, e.g. once its emails change in a way the index can not follow."""
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE folders SET complete = 0 WHERE folder = ?", (folder,))
+
+    def is_complete(self, folder: str) -> bool:
+        """Whether every email of the folder is indexed as it was last seen on the server."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT complete FROM folders WHERE folder = ?", (folder,)
+            ).fetchone()
+        return bool(row and row[0])
+
+    def get_uids(self, folder: str) -> UIDSet:
+        """Uids of the indexed emails of the folder."""
+        with self._lock:
+            rows = self._connection.execute("SELECT uid FROM messages WHERE folder = ?", (folder,))
+            return UIDSet(uid for (uid,) in rows)
+
+    def _remove_where(self, condition: str, params: tuple) -> None:
+        self._connection.execute(
+            f"DELETE FROM message_text WHERE rowid IN (SELECT id FROM messages WHERE {condition})", params
+        )
+        self._connection.execute(f"DELETE FROM messages WHERE {condition}", params)
+
+    def remove(self, folder: str, uids: Iterable[int | str]) -> None:
+        """Remove the emails of the folder, e.g. once they are moved or deleted."""
+        with self._lock, self._connection:
+            for uid in uids:
+                self._remove_where("folder = ? AND uid = ?", (folder, int(uid)))
+
+    def clear(self, folder: str | None = None) -> None:
+        """Remove the emails of the folder, or of every folder."""
+        with self._lock, self._connection:
+            if folder is None:
+                self._connection.execute("DELETE FROM message_text")
+                self._connection.execute("DELETE FROM messages")
+                self._connection.execute("DELETE FROM folders")
+                self._connection.execute("DELETE FROM message_threads")
+            else:
+                self._remove_where("folder = ?", (folder,))
+                self._connection.execute("DELETE FROM folders WHERE folder = ?", (folder,))
+
+    def search(
+        self,
+        folder: str,
+        search: str | SearchCriteria,
+        limit: int | None = None
+    ) -> list[Email] | None:
+        """
+        Find the indexed emails of the folder that match `search`.
+
+        Args:
+            folder (str): Folder to search.
+            search (str | SearchCriteria): Text to search in every field, or
+            search criteria.
+            limit (int, optional): Maximum number of emails to return.
+            Defaults to None, every match is returned.
+
+        Returns:
+            list[Email] | None: Matches, newest first, or None if `search`
+            can not be compiled, like a malformed date, so it is left to
+            the server.
+        """
+        try:
+            condition, params = _compile(search)
+        except ValueError:
+            return None
+
+        sql = (
+            f"SELECT email FROM messages WHERE folder = ? AND {condition} "
+            "ORDER BY date DESC, uid DESC"
+        )
+        params = [folder, *params]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            try:
+                rows = self._connection.execute(sql, params).fetchall()
+            except sqlite3.OperationalError:
+                # Query has only characters the tokenizer drops, like `@`.
+                return []
+
+        return [_load_email(email_json) for (email_json,) in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+_indexes: dict[str, SearchIndex] = {}
+_indexes_lock = threading.Lock()
+_indexes_dir: str | None = None
+
+def set_search_index_dir(path: str | None) -> None:
+    """
+    Keep the indexes of the accounts that are created from now on in
+    SQLite files under the directory, so they persist across restarts.
+    None keeps them in memory.
+    """
+    global _indexes_dir
+    with _indexes_lock:
+        _indexes_dir = path
+
+def _get_search_index_path(key: str) -> str:
+    if not _indexes_dir:
+        return SEARCH_INDEX_PATH
+    return os.path.join(_indexes_dir, f"{quote(key, safe='@.+-_')}.sqlite3")
+
+def get_search_index(account: str) -> SearchIndex:
+    """
+    Get the shared index of the account, creates one if there is none.
+    The index outlives the sessions of the account, so it is kept while
+    the account reconnects and can be searched while it is offline.
+    """
+    key = account.lower()
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = SearchIndex(_get_search_index_path(key))
+        return _indexes[key]
+
+def remove_search_index(account: str) -> None:
+    """
+    Close the index of the account and delete its files, so none of its
+    emails are left behind once the account is removed.
+    """
+    key = account.lower()
+    with _indexes_lock:
+        search_index = _indexes.pop(key, None)
+        path = _get_search_index_path(key)
+    if search_index is not None:
+        search_index.close()
+    if path == SEARCH_INDEX_PATH:
+        return
+
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+__all__ = [
+    "SearchIndex",
+    "get_search_index",
+    "remove_search_index",
+    "set_search_index_dir",
+    "has_only_text_criteria",
+    "SEARCH_INDEX_PATH",
+]
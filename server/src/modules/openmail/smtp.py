@@ -16,8 +16,12 @@ Author: <berkaykayaforbusiness@outlook.com>
 """
 import base64
 import smtplib
+import socket
 import copy
+import os
 import re
+import email.utils
+from email import policy as email_policy
 import urllib.request
 import urllib.parse
 import urllib.error
@@ -25,10 +29,14 @@ from typing import Sequence, override
 from types import MappingProxyType
 from email.message import EmailMessage, Message
 from email.headerregistry import Address
+from ssl import SSLContext
 
 from .parser import HTMLParser, MessageParser
 from .encoder import FileBase64Encoder
 from .converter import AttachmentConverter
+from .mime_writer import MIMEWriter, TransferMode
+from .tls import get_ssl_context
+from .rate_limiter import RateLimit, find_rate_limit, get_rate_limiter, is_throttle_message
 from .utils import extract_domain, choose_positive, extract_email_addresses, extract_fullname, extract_username, tuple_to_sender_string
 from .types import Draft, Attachment
 
@@ -39,6 +47,11 @@ class SMTPManagerException(Exception):
     """Custom exception for SMTPManager class."""
     pass
 
+class SMTPDeliveryUnknownException(SMTPManagerException):
+    """Connection is lost after the whole message is sent but before the
+    server replied to it, so the message may be delivered already."""
+    pass
+
 """
 Types, that are only used in this module
 """
@@ -55,6 +68,15 @@ SMTP_SERVERS = MappingProxyType({
     'yandex': 'smtp.yandex.com',
 })
 SMTP_PORT = 587
+# Messages per second of the providers, keys are the same as `SMTP_SERVERS`.
+SMTP_RATE_LIMITS = MappingProxyType({
+    "gmail": RateLimit(rate=1, burst=5),
+    "yahoo": RateLimit(rate=0.5, burst=5),
+    "outlook": RateLimit(rate=0.5, burst=5),
+    "hotmail": RateLimit(rate=0.5, burst=5),
+    "yandex": RateLimit(rate=0.5, burst=5),
+})
+DEFAULT_SMTP_RATE_LIMIT = RateLimit(rate=1, burst=5)
 MAILTO_PATTERN = re.compile(r'<mailto:([^>]+)>', re.IGNORECASE | re.DOTALL)
 URL_PATTERN = re.compile(r'<(https?://[^>]+)>', re.IGNORECASE | re.DOTALL)
 
@@ -63,7 +85,10 @@ Custom consts
 """
 MAX_ATTACHMENT_SIZE = 25 * 1024 * 1024 # 25MB
 MAX_INLINE_IMAGE_SIZE = 25 * 1024 * 1024 # 25MB
+# Size of the chunks the message is sent to the server in
+TRANSMISSION_CHUNK_SIZE = 64 * 1024 # 64KB
 DEFAULT_CONN_TIMEOUT = 30 # 30 seconds
+RATE_LIMIT_TIMEOUT = 60 # 60 seconds
 
 class SMTPManager(smtplib.SMTP):
     """
@@ -81,7 +106,8 @@ class SMTPManager(smtplib.SMTP):
         port: int = SMTP_PORT,
         local_hostname=None,
         timeout: int = DEFAULT_CONN_TIMEOUT,
-        source_address=None
+        source_address=None,
+        ssl_context: SSLContext | None = None
     ):
         """
         Initialize the SMTPManager class.
@@ -94,9 +120,20 @@ class SMTPManager(smtplib.SMTP):
             local_hostname (str, optional): Local hostname for the connection. Defaults to None.
             timeout (int, optional): Timeout for the connection in seconds. Defaults to 30.
             source_address (tuple, optional): Source address for the connection. Defaults to None.
+            ssl_context (SSLContext, optional): Context to be used in STARTTLS. Defaults to
+            the shared context of the host.
         """
+        host = host or self._find_smtp_server(email_address)
+        # Shared per host, so reconnects can resume the TLS session.
+        self._ssl_context = ssl_context or get_ssl_context(host)
+        # Shared by every connection of the account, see `send_message`.
+        self._rate_limiter = get_rate_limiter(
+            email_address,
+            host,
+            find_rate_limit(host, SMTP_SERVERS, SMTP_RATE_LIMITS, DEFAULT_SMTP_RATE_LIMIT)
+        )
         super().__init__(
-            host or self._find_smtp_server(email_address),
+            host,
             port or SMTP_PORT,
             local_hostname=local_hostname,
             timeout=choose_positive(timeout, DEFAULT_CONN_TIMEOUT),
@@ -123,6 +160,15 @@ class SMTPManager(smtplib.SMTP):
         except KeyError:
             raise SMTPManagerException("Unsupported email domain") from None
 
+    @override
+    def _get_socket(self, host, port, timeout):
+        sock = super()._get_socket(host, port, timeout)
+        # Commands are pipelined and messages are sent in large chunks,
+        # Nagle's algorithm would only hold back the last small write
+        # of every message until the server acknowledges the previous one.
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
     @override
     def login(self, user: str, password: str, *, initial_response_ok=True) -> SMTPCommandResult:
         """
@@ -137,7 +183,7 @@ class SMTPManager(smtplib.SMTP):
         """
         try:
             self.ehlo()
-            self.starttls()
+            self.starttls(context=self._ssl_context)
             self.ehlo()
             result = super().login(user, password, initial_response_ok=initial_response_ok)
             return (True, str(result))
@@ -172,9 +218,11 @@ class SMTPManager(smtplib.SMTP):
         except Exception as e:
             raise SMTPManagerException(f"Could not disconnect from the target smtp server: {str(e)}") from None
 
-    def create_email(self, draft: Draft) -> EmailMessage:
+    @staticmethod
+    def create_email(draft: Draft) -> EmailMessage:
         """
-        Create an EmailMessage from a Draft object.
+        Create an EmailMessage from a Draft object. Does not need
+        a connection.
 
         Args:
             draft (Draft): The draft object from which to create the email message.
@@ -303,6 +351,26 @@ class SMTPManager(smtplib.SMTP):
                         print(f"Attachment size `{attachment.size}` is too large. Max size is {MAX_ATTACHMENT_SIZE} - Skipping MIME attachment.")
                         continue
 
+                    maintype, subtype = attachment.type.split("/")
+                    if (
+                        not attachment.data
+                        and attachment.path
+                        and os.path.isfile(attachment.path)
+                    ):
+                        # Local files are encoded while the email is being
+                        # sent, they are never loaded into memory as a whole.
+                        MIMEWriter.add_file_attachment(
+                            msg,
+                            attachment.path,
+                            maintype,
+                            subtype,
+                            attachment.name,
+                            attachment.cid,
+                        )
+                        msg.get_payload(-1).add_header('Content-Length', str(attachment.size))
+                        generated_attachment_cids.add(attachment.cid)
+                        continue
+
                     if attachment.data and isinstance(attachment.data, str):
                         attachment.data = base64.b64decode(attachment.data)
 
@@ -311,7 +379,6 @@ class SMTPManager(smtplib.SMTP):
                         or
                         base64.b64decode(FileBase64Encoder.read_file(attachment.path)[3])
                     )
-                    maintype, subtype = attachment.type.split("/")
                     msg.add_attachment(
                         attachment.data,
                         maintype=maintype,
@@ -334,18 +401,322 @@ class SMTPManager(smtplib.SMTP):
         mail_options: Sequence[str] = (),
         rcpt_options: Sequence[str] = ()
     ) -> SMTPCommandResult:
+        """
+        Send `msg` like `smtplib.SMTP.send_message` does, but the message
+        is written to a spooled temporary file part by part and sent to
+        the server in chunks, so peak memory does not depend on the size
+        of the attachments.
+        """
         try:
-            # `send_message` func returns empty dict on success.
-            return super().send_message(
-                msg,
-                from_addr,
-                to_addrs,
-                mail_options,
-                rcpt_options
-            ) or (True, "Email sent successfully") # type: ignore
+            self.ehlo_or_helo_if_needed()
+            resent = msg.get_all("Resent-Date")
+            if resent is None:
+                header_prefix = ""
+            elif len(resent) == 1:
+                header_prefix = "Resent-"
+            else:
+                raise ValueError("message has more than one 'Resent-' header block")
+
+            if from_addr is None:
+                from_addr = (
+                    msg[header_prefix + "Sender"]
+                    if (header_prefix + "Sender") in msg
+                    else msg[header_prefix + "From"]
+                )
+                from_addr = email.utils.getaddresses([from_addr])[0][1]
+            if to_addrs is None:
+                addr_fields = [
+                    field for field in (
+                        msg[header_prefix + "To"],
+                        msg[header_prefix + "Bcc"],
+                        msg[header_prefix + "Cc"],
+                    ) if field is not None
+                ]
+                to_addrs = [address[1] for address in email.utils.getaddresses(addr_fields)]
+            if isinstance(to_addrs, str):
+                to_addrs = [to_addrs]
+
+            msg_copy = copy.copy(msg)
+            del msg_copy["Bcc"]
+            del msg_copy["Resent-Bcc"]
+
+            policy = email_policy.SMTP
+            mail_options = list(mail_options)
+            is_international = False
+            try:
+                "".join([from_addr, *to_addrs]).encode("ascii")
+            except UnicodeEncodeError:
+                if not self.has_extn("smtputf8"):
+                    raise smtplib.SMTPNotSupportedError(
+                        "One or more source or delivery addresses require"
+                        " internationalized email support, but the server"
+                        " does not advertise the required SMTPUTF8 capability"
+                    )
+                is_international = True
+
+            # UTF-8 headers are sent as is instead of RFC 2047 encoded words.
+            if is_international or (
+                self.has_extn("smtputf8") and not self._has_ascii_headers(msg_copy)
+            ):
+                policy = email_policy.SMTPUTF8
+                mail_options.append("SMTPUTF8")
+
+            spool, used_mode = MIMEWriter.spool(msg_copy, policy, self.get_transfer_mode())
+            with spool:
+                if used_mode == TransferMode.Binary:
+                    mail_options.append("BODY=BINARYMIME")
+                elif used_mode == TransferMode.EightBit or policy.utf8:
+                    mail_options.append("BODY=8BITMIME")
+
+                if not self._rate_limiter.acquire(timeout=RATE_LIMIT_TIMEOUT):
+                    raise SMTPManagerException(f"Rate limit of {self._host} is exceeded.")
+                try:
+                    refused = self._send_spooled(
+                        from_addr, to_addrs, spool, mail_options, rcpt_options
+                    )
+                except smtplib.SMTPException as e:
+                    if self._is_throttled(e):
+                        self._rate_limiter.on_throttle()
+                    raise
+                if any(400 <= code < 500 for code, _ in refused.values()):
+                    self._rate_limiter.on_throttle()
+                else:
+                    self._rate_limiter.on_success()
+        except SMTPDeliveryUnknownException:
+            raise
         except Exception as e:
             raise SMTPManagerException(f"Error, email prepared but could not be sent: {str(e)}") from e
 
+        if refused:
+            return (True, f"Email sent successfully, but refused by: {', '.join(refused)}")
+        return (True, "Email sent successfully")
+
+    def get_transfer_mode(self) -> TransferMode:
+        """
+        Most permissive body content the server accepts according to
+        its EHLO response. Binary bodies can only be sent with BDAT.
+        """
+        self.ehlo_or_helo_if_needed()
+        if self.has_extn("chunking") and self.has_extn("binarymime"):
+            return TransferMode.Binary
+        if self.has_extn("8bitmime"):
+            return TransferMode.EightBit
+        return TransferMode.SevenBit
+
+    @staticmethod
+    def _is_throttled(err: smtplib.SMTPException) -> bool:
+        """Check if the server refused the message temporarily, like 421/450/451/452."""
+        if isinstance(err, smtplib.SMTPRecipientsRefused):
+            return any(400 <= code < 500 for code, _ in err.recipients.values())
+        if isinstance(err, smtplib.SMTPResponseException):
+            return 400 <= err.smtp_code < 500 or is_throttle_message(err.smtp_error)
+        return False
+
+    @staticmethod
+    def _has_ascii_headers(msg: Message) -> bool:
+        return all(
+            str(value).isascii()
+            for part in msg.walk()
+            for _, value in part.raw_items()
+        )
+
+    def _send_spooled(
+        self,
+        from_addr: str,
+        to_addrs: Sequence[str],
+        spool,
+        mail_options: Sequence[str] = (),
+        rcpt_options: Sequence[str] = ()
+    ) -> dict:
+        """
+        Run a MAIL/RCPT/DATA transaction with a message that is already
+        written to `spool`. Same as `smtplib.SMTP.sendmail`, except the
+        message is read from `spool` in chunks. Uses BDAT if the server
+        supports CHUNKING, and sends the envelope in a single round trip
+        if the server supports PIPELINING.
+
+        Returns:
+            dict: Refused recipients, empty if every recipient is accepted.
+        """
+        spool.seek(0, os.SEEK_END)
+        size = spool.tell()
+        spool.seek(0)
+
+        esmtp_opts = []
+        if self.does_esmtp and self.has_extn("size"):
+            esmtp_opts.append(f"size={size}")
+
+        is_chunking = self.has_extn("chunking")
+        if self.does_esmtp and self.has_extn("pipelining"):
+            replies = self._pipeline_envelope(
+                from_addr,
+                to_addrs,
+                [*esmtp_opts, *mail_options],
+                rcpt_options,
+                with_data=not is_chunking
+            )
+        else:
+            replies = [self.mail(from_addr, [*esmtp_opts, *mail_options])]
+            if replies[0][0] == 250:
+                for address in to_addrs:
+                    replies.append(self.rcpt(address, rcpt_options))
+                    if replies[-1][0] == 421:
+                        break
+
+        # Replies of the pipelined envelope are checked in order, like
+        # they would have been if the commands were sent one by one.
+        code, resp = replies[0]
+        if code != 250:
+            self._abort_pipelined_data(replies, len(to_addrs))
+            if code == 421:
+                self.close()
+            else:
+                self._rset()
+            raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+
+        refused = {}
+        for address, (code, resp) in zip(to_addrs, replies[1:]):
+            if code not in (250, 251):
+                refused[address] = (code, resp)
+            if code == 421:
+                self.close()
+                raise smtplib.SMTPRecipientsRefused(refused)
+        if len(refused) == len(to_addrs):
+            self._abort_pipelined_data(replies, len(to_addrs))
+            self._rset()
+            raise smtplib.SMTPRecipientsRefused(refused)
+
+        if is_chunking:
+            code, resp = self._bdat_spooled(spool, size)
+        elif len(replies) > len(to_addrs) + 1:
+            code, resp = replies[-1]
+            if code != 354:
+                if code == 421:
+                    self.close()
+                else:
+                    self._rset()
+                raise smtplib.SMTPDataError(code, resp)
+            code, resp = self._send_data_content(spool)
+        else:
+            code, resp = self._data_spooled(spool)
+        if code != 250:
+            if code == 421:
+                self.close()
+            else:
+                self._rset()
+            raise smtplib.SMTPDataError(code, resp)
+
+        return refused
+
+    def _pipeline_envelope(
+        self,
+        from_addr: str,
+        to_addrs: Sequence[str],
+        mail_options: Sequence[str] = (),
+        rcpt_options: Sequence[str] = (),
+        with_data: bool = False
+    ) -> list[tuple[int, bytes]]:
+        """
+        Send MAIL, every RCPT and optionally DATA at once and read their
+        replies afterwards (RFC 2920).
+
+        Returns:
+            list[tuple[int, bytes]]: Replies in the order of the commands.
+        """
+        if any(option.lower() == "smtputf8" for option in mail_options):
+            # Same as `smtplib.SMTP.mail`.
+            self.command_encoding = "utf-8"
+        mail_optionlist = f" {' '.join(mail_options)}" if mail_options else ""
+        rcpt_optionlist = f" {' '.join(rcpt_options)}" if rcpt_options else ""
+
+        commands = [f"mail FROM:{smtplib.quoteaddr(from_addr)}{mail_optionlist}"]
+        commands.extend(
+            f"rcpt TO:{smtplib.quoteaddr(address)}{rcpt_optionlist}" for address in to_addrs
+        )
+        if with_data:
+            commands.append("data")
+
+        self.send("".join(f"{command}{smtplib.CRLF}" for command in commands))
+        replies = []
+        for _ in commands:
+            replies.append(self.getreply())
+            if replies[-1][0] == 421:
+                break
+        return replies
+
+    def _abort_pipelined_data(self, replies: list[tuple[int, bytes]], recipient_count: int) -> None:
+        """
+        If the pipelined DATA is accepted even though the envelope is
+        refused, send an empty message to end it, it is not delivered
+        since there is no valid transaction.
+        """
+        if len(replies) > recipient_count + 1 and replies[-1][0] == 354:
+            self.send(f".{smtplib.CRLF}")
+            self.getreply()
+
+    def _data_spooled(self, spool) -> tuple[int, bytes]:
+        """Send the message in `spool` with DATA, lines starting with '.' are dot-stuffed."""
+        self.putcmd("data")
+        code, resp = self.getreply()
+        if code != 354:
+            raise smtplib.SMTPDataError(code, resp)
+        return self._send_data_content(spool)
+
+    def _send_data_content(self, spool) -> tuple[int, bytes]:
+        """Send the content of `spool` after DATA is accepted with 354."""
+        buffer = bytearray()
+        last_line = b""
+        for line in spool:
+            if line.startswith(b"."):
+                buffer += b"."
+            buffer += line
+            last_line = line
+            if len(buffer) >= TRANSMISSION_CHUNK_SIZE:
+                self.send(bytes(buffer))
+                buffer.clear()
+        if not last_line.endswith(b"\r\n"):
+            buffer += b"\r\n"
+        buffer += b".\r\n"
+        return self._end_message(bytes(buffer))
+
+    def _end_message(self, data: bytes | str) -> tuple[int, bytes]:
+        """
+        Send the end of the message, the final `.` of DATA or the LAST
+        chunk of BDAT, and read the reply of the server to the message.
+
+        Raises:
+            SMTPDeliveryUnknownException: If the connection is lost
+            meanwhile, the server may have accepted the message so it
+            must not be sent again.
+        """
+        try:
+            self.send(data)
+            return self.getreply()
+        except OSError as e:
+            raise SMTPDeliveryUnknownException(
+                f"Connection is lost before the server replied to the email, it may be sent already: {str(e)}"
+            ) from e
+
+    def _bdat_spooled(self, spool, size: int) -> tuple[int, bytes]:
+        """Send the message in `spool` with BDAT chunks (RFC 3030), no dot-stuffing needed."""
+        if size == 0:
+            return self._end_message(f"bdat 0 LAST{smtplib.CRLF}")
+
+        sent = 0
+        code, resp = 250, b""
+        while chunk := spool.read(TRANSMISSION_CHUNK_SIZE):
+            sent += len(chunk)
+            is_last = sent >= size
+            self.putcmd("bdat", f"{len(chunk)}{' LAST' if is_last else ''}")
+            if is_last:
+                code, resp = self._end_message(chunk)
+            else:
+                self.send(chunk)
+                code, resp = self.getreply()
+            if code != 250:
+                break
+        return code, resp
+
     def send_email(self, draft: Draft) -> SMTPCommandResult:
         """
         Create and email from draft and send it.
@@ -526,6 +897,38 @@ class SMTPManager(smtplib.SMTP):
         if not list_unsubscribe:
             return True, "Email does not have unsubscribe link"
 
+        url_result = self.unsubscribe_by_url(list_unsubscribe, list_unsubscribe_post)
+        if url_result is not None:
+            return url_result
+
+        # If url couldn't found, check mailto.
+        mailto_match = MAILTO_PATTERN.search(list_unsubscribe)
+        if not mailto_match:
+            return False, "Error, Unsubscribe link could not parsed properly."
+
+        unsubscribe_mail = mailto_match.group(1)
+        unsubscribe_result = self.send_email(Draft(
+            sender=receiver,
+            receivers=unsubscribe_mail,
+            subject="Unsubscribe request",
+            body="Unsubscribe"
+        ))
+
+        if unsubscribe_result[0]:
+            return True, f"Successfully unsubscribed from {unsubscribe_mail}"
+        else:
+            return False, unsubscribe_result[1]
+
+    @staticmethod
+    def unsubscribe_by_url(list_unsubscribe: str, list_unsubscribe_post: str | None = None) -> SMTPCommandResult | None:
+        """
+        Unsubscribe with the HTTP/HTTPS URL of the List-Unsubscribe header,
+        does not need a connection. See `unsubscribe`.
+
+        Returns:
+            SMTPCommandResult | None: Result of the request, or None if the
+            header has no URL and the mailto link has to be used instead.
+        """
         url_match = URL_PATTERN.search(list_unsubscribe)
         if url_match:
             try:
@@ -552,26 +955,11 @@ class SMTPManager(smtplib.SMTP):
             except urllib.error.HTTPError as e:
                 return False, f'HTTP error occurred: {e.code} {e.reason}',
 
-        # If url couldn't found, check mailto.
-        mailto_match = MAILTO_PATTERN.search(list_unsubscribe)
-        if not mailto_match:
-            return False, "Error, Unsubscribe link could not parsed properly."
-
-        unsubscribe_mail = mailto_match.group(1)
-        unsubscribe_result = self.send_email(Draft(
-            sender=receiver,
-            receivers=unsubscribe_mail,
-            subject="Unsubscribe request",
-            body="Unsubscribe"
-        ))
-
-        if unsubscribe_result[0]:
-            return True, f"Successfully unsubscribed from {unsubscribe_mail}"
-        else:
-            return False, unsubscribe_result[1]
+        return None
 
 __all__ = [
     "SMTPManager",
     "SMTPCommandResult",
-    "SMTPManagerException"
+    "SMTPManagerException",
+    "SMTPDeliveryUnknownException",
 ]
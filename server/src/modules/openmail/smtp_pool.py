@@ -0,0 +1,362 @@
+"""
+SMTPPool
+This module provides the `SMTPPool` class, a small per account pool of
+`SMTPManager` connections that are opened on demand.
+
+Key features include:
+- Connections are opened on the first send, not when the account is
+connected.
+- Idle connections are kept warm with NOOP for a configurable window
+and then closed, so providers do not drop them under our feet.
+- Sends are retried once over a new connection if the server has
+dropped the connection before the message is sent, never after, so a
+message is not sent twice.
+- Bulk sends (mail merge) run over a single connection, paced by the
+rate limiter of the account like every other send.
+
+Exposes the same sending methods as `SMTPManager`, primarily designed
+for use by the `Openmail` class.
+"""
+from __future__ import annotations
+import time
+import smtplib
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterator, Sequence, TypeVar
+from email.message import EmailMessage
+
+from .smtp import SMTPManager, SMTPManagerException, SMTPDeliveryUnknownException, SMTPCommandResult
+from .mail_merge import MailMerge
+from .types import Draft, MergeRecipient
+
+"""
+Types, that are only used in this module
+"""
+T = TypeVar("T")
+
+"""
+Custom consts
+"""
+SMTP_POOL_SIZE = 2
+# Timers in seconds
+SMTP_IDLE_TIMEOUT = 5 * 60
+SMTP_KEEPALIVE_INTERVAL = 60
+SMTP_ACQUIRE_TIMEOUT = 60
+
+def is_disconnected_error(err: BaseException) -> bool:
+    """
+    Check if `err`, or the error it is raised from, is caused by a
+    connection dropped by the server. `SMTPException` is an `OSError`
+    too, so only non SMTP level `OSError`s are counted.
+    """
+    for e in (err, err.__cause__):
+        if isinstance(e, smtplib.SMTPServerDisconnected):
+            return True
+        if isinstance(e, OSError) and not isinstance(e, smtplib.SMTPException):
+            return True
+    return False
+
+class SMTPPool:
+    """
+    On-demand pool of `SMTPManager` connections of a single account.
+
+    Args:
+        factory (Callable[[], SMTPManager]): Creates a new logged in connection.
+        size (int, optional): Maximum number of connections. Defaults to SMTP_POOL_SIZE.
+        idle_timeout (float, optional): Seconds an unused connection is kept
+        warm before being closed. Defaults to SMTP_IDLE_TIMEOUT.
+        keepalive_interval (float, optional): Seconds between NOOPs sent over
+        idle connections. Defaults to SMTP_KEEPALIVE_INTERVAL.
+    """
+    def __init__(
+        self,
+        factory: Callable[[], SMTPManager],
+        size: int = SMTP_POOL_SIZE,
+        idle_timeout: float = SMTP_IDLE_TIMEOUT,
+        keepalive_interval: float = SMTP_KEEPALIVE_INTERVAL,
+    ):
+        self._factory = factory
+        self._size = max(size, 1)
+        self._idle_timeout = idle_timeout
+        self._keepalive_interval = keepalive_interval
+        self._condition = threading.Condition()
+        # Idle connections with the time they were last used.
+        self._idle: deque[tuple[SMTPManager, float]] = deque()
+        self._connection_count = 0
+        self._is_closed = False
+        self._release_event = threading.Event()
+        self._maintenance_thread: threading.Thread | None = None
+
+    @property
+    def connection_count(self) -> int:
+        """Number of open connections, idle or in use."""
+        return self._connection_count
+
+    def open(self) -> None:
+        """
+        Open a connection right away instead of waiting for the first send,
+        can be used to verify the credentials.
+
+        Raises:
+            SMTPManagerException: If the connection could not be opened.
+        """
+        with self.acquire():
+            pass
+
+    def _create_connection(self) -> SMTPManager:
+        try:
+            return self._factory()
+        except SMTPManagerException:
+            raise
+        except Exception as e:
+            raise SMTPManagerException(f"Could not connect to the SMTP server: {str(e)}") from e
+
+    def _close_connection(self, connection: SMTPManager) -> None:
+        try:
+            connection.logout()
+        except Exception:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    @contextmanager
+    def acquire(self) -> Iterator[SMTPManager]:
+        """
+        Borrow a connection, an idle one is reused if there is any,
+        otherwise a new one is opened if the pool is not full.
+        """
+        connection: SMTPManager | None = None
+        with self._condition:
+            if self._is_closed:
+                raise SMTPManagerException("SMTP connection is closed.")
+            deadline = time.monotonic() + SMTP_ACQUIRE_TIMEOUT
+            while not self._idle and self._connection_count >= self._size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._condition.wait(timeout=remaining):
+                    raise SMTPManagerException("Timed out while waiting for an SMTP connection.")
+            if self._idle:
+                connection, _ = self._idle.pop()
+            else:
+                self._connection_count += 1
+
+        if not connection:
+            try:
+                connection = self._create_connection()
+            except Exception:
+                with self._condition:
+                    self._connection_count -= 1
+                    self._condition.notify()
+                raise
+            self._start_maintenance()
+
+        is_reusable = True
+        try:
+            yield connection
+        except Exception as e:
+            is_reusable = not is_disconnected_error(e)
+            raise
+        finally:
+            self._release(connection, is_reusable)
+
+    def _release(self, connection: SMTPManager, is_reusable: bool) -> None:
+        with self._condition:
+            is_kept = is_reusable and not self._is_closed
+            if is_kept:
+                self._idle.append((connection, time.monotonic()))
+            else:
+                self._connection_count -= 1
+            self._condition.notify()
+        if not is_kept:
+            self._close_connection(connection)
+
+    def run(self, command: Callable[[SMTPManager], T]) -> T:
+        """
+        Run `command` with a pooled connection. If the server has dropped
+        the connection, `command` is retried once with a new connection,
+        unless the message is sent already, see `SMTPDeliveryUnknownException`.
+        """
+        try:
+            with self.acquire() as connection:
+                return command(connection)
+        except SMTPDeliveryUnknownException:
+            raise
+        except Exception as e:
+            if not is_disconnected_error(e):
+                raise
+
+        with self.acquire() as connection:
+            return command(connection)
+
+    def _start_maintenance(self) -> None:
+        with self._condition:
+            if self._maintenance_thread and self._maintenance_thread.is_alive():
+                return
+            self._release_event.clear()
+            self._maintenance_thread = threading.Thread(
+                target=self._run_maintenance, daemon=True
+            )
+            self._maintenance_thread.start()
+
+    def _run_maintenance(self) -> None:
+        while not self._release_event.wait(timeout=self._keepalive_interval):
+            with self._condition:
+                idle = list(self._idle)
+                self._idle.clear()
+
+            now = time.monotonic()
+            kept, expired = [], []
+            for connection, last_used_at in idle:
+                if now - last_used_at >= self._idle_timeout:
+                    expired.append(connection)
+                    continue
+                try:
+                    if connection.noop()[0] == 250:
+                        kept.append((connection, last_used_at))
+                        continue
+                except Exception:
+                    pass
+                expired.append(connection)
+
+            with self._condition:
+                # Connections that were released in the meantime are newer.
+                self._idle.extendleft(reversed(kept))
+                self._connection_count -= len(expired)
+                self._condition.notify_all()
+                is_empty = self._connection_count == 0
+                if is_empty:
+                    self._maintenance_thread = None
+
+            for connection in expired:
+                self._close_connection(connection)
+
+            if is_empty:
+                return
+
+    def logout(self) -> SMTPCommandResult:
+        """
+        Close every connection of the pool. Connections in use are
+        closed when they are released.
+
+        Returns:
+            SMTPCommandResult: A tuple containing:
+                - True
+                - A string containing a success message.
+        """
+        with self._condition:
+            self._is_closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._connection_count -= len(idle)
+            self._condition.notify_all()
+        self._release_event.set()
+
+        for connection in idle:
+            self._close_connection(connection)
+        return (True, "Logout successful")
+
+    def send_bulk(
+        self,
+        merge: MailMerge,
+        recipients: Sequence[MergeRecipient],
+        on_result: Callable[[MergeRecipient, bool, str], None],
+        stop_event: threading.Event | None = None,
+    ) -> int:
+        """
+        Render and send the email of every recipient over a single
+        connection, the connection is opened again if the server drops
+        it. Failure of a recipient does not stop the others. Sends are
+        paced by the rate limiter of the account, so the provider budget
+        is shared with the other sends of the account.
+
+        Args:
+            merge (MailMerge): Template of the emails.
+            recipients (Sequence[MergeRecipient]): Recipients in the order of sending.
+            on_result (Callable[[MergeRecipient, bool, str], None]): Called after
+            every recipient with whether it is sent and a message.
+            stop_event (threading.Event | None, optional): Stops sending when set.
+
+        Returns:
+            int: Number of recipients that are processed.
+        """
+        stop_event = stop_event or threading.Event()
+        index = 0
+        is_retried = False
+        while index < len(recipients) and not stop_event.is_set():
+            try:
+                with self.acquire() as connection:
+                    while index < len(recipients) and not stop_event.is_set():
+                        recipient = recipients[index]
+                        try:
+                            status, msg = connection.send_message(merge.render(recipient))
+                        except SMTPDeliveryUnknownException as e:
+                            # Recipient may have received it, it is not sent again.
+                            on_result(recipient, False, str(e))
+                            index += 1
+                            is_retried = False
+                            raise
+                        except Exception as e:
+                            if is_disconnected_error(e):
+                                raise
+                            status, msg = False, str(e)
+                        on_result(recipient, status, msg)
+                        index += 1
+                        is_retried = False
+            except SMTPDeliveryUnknownException:
+                # Rest of the recipients are sent over a new connection.
+                continue
+            except Exception as e:
+                # Same recipient is tried once more over a new connection.
+                if is_retried or not is_disconnected_error(e):
+                    raise
+                is_retried = True
+
+        return index
+
+    def create_email(self, draft: Draft) -> EmailMessage:
+        """Create an EmailMessage from a Draft object, does not need a connection."""
+        return SMTPManager.create_email(draft)
+
+    def send_message(self, msg: EmailMessage, *args, **kwargs) -> SMTPCommandResult:
+        """See `SMTPManager.send_message`."""
+        return self.run(lambda smtp: smtp.send_message(msg, *args, **kwargs))
+
+    def send_email(self, draft: Draft) -> SMTPCommandResult:
+        """See `SMTPManager.send_email`."""
+        # Email is created once, so inline images are not converted again on retry.
+        return self.send_message(self.create_email(draft))
+
+    def reply_email(self, original_message_id: str, draft: Draft, **kwargs) -> SMTPCommandResult:
+        """See `SMTPManager.reply_email`."""
+        return self.run(lambda smtp: smtp.reply_email(original_message_id, draft, **kwargs))
+
+    def forward_email(self, original_message_id: str, draft: Draft, **kwargs) -> SMTPCommandResult:
+        """See `SMTPManager.forward_email`."""
+        return self.run(lambda smtp: smtp.forward_email(original_message_id, draft, **kwargs))
+
+    def unsubscribe(
+        self,
+        receiver: str,
+        list_unsubscribe: str,
+        list_unsubscribe_post: str | None = None
+    ) -> SMTPCommandResult:
+        """
+        See `SMTPManager.unsubscribe`. A connection is only used if the
+        unsubscribe request has to be sent by email.
+        """
+        if not list_unsubscribe:
+            return True, "Email does not have unsubscribe link"
+
+        url_result = SMTPManager.unsubscribe_by_url(list_unsubscribe, list_unsubscribe_post)
+        if url_result is not None:
+            return url_result
+
+        return self.run(
+            lambda smtp: smtp.unsubscribe(receiver, list_unsubscribe, list_unsubscribe_post)
+        )
+
+__all__ = [
+    "SMTPPool",
+    "is_disconnected_error",
+]
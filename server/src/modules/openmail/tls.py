@@ -0,0 +1,164 @@
+"""
+TLS
+This module keeps a process-wide `SSLContext` per host so IMAP and
+SMTP connections made to the same host share one context, and
+reconnects resume the previous TLS session instead of doing a full
+handshake.
+
+Primarily designed for use by the `IMAPManager` and `SMTPManager`
+classes.
+"""
+from __future__ import annotations
+import ssl
+import weakref
+import threading
+from dataclasses import dataclass
+
+"""
+Types
+"""
+@dataclass
+class TLSSessionStats:
+    """Handshake and resumption counts of a host."""
+    host: str
+    handshakes: int
+    resumptions: int
+
+    @property
+    def hit_rate(self) -> float:
+        return self.resumptions / self.handshakes if self.handshakes else 0.0
+
+class ResumableSSLSocket(ssl.SSLSocket):
+    """
+    `SSLSocket` that hands its TLS session back to its context before
+    the session is dropped. TLS 1.3 servers send session tickets after
+    the handshake, so the session is only complete at that point.
+    """
+    def _remember_session(self) -> None:
+        try:
+            if self._sslobj is not None and isinstance(self.context, ResumableSSLContext):
+                self.context._remember_session(self._sslobj.session)
+        except Exception:
+            pass
+
+    def shutdown(self, how):
+        self._remember_session()
+        super().shutdown(how)
+
+    def unwrap(self):
+        self._remember_session()
+        return super().unwrap()
+
+    def _real_close(self):
+        self._remember_session()
+        super()._real_close()
+
+class ResumableSSLContext(ssl.SSLContext):
+    """
+    Client side `SSLContext` that remembers the last TLS session of
+    the host and offers it on the next handshake. Sessions can only be
+    resumed with the context they were created with, so one context
+    must be used per host, see `get_ssl_context`.
+    """
+    sslsocket_class = ResumableSSLSocket
+
+    def __init__(self, protocol: int = ssl.PROTOCOL_TLS_CLIENT):
+        self._session_lock = threading.Lock()
+        self._session: ssl.SSLSession | None = None
+        self._last_socket: weakref.ref[ssl.SSLSocket] | None = None
+        self.handshakes = 0
+        self.resumptions = 0
+
+    def _remember_session(self, session: ssl.SSLSession | None) -> None:
+        if session is None:
+            return
+        with self._session_lock:
+            self._session = session
+
+    def _get_session(self) -> ssl.SSLSession | None:
+        # Session of the last socket may have been updated by tickets
+        # if it is still open.
+        last_socket = self._last_socket() if self._last_socket else None
+        if last_socket:
+            try:
+                self._remember_session(last_socket.session)
+            except Exception:
+                pass
+        with self._session_lock:
+            return self._session
+
+    def _record_handshake(self, ssl_socket: ssl.SSLSocket) -> None:
+        with self._session_lock:
+            self.handshakes += 1
+            if ssl_socket.session_reused:
+                self.resumptions += 1
+            self._session = ssl_socket.session or self._session
+            self._last_socket = weakref.ref(ssl_socket)
+
+    def wrap_socket(
+        self,
+        sock,
+        server_side=False,
+        do_handshake_on_connect=True,
+        suppress_ragged_eofs=True,
+        server_hostname=None,
+        session=None
+    ):
+        if session is None and not server_side:
+            session = self._get_session()
+
+        ssl_socket = super().wrap_socket(
+            sock,
+            server_side=server_side,
+            do_handshake_on_connect=do_handshake_on_connect,
+            suppress_ragged_eofs=suppress_ragged_eofs,
+            server_hostname=server_hostname,
+            session=session,
+        )
+
+        if do_handshake_on_connect and not server_side:
+            self._record_handshake(ssl_socket)
+        return ssl_socket
+
+_contexts: dict[str, ResumableSSLContext] = {}
+_contexts_lock = threading.Lock()
+
+def get_ssl_context(host: str) -> ResumableSSLContext:
+    """
+    Get the shared `SSLContext` of the host, creates one with the
+    settings of `ssl.create_default_context` if there is none, the
+    same verification flags and options, like `VERIFY_X509_STRICT`.
+
+    Args:
+        host (str): Hostname of the server, e.g. "imap.gmail.com".
+
+    Returns:
+        ResumableSSLContext: Context to be used for every connection
+        made to the host.
+    """
+    host = host.lower()
+    with _contexts_lock:
+        if host not in _contexts:
+            default_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+            context = ResumableSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            context.verify_flags = default_context.verify_flags
+            context.options = default_context.options
+            context.minimum_version = default_context.minimum_version
+            context.load_default_certs(ssl.Purpose.SERVER_AUTH)
+            _contexts[host] = context
+        return _contexts[host]
+
+def get_tls_session_stats() -> list[TLSSessionStats]:
+    """Get handshake and resumption counts of every host."""
+    with _contexts_lock:
+        return [
+            TLSSessionStats(host, context.handshakes, context.resumptions)
+            for host, context in _contexts.items()
+        ]
+
+__all__ = [
+    "ResumableSSLContext",
+    "TLSSessionStats",
+    "get_ssl_context",
+    "get_tls_session_stats",
+]
@@ -99,12 +99,40 @@ class Draft():
         """Returns a list of all field names in the dataclass instance."""
         return [field.name for field in fields(self)]
 
+@dataclass
+class MergeRecipient():
+    """Represents a receiver of a mail merge and its template variables."""
+    address: str
+    variables: Optional[dict[str, str]] = field(default_factory=dict)
+
 @dataclass
 class Mailbox():
     """Represents the mailbox's contents."""
     folder: str
     emails: list[Email]
     total: int
+    # Cursor of the search the emails are fetched from, see `IMAPManager.search_folder`.
+    cursor: str = ""
+
+@dataclass
+class ConversationEmail():
+    """Represents an email of a conversation."""
+    folder: str
+    email: Email
+    # Depth of the email in the reply tree, 0 for the first email.
+    depth: int = 0
+
+@dataclass
+class Conversation():
+    """Represents the emails of a conversation across folders, in reply order."""
+    emails: list[ConversationEmail]
+
+@dataclass
+class MessageLocation():
+    """Represents where an email is found on the server."""
+    folder: str
+    uid_validity: str | None
+    uid: str
 
 @dataclass
 class Flags():
@@ -180,7 +208,11 @@ __all__ = [
     "Email",
     "Attachment",
     "Draft",
+    "MergeRecipient",
     "Mailbox",
+    "ConversationEmail",
+    "Conversation",
+    "MessageLocation",
     "Flags",
     "Folder",
     "Mark"
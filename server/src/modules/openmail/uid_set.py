@@ -0,0 +1,257 @@
+"""
+UIDSet
+Set of uids that is kept as sorted, disjoint ranges instead of one
+string per uid. Search results are mostly long runs of consecutive
+uids, so a folder of 400000 emails is a single range, and checking
+a uid, counting the uids or building the `a:b,c:d` sequence set of
+an IMAP command does not depend on the number of uids.
+
+Primarily designed for use by the `IMAPManager` class.
+"""
+from __future__ import annotations
+from array import array
+from bisect import bisect_right
+from typing import Iterable, Iterator
+
+class UIDSet:
+    """
+    Immutable set of uids.
+
+    Args:
+        uids (Iterable[int | str], optional): Uids of the set, in any order.
+
+    Example:
+        >>> uids = UIDSet(["5", "1", "2", "3", "9"])
+        >>> str(uids)
+        '1:3,5,9'
+        >>> "2" in uids, len(uids)
+        (True, 5)
+        >>> uids.newest(0, 2)
+        ['9', '5']
+    """
+    __slots__ = ("_starts", "_ends", "_counts")
+
+    def __init__(self, uids: Iterable[int | str] = ()):
+        self._set_ranges((uid, uid) for uid in sorted(map(int, uids)))
+
+    @classmethod
+    def from_ranges(cls, ranges: Iterable[tuple[int, int]]) -> UIDSet:
+        """Create the set of the uids within the inclusive `ranges`."""
+        uid_set = cls.__new__(cls)
+        uid_set._set_ranges(sorted(
+            (min(start, end), max(start, end)) for start, end in ranges
+        ))
+        return uid_set
+
+    @classmethod
+    def parse(cls, sequence_set: str, max_uid: int | str | None = None) -> UIDSet:
+        """
+        Create the set of the uids of `sequence_set`.
+
+        Args:
+            sequence_set (str): Sequence set like `1,3:6,9:*`.
+            max_uid (int | str, optional): Uid that `*` stands for.
+
+        Raises:
+            ValueError: If `sequence_set` is malformed or contains `*`
+            while `max_uid` is not given.
+
+        References:
+            https://datatracker.ietf.org/doc/html/rfc9051#name-formal-syntax (check sequence-set for more information.)
+        """
+        def to_uid(value: str) -> int:
+            if value == "*":
+                if max_uid is None:
+                    raise ValueError(f"`*` of `{sequence_set}` can not be resolved without `max_uid`.")
+                return int(max_uid)
+            return int(value)
+
+        ranges = []
+        for segment in sequence_set.strip().split(","):
+            # Chained ranges like `1:6:9` span from the first to the last.
+            bounds = segment.split(":")
+            ranges.append((to_uid(bounds[0]), to_uid(bounds[-1])))
+        return cls.from_ranges(ranges)
+
+    def _set_ranges(self, ranges: Iterable[tuple[int, int]]) -> None:
+        """Keep the sorted `ranges`, merging the overlapping and adjacent ones."""
+        self._starts = array("I")
+        self._ends = array("I")
+        # Number of the uids up to the end of each range.
+        self._counts = array("Q")
+        for start, end in ranges:
+            if self._ends and start <= self._ends[-1] + 1:
+                if end > self._ends[-1]:
+                    self._counts[-1] += end - self._ends[-1]
+                    self._ends[-1] = end
+                continue
+            self._starts.append(start)
+            self._ends.append(end)
+            self._counts.append((self._counts[-1] if self._counts else 0) + end - start + 1)
+
+    def ranges(self) -> Iterator[tuple[int, int]]:
+        """Inclusive ranges of the set, in ascending order."""
+        return zip(self._starts, self._ends)
+
+    @property
+    def min(self) -> int | None:
+        return self._starts[0] if self._starts else None
+
+    @property
+    def max(self) -> int | None:
+        return self._ends[-1] if self._ends else None
+
+    def newest(self, start: int = 0, end: int | None = None) -> list[str]:
+        """
+        Get the uids between the 0-based positions `start` and `end`,
+        counted from the highest uid, highest first.
+
+        Example:
+            >>> UIDSet.parse("1:100").newest(10, 13)
+            ['90', '89', '88']
+        """
+        total = len(self)
+        end = total if end is None else min(end, total)
+        start = max(start, 0)
+        uids: list[str] = []
+        if start >= end:
+            return uids
+
+        # Ascending position of the next uid to take and its range.
+        index = total - 1 - start
+        range_index = bisect_right(self._counts, index)
+        while len(uids) < end - start:
+            range_offset = self._counts[range_index - 1] if range_index else 0
+            uid = self._starts[range_index] + index - range_offset
+            taken = min(index - range_offset + 1, end - start - len(uids))
+            uids.extend(str(uid) for uid in range(uid, uid - taken, -1))
+            index -= taken
+            range_index -= 1
+        return uids
+
+    def chunks(self, size: int) -> Iterator[UIDSet]:
+        """Split the set into sets of at most `size` uids, in ascending order."""
+        chunk: list[tuple[int, int]] = []
+        chunk_size = 0
+        for start, end in self.ranges():
+            while start <= end:
+                taken = min(end - start + 1, size - chunk_size)
+                chunk.append((start, start + taken - 1))
+                chunk_size += taken
+                start += taken
+                if chunk_size == size:
+                    yield UIDSet.from_ranges(chunk)
+                    chunk, chunk_size = [], 0
+        if chunk:
+            yield UIDSet.from_ranges(chunk)
+
+    def split(self, max_length: int) -> Iterator[UIDSet]:
+        """
+        Split the set into sets whose sequence sets are at most
+        `max_length` characters, in ascending order.
+
+        Example:
+            >>> [str(uids) for uids in UIDSet.parse("1:5,8,10:12").split(6)]
+            ['1:5,8', '10:12']
+        """
+        chunk: list[tuple[int, int]] = []
+        # Without the comma before the first range.
+        length = -1
+        for start, end in self.ranges():
+            range_length = len(str(start)) + (0 if start == end else len(str(end)) + 1)
+            if chunk and length + 1 + range_length > max_length:
+                yield UIDSet.from_ranges(chunk)
+                chunk, length = [], -1
+            chunk.append((start, end))
+            length += 1 + range_length
+        if chunk:
+            yield UIDSet.from_ranges(chunk)
+
+    def union(self, other: UIDSet) -> UIDSet:
+        return UIDSet.from_ranges([*self.ranges(), *other.ranges()])
+
+    def intersection(self, other: UIDSet) -> UIDSet:
+        ranges = []
+        i = j = 0
+        while i < len(self._starts) and j < len(other._starts):
+            start = max(self._starts[i], other._starts[j])
+            end = min(self._ends[i], other._ends[j])
+            if start <= end:
+                ranges.append((start, end))
+            if self._ends[i] < other._ends[j]:
+                i += 1
+            else:
+                j += 1
+        return UIDSet.from_ranges(ranges)
+
+    def difference(self, other: UIDSet) -> UIDSet:
+        ranges = []
+        j = 0
+        for start, end in self.ranges():
+            while j < len(other._ends) and other._ends[j] < start:
+                j += 1
+            k = j
+            while start <= end and k < len(other._starts) and other._starts[k] <= end:
+                if other._starts[k] > start:
+                    ranges.append((start, other._starts[k] - 1))
+                start = max(start, other._ends[k] + 1)
+                k += 1
+            if start <= end:
+                ranges.append((start, end))
+        return UIDSet.from_ranges(ranges)
+
+    def issubset(self, other: UIDSet) -> bool:
+        for start, end in self.ranges():
+            index = bisect_right(other._starts, start) - 1
+            if index < 0 or other._ends[index] < end:
+                return False
+        return True
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+    __le__ = issubset
+
+    def __contains__(self, uid: object) -> bool:
+        try:
+            uid = int(uid) # type: ignore[arg-type]
+        except (TypeError, ValueError):
+            return False
+        index = bisect_right(self._starts, uid) - 1
+        return index >= 0 and uid <= self._ends[index]
+
+    def __len__(self) -> int:
+        return self._counts[-1] if self._counts else 0
+
+    def __bool__(self) -> bool:
+        return bool(self._starts)
+
+    def __iter__(self) -> Iterator[int]:
+        for start, end in self.ranges():
+            yield from range(start, end + 1)
+
+    def __reversed__(self) -> Iterator[int]:
+        for start, end in zip(reversed(self._starts), reversed(self._ends)):
+            yield from range(end, start - 1, -1)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, UIDSet):
+            return NotImplemented
+        return self._starts == other._starts and self._ends == other._ends
+
+    def __hash__(self) -> int:
+        return hash((self._starts.tobytes(), self._ends.tobytes()))
+
+    def __str__(self) -> str:
+        """Sequence set of the uids, like `1:3,5,9`."""
+        return ",".join(
+            str(start) if start == end else f"{start}:{end}"
+            for start, end in self.ranges()
+        )
+
+    def __repr__(self) -> str:
+        return f"UIDSet('{self}')"
+
+__all__ = [
+    "UIDSet",
+]
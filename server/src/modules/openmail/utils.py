@@ -5,7 +5,8 @@ These functions provide helper methods for email-related operations,
 including domain extraction, date conversion, and other utility tasks.
 """
 
-from datetime import datetime
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from typing import Iterable
 
 def extract_username(email: str) -> str:
@@ -48,6 +49,16 @@ def add_quotes_if_str(value: str) -> str:
     """Add quotes to variables if it is string ant will be trimmed."""
     return f'"{value.strip()}"' if isinstance(value, str) else value
 
+def get_timestamp(date: str | None) -> float:
+    """Timestamp of a `Date` header, taken as UTC if it has no timezone, 0 if it can not be parsed."""
+    try:
+        parsed_date = parsedate_to_datetime(date or "")
+    except (TypeError, ValueError, IndexError):
+        return 0
+    if parsed_date.tzinfo is None:
+        parsed_date = parsed_date.replace(tzinfo=timezone.utc)
+    return parsed_date.timestamp()
+
 def convert_to_imap_date(date: str | datetime) -> str:
     """Format datetime date or string date to IMAP4 date format."""
     return datetime.fromisoformat(date).strftime('%d-%b-%Y') if isinstance(date, str) else date.strftime('%d-%b-%Y')
@@ -12,6 +12,7 @@ from src.internal.secure_storage import (
     RSACipher,
 )
 from src.internal.client_handler import ClientHandler
+from src.modules.openmail.search_index import remove_search_index
 
 client_handler = ClientHandler()
 secure_storage = SecureStorage()
@@ -188,6 +189,7 @@ class RemoveAccountRequest(BaseModel):
 def remove_email_account(request_body: RemoveAccountRequest) -> Response:
     try:
         account_manager.remove(request_body.account)
+        remove_search_index(request_body.account)
         return Response(success=True, message="Account removed successfully")
     except Exception as e:
         return Response(
@@ -199,7 +201,10 @@ def remove_email_account(request_body: RemoveAccountRequest) -> Response:
 @router.delete("/remove-accounts")
 def remove_accounts() -> Response:
     try:
+        accounts = account_manager.get_all(include_passwords=False)
         account_manager.remove_all()
+        for account in accounts:
+            remove_search_index(account.email_address)
         return Response(success=True, message="All accounts removed successfully")
     except Exception as e:
         return Response(
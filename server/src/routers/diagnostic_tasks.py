@@ -0,0 +1,140 @@
+from fastapi import APIRouter
+from pydantic import BaseModel
+
+from src._types import Response
+from src.utils import err_msg
+from src.internal.single_flight import SingleFlight
+from src.modules.openmail.tls import get_tls_session_stats
+from src.modules.openmail import rate_limiter, scheduler
+
+single_flight = SingleFlight()
+
+router = APIRouter(tags=["Diagnostics"])
+
+
+class TLSSessionStatsData(BaseModel):
+    host: str
+    handshakes: int
+    resumptions: int
+    hit_rate: float
+
+
+@router.get("/get-tls-stats")
+def get_tls_stats() -> Response[list[TLSSessionStatsData]]:
+    try:
+        return Response[list[TLSSessionStatsData]](
+            success=True,
+            message="TLS session stats fetched successfully.",
+            data=[
+                TLSSessionStatsData(
+                    host=stats.host,
+                    handshakes=stats.handshakes,
+                    resumptions=stats.resumptions,
+                    hit_rate=stats.hit_rate,
+                )
+                for stats in get_tls_session_stats()
+            ],
+        )
+    except Exception as e:
+        return Response(
+            success=False, message=err_msg("Failed to fetch TLS session stats.", str(e))
+        )
+
+
+class RateLimiterStatsData(BaseModel):
+    account: str
+    host: str
+    rate: float
+    max_rate: float
+    throttles: int
+    waited: float
+
+
+@router.get("/get-rate-limiter-stats")
+def get_rate_limiter_stats() -> Response[list[RateLimiterStatsData]]:
+    try:
+        return Response[list[RateLimiterStatsData]](
+            success=True,
+            message="Rate limiter stats fetched successfully.",
+            data=[
+                RateLimiterStatsData(
+                    account=stats.account,
+                    host=stats.host,
+                    rate=stats.rate,
+                    max_rate=stats.max_rate,
+                    throttles=stats.throttles,
+                    waited=stats.waited,
+                )
+                for stats in rate_limiter.get_rate_limiter_stats()
+            ],
+        )
+    except Exception as e:
+        return Response(
+            success=False, message=err_msg("Failed to fetch rate limiter stats.", str(e))
+        )
+
+
+class LaneStatsData(BaseModel):
+    account: str
+    lane: str
+    grants: int
+    waiting: int
+    avg_wait: float
+    p95_wait: float
+    max_wait: float
+
+
+@router.get("/get-scheduler-stats")
+def get_scheduler_stats() -> Response[list[LaneStatsData]]:
+    try:
+        return Response[list[LaneStatsData]](
+            success=True,
+            message="Scheduler stats fetched successfully.",
+            data=[
+                LaneStatsData(
+                    account=stats.account,
+                    lane=stats.lane,
+                    grants=stats.grants,
+                    waiting=stats.waiting,
+                    avg_wait=stats.avg_wait,
+                    p95_wait=stats.p95_wait,
+                    max_wait=stats.max_wait,
+                )
+                for stats in scheduler.get_scheduler_stats()
+            ],
+        )
+    except Exception as e:
+        return Response(
+            success=False, message=err_msg("Failed to fetch scheduler stats.", str(e))
+        )
+
+
+class SingleFlightStatsData(BaseModel):
+    operation: str
+    calls: int
+    executions: int
+    coalesced: int
+    cached: int
+
+
+@router.get("/get-single-flight-stats")
+def get_single_flight_stats() -> Response[list[SingleFlightStatsData]]:
+    try:
+        return Response[list[SingleFlightStatsData]](
+            success=True,
+            message="Single flight stats fetched successfully.",
+            data=[
+                SingleFlightStatsData(
+                    operation=stats.operation,
+                    calls=stats.calls,
+                    executions=stats.executions,
+                    coalesced=stats.coalesced,
+                    cached=stats.cached,
+                )
+                for stats in single_flight.get_stats()
+            ],
+        )
+    except Exception as e:
+        return Response(
+            success=False, message=err_msg("Failed to fetch single flight stats.", str(e))
+        )
@@ -1,25 +1,56 @@
+import re
+import json
+import time
 import asyncio
 from urllib.parse import unquote
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Form, UploadFile
+from contextlib import contextmanager, asynccontextmanager
+from dataclasses import asdict
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Form, UploadFile, Request
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional, Annotated, TypeVar
+from typing import Optional, Annotated, Iterator, AsyncIterator, ContextManager, TypeVar
 
 from src._types import Response
 from src.utils import err_msg, safe_json_loads
 from src.internal.account_manager import AccountManager
-from src.internal.client_handler import ClientHandler
+from src.internal.client_handler import ClientHandler, ConnectionStatus
+from src.internal.outbox import Outbox, OutboxJobKind
+from src.internal.upload_spool import UploadSpool, UploadSession
+from src.internal.bulk_sender import BulkSender
+from src.internal.single_flight import SingleFlight
+from src.internal.unified_mailbox import UnifiedMailbox, get_unified_mailbox
+from src.internal.federated_search import iter_federated_search
+from src.internal.file_system import Root
 from src.helpers.uvicorn_logger import UvicornLogger
-from src.modules.openmail.types import Email, Mailbox, Folder, Draft, Attachment, SearchCriteria
+from src.modules.openmail.types import Email, Mailbox, Folder, Draft, Attachment, SearchCriteria, MergeRecipient, Conversation, MessageLocation
+from src.modules.openmail.mail_merge import MailMerge
 from src.modules.openmail.utils import extract_email_address
+from src.modules.openmail.smtp import MAX_ATTACHMENT_SIZE
+from src.modules.openmail.imap import GET_EMAILS_OFFSET_END
+from src.modules.openmail.search_index import get_search_index
+from src.modules.openmail.conversations import thread_emails
+from src.modules.openmail import scheduler
 
 client_handler = ClientHandler()
 account_manager = AccountManager()
+outbox = Outbox()
+upload_spool = UploadSpool(Root("uploads"))
+bulk_sender = BulkSender()
+single_flight = SingleFlight()
 uvicorn_logger = UvicornLogger()
 
 T = TypeVar("T")
 OpenmailTaskResults = dict[str, T]
 
 NEW_EMAIL_CHECK_INTERVAL_SEC = 60
+OUTBOX_STATUS_CHECK_INTERVAL_SEC = 1
+BULK_SEND_STATUS_CHECK_INTERVAL_SEC = 1
+# Results of the coalesced reads are reused for this long, unless
+# the account is modified in the meantime.
+COALESCED_RESULT_TTL_SEC = 2
+# mboxrd, `From ` lines of the emails are quoted with one more `>`.
+MBOX_FROM_LINE_PATTERN = re.compile(rb"^(>*From )", re.MULTILINE)
 
 router = APIRouter(
     tags=["Mailbox"]
@@ -29,57 +60,104 @@ def check_openmail_connection_availability(
     account: str,
     for_new_messages: bool = False
 ) -> Response | bool:
-    print("Checking for connection availability: ", account)
-    connection_result = client_handler.is_connection_available(account, for_new_messages)
-    if isinstance(connection_result, bool) and connection_result:
+    connection_status = client_handler.get_connection_status(account, for_new_messages)
+    if connection_status == ConnectionStatus.Connected:
         return True
 
-    return Response(
-        success=False,
-        message=f'Error, {account} connection is not available or timed out and could not reconnected.'
-    )
+    if connection_status == ConnectionStatus.Reconnecting:
+        message = f"{account} connection was dropped and is reconnecting in the background, please try again shortly."
+    elif connection_status == ConnectionStatus.CircuitOpen:
+        message = f"{account} provider is not reachable at the moment, reconnection attempts are paused for a while."
+    else:
+        message = f"Error, {account} connection is not available or timed out and could not reconnected."
+
+    return Response(success=False, message=message)
+
+def check_account_availability(account: str) -> Response | bool:
+    """
+    Outbox accepts emails of the accounts that are reconnecting or
+    failed too, they are delivered once the account is connected.
+    """
+    if (
+        client_handler.is_client_exists(account)
+        or account in client_handler.get_failed_clients()
+    ):
+        return True
+
+    return Response(success=False, message=f"There is no account with {account} email address.")
+
+def check_account_existence(account: str) -> Response | bool:
+    """
+    Local index of an account can be read while it is offline, as long
+    as the account is not removed.
+    """
+    if account_manager.is_exists(account):
+        return True
+
+    return Response(success=False, message=f"There is no account with {account} email address.")
 
 @router.websocket("/notifications/{account}")
 async def notifications_socket(websocket: WebSocket, account: str):
     await websocket.accept()
     uvicorn_logger.websocket(websocket, "New notification subscription created")
+    email_address = extract_email_address(account)
+    outbox_subscription = None
     try:
         while True:
-            account = extract_email_address(account)
-            if client_handler.is_client_exists(account, True):
-                response = check_openmail_connection_availability(account, True)
+            if client_handler.is_client_exists(email_address, True):
+                response = check_openmail_connection_availability(email_address, True)
                 if isinstance(response, Response):
                     await websocket.close(reason=response.message)
                     uvicorn_logger.websocket(websocket, response.message)
                     break
             else:
-                account = account_manager.get(account)
-                if account:
-                    client_handler.connect_to_account(account, True)
+                account_with_password = account_manager.get(email_address)
+                if account_with_password:
+                    client_handler.connect_to_account(account_with_password, True)
                 else:
-                    reason = f"There is no account with {account} email address."
+                    reason = f"There is no account with {email_address} email address."
                     await websocket.close(reason=reason)
                     uvicorn_logger.websocket(websocket, reason)
                     break
 
             # Listen for new messages and send notification when
-            # any new message received.
+            # any new message received. Status of the outbox jobs
+            # are sent as soon as they change.
+            outbox_subscription = outbox.subscribe(email_address)
+            elapsed_since_email_check = 0
             while True:
                 try:
-                    await asyncio.sleep(NEW_EMAIL_CHECK_INTERVAL_SEC)
-                    print(f"Checking for new emails for {account}")
-                    openmail_client = client_handler.get_client(account, True)
+                    await asyncio.sleep(OUTBOX_STATUS_CHECK_INTERVAL_SEC)
+                    outbox_statuses = []
+                    while not outbox_subscription.empty():
+                        outbox_statuses.append(outbox_subscription.get_nowait())
+                    if outbox_statuses:
+                        await websocket.send_json({"outbox": {email_address: outbox_statuses}})
+                        uvicorn_logger.websocket(websocket, outbox_statuses)
+
+                    elapsed_since_email_check += OUTBOX_STATUS_CHECK_INTERVAL_SEC
+                    if elapsed_since_email_check < NEW_EMAIL_CHECK_INTERVAL_SEC:
+                        continue
+                    elapsed_since_email_check = 0
+
+                    print(f"Checking for new emails for {email_address}")
+                    openmail_client = client_handler.get_client(email_address, True)
                     if openmail_client.imap.any_new_email():
-                        print(f"Account {account} has new emails")
-                        recent_emails = openmail_client.imap.get_recent_emails()
-                        await websocket.send_json({account: recent_emails})
+                        print(f"Account {email_address} has new emails")
+                        with scheduler.lane(scheduler.Lane.Prefetch):
+                            recent_emails = openmail_client.imap.get_recent_emails()
+                        await websocket.send_json({email_address: recent_emails})
                         uvicorn_logger.websocket(websocket, recent_emails)
                 except Exception as e:
                     await websocket.close(reason="There was an error while receving new emails.")
                     uvicorn_logger.websocket(websocket, e)
                     break
+            break
     except WebSocketDisconnect:
         pass
+    finally:
+        if outbox_subscription:
+            outbox.unsubscribe(email_address, outbox_subscription)
 
 @router.get("/get-hierarchy-delimiter/{account}")
 async def get_hierarchy_delimiter(
@@ -125,8 +203,126 @@ async def search_emails(
     except Exception as e:
         return Response(success=False, message=err_msg("There was an error while searching emails.", str(e)))
 
+@router.get("/search-emails-federated", response_model=None)
+def search_emails_federated(
+    accounts: str,
+    folders: Optional[str] = None,
+    search: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> StreamingResponse | Response:
+    """
+    Search the folders of several accounts at once, `accounts` and
+    `folders` are separated by comma. The folders of all emails, or
+    every folder except trash and junk, are searched if `folders` is not
+    given, see `IMAPManager.get_searchable_folders`.
+
+    Matches are streamed as NDJSON, one line per folder as soon as it
+    answers, with at most `limit` emails of the folder, newest first.
+    Folders that fail or time out are streamed with their error.
+    """
+    try:
+        unique_accounts = list(dict.fromkeys(
+            extract_email_address(account) for account in accounts.split(",") if account.strip()
+        ))
+        if not unique_accounts:
+            return Response(success=False, message="At least one account must be given.")
+
+        folder_list = [unquote(folder) for folder in (folders or "").split(",") if folder.strip()] or None
+
+        search_criteria = search or ""
+        if search_criteria:
+            search_loaded = safe_json_loads(search_criteria)
+            if isinstance(search_loaded, dict):
+                search_criteria = SearchCriteria(**search_loaded)
+
+        def get_imap(account: str):
+            response = check_openmail_connection_availability(account)
+            if isinstance(response, Response):
+                raise Exception(response.message)
+            return client_handler.get_client(account).imap
+
+        results = iter_federated_search(
+            {account: folder_list for account in unique_accounts},
+            lambda account, folder: get_imap(account).get_emails_before(
+                folder, None, limit or GET_EMAILS_OFFSET_END, search_criteria
+            ),
+            lambda account: get_imap(account).get_searchable_folders()
+        )
+        return StreamingResponse(
+            (json.dumps(asdict(result)) + "\n" for result in results),
+            media_type="application/x-ndjson",
+        )
+    except Exception as e:
+        return Response(success=False, message=err_msg("There was an error while searching emails.", str(e)))
+
+@router.get("/search-emails-local/{account}")
+def search_emails_local(
+    account: str,
+    folder: Optional[str] = None,
+    search: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Response[OpenmailTaskResults[Mailbox]]:
+    """
+    Search the emails in the local index of the account, for
+    search-as-you-type. Any criteria is answered locally once the folder
+    is indexed with `/sync-search-index`. Otherwise only text is searched
+    among the emails that are fetched so far and the matches are checked
+    against the server if the account is connected, or the index is
+    searched as it is if not. Fails if the search has to be made on the
+    server, `/search-emails` should be used for it.
+    """
+    try:
+        account = extract_email_address(account)
+        search_criteria = search or ""
+        if search_criteria:
+            search_loaded = safe_json_loads(search_criteria)
+            if isinstance(search_loaded, dict):
+                search_criteria = SearchCriteria(**search_loaded)
+
+        limit = limit or GET_EMAILS_OFFSET_END
+        if check_openmail_connection_availability(account) is True:
+            mailbox = client_handler.get_client(account).imap.search_local(folder, search_criteria, limit)
+        else:
+            response = check_account_existence(account)
+            if isinstance(response, Response):
+                return response
+            # Offline, folder names are the ones the emails are fetched with.
+            emails = get_search_index(account).search(folder or "INBOX", search_criteria, limit)
+            mailbox = Mailbox(folder=folder or "INBOX", emails=emails, total=-1) if emails is not None else None
+
+        if mailbox is None:
+            return Response(success=False, message="Search has criteria that can not be searched locally.")
+
+        return Response(
+            success=True,
+            message="Emails searched successfully.",
+            data={account: mailbox}
+        )
+    except Exception as e:
+        return Response(success=False, message=err_msg("There was an error while searching emails.", str(e)))
+
+class SyncSearchIndexRequest(BaseModel):
+    account: str
+    folder: str
+
+@router.post("/sync-search-index")
+def sync_search_index(request_body: SyncSearchIndexRequest) -> Response[int]:
+    try:
+        account = extract_email_address(request_body.account)
+        response = check_openmail_connection_availability(account)
+        if isinstance(response, Response):
+            return response
+
+        return Response(
+            success=True,
+            message="Search index synced successfully.",
+            data=client_handler.get_client(account).imap.sync_search_index(request_body.folder)
+        )
+    except Exception as e:
+        return Response(success=False, message=err_msg("There was an error while syncing search index.", str(e)))
+
 @router.get("/get-mailbox/{account}")
-async def get_mailbox(
+def get_mailbox(
     account: str,
     folder: Optional[str] = None,
     search: Optional[str] = None,
@@ -145,22 +341,37 @@ async def get_mailbox(
             if isinstance(search_loaded, dict):
                 search_criteria = SearchCriteria(**search_loaded)
 
-        client_handler.get_client(account).imap.search_emails(folder, search_criteria)
+        def fetch_mailbox() -> Mailbox:
+            imap = client_handler.get_client(account).imap
+            searched_emails = imap.search_folder(folder, search_criteria)
+            return imap.get_emails(offset_start, offset_end, searched_emails.cursor)
 
         return Response(
             success=True,
             message="Emails fetched successfully.",
-            data={account: client_handler.get_client(account).imap.get_emails(offset_start, offset_end)}
+            data={account: single_flight.run(
+                account,
+                "get_mailbox",
+                (folder, search_criteria, offset_start, offset_end),
+                fetch_mailbox,
+                COALESCED_RESULT_TTL_SEC
+            )}
         )
     except Exception as e:
         return Response(success=False, message=err_msg("There was an error while fetching emails.", str(e)))
 
 @router.get("/paginate-mailbox/{account}/{offset_start}/{offset_end}")
-async def paginate_mailbox(
+def paginate_mailbox(
     account: str,
     offset_start: int,
-    offset_end: int
+    offset_end: int,
+    cursor: Optional[str] = None
 ) -> Response[OpenmailTaskResults[Mailbox]]:
+    """
+    Page through the search of `cursor`, which is returned with the
+    mailbox by `/get-mailbox`. Pages of the last search are returned
+    if `cursor` is not given.
+    """
     try:
         account = extract_email_address(account)
         response = check_openmail_connection_availability(account)
@@ -170,13 +381,99 @@ async def paginate_mailbox(
         return Response(
             success=True,
             message="Emails paginated successfully.",
-            data={account: client_handler.get_client(account).imap.get_emails(offset_start, offset_end)}
+            data={account: client_handler.get_client(account).imap.get_emails(
+                offset_start,
+                offset_end,
+                cursor
+            )}
         )
     except Exception as e:
         return Response(success=False, message=err_msg("There was an error while paginating emails.", str(e)))
 
+@router.get("/get-mailbox-page/{account}")
+def get_mailbox_page(
+    account: str,
+    folder: Optional[str] = None,
+    search: Optional[str] = None,
+    before_uid: Optional[str] = None,
+    after_uid: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Response[OpenmailTaskResults[Mailbox]]:
+    """
+    Page anchored to uids for infinite scroll, `limit` emails older than
+    `before_uid`, or newer than `after_uid`. Newest emails are returned
+    if neither is given.
+    """
+    try:
+        account = extract_email_address(account)
+        response = check_openmail_connection_availability(account)
+        if isinstance(response, Response):
+            return response
+
+        if before_uid and after_uid:
+            return Response(success=False, message="Only one of `before_uid` and `after_uid` can be given.")
+
+        search_criteria = search or ""
+        if search_criteria:
+            search_loaded = safe_json_loads(search_criteria)
+            if isinstance(search_loaded, dict):
+                search_criteria = SearchCriteria(**search_loaded)
+
+        imap = client_handler.get_client(account).imap
+        return Response(
+            success=True,
+            message="Emails fetched successfully.",
+            data={account: (
+                imap.get_emails_after(folder, after_uid, limit or GET_EMAILS_OFFSET_END, search_criteria)
+                if after_uid else
+                imap.get_emails_before(folder, before_uid, limit or GET_EMAILS_OFFSET_END, search_criteria)
+            )}
+        )
+    except Exception as e:
+        return Response(success=False, message=err_msg("There was an error while fetching emails.", str(e)))
+
+@router.get("/get-unified-mailbox")
+def get_unified_mailbox_of_accounts(
+    accounts: str,
+    folder: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> Response[UnifiedMailbox]:
+    """
+    Newest emails of the folder of several accounts in a single mailbox,
+    `accounts` are separated by comma. Accounts are fetched concurrently
+    and the ones that are not connected or too slow are reported in
+    `failed` instead of failing the request. Next page is fetched with
+    the returned `cursor`.
+    """
+    try:
+        unique_accounts = list(dict.fromkeys(
+            extract_email_address(account) for account in accounts.split(",") if account.strip()
+        ))
+        if not unique_accounts:
+            return Response(success=False, message="At least one account must be given.")
+
+        def fetch_page(account: str, before_uid: str | None, limit: int) -> Mailbox:
+            response = check_openmail_connection_availability(account)
+            if isinstance(response, Response):
+                raise Exception(response.message)
+            return client_handler.get_client(account).imap.get_emails_before(folder, before_uid, limit)
+
+        return Response(
+            success=True,
+            message="Emails fetched successfully.",
+            data=get_unified_mailbox(
+                unique_accounts,
+                fetch_page,
+                limit or GET_EMAILS_OFFSET_END,
+                cursor or ""
+            )
+        )
+    except Exception as e:
+        return Response(success=False, message=err_msg("There was an error while fetching emails.", str(e)))
+
 @router.get("/get-folders/{account}")
-async def get_folders(
+def get_folders(
     account: str,
 ) -> Response[OpenmailTaskResults[list[str]]]:
     try:
@@ -188,11 +485,78 @@ async def get_folders(
         return Response(
             success=True,
             message="Folders fetched successfully.",
-            data={account: client_handler.get_client(account).imap.get_folders(tagged=True)}
+            data={account: single_flight.run(
+                account,
+                "get_folders",
+                (),
+                lambda: client_handler.get_client(account).imap.get_folders(tagged=True),
+                COALESCED_RESULT_TTL_SEC
+            )}
         )
     except Exception as e:
         return Response(success=False, message=err_msg("There was an error while fetching folders.", str(e)))
 
+@router.get("/get-conversation/{account}/{folder}/{uid}")
+def get_conversation(
+    account: str,
+    folder: str,
+    uid: str
+) -> Response[Conversation]:
+    """
+    Get the emails of the conversation of the email across the folders
+    of the account, as a reply tree. If the account is not connected,
+    the conversation is returned from the local index as it is.
+    """
+    try:
+        account = extract_email_address(account)
+        if check_openmail_connection_availability(account) is True:
+            conversation = client_handler.get_client(account).imap.get_conversation(unquote(folder), uid)
+        else:
+            response = check_account_existence(account)
+            if isinstance(response, Response):
+                return response
+            # Offline, folder names are the ones the emails are fetched with.
+            conversation_emails = get_search_index(account).get_conversation(unquote(folder), uid)
+            if conversation_emails is None:
+                return Response(success=False, message="Email is not found in the local index.")
+            conversation = Conversation(emails=thread_emails(conversation_emails))
+
+        return Response(
+            success=True,
+            message="Conversation fetched successfully.",
+            data=conversation
+        )
+    except Exception as e:
+        return Response(success=False, message=err_msg("There was an error while fetching conversation.", str(e)))
+
+@router.get("/locate-email/{account}")
+def locate_email(
+    account: str,
+    message_id: str
+) -> Response[list[MessageLocation]]:
+    """
+    Find the folders and uids of the copies of the email with the
+    Message-ID. If the account is not connected, only the local index
+    is looked up.
+    """
+    try:
+        account = extract_email_address(account)
+        if check_openmail_connection_availability(account) is True:
+            locations = client_handler.get_client(account).imap.locate_email(message_id)
+        else:
+            response = check_account_existence(account)
+            if isinstance(response, Response):
+                return response
+            locations = get_search_index(account).locate(message_id)
+
+        return Response(
+            success=True,
+            message="Email located successfully." if locations else "Email could not be found.",
+            data=locations
+        )
+    except Exception as e:
+        return Response(success=False, message=err_msg("There was an error while locating email.", str(e)))
+
 @router.get("/get-email-content/{account}/{folder}/{uid}")
 def get_email_content(
     account: str,
@@ -208,7 +572,13 @@ def get_email_content(
         return Response(
             success=True,
             message="Email content fetched successfully.",
-            data=client_handler.get_client(account).imap.get_email_content(unquote(folder), uid)
+            data=single_flight.run(
+                account,
+                "get_email_content",
+                (unquote(folder), uid),
+                lambda: client_handler.get_client(account).imap.get_email_content(unquote(folder), uid),
+                COALESCED_RESULT_TTL_SEC
+            )
         )
     except Exception as e:
         return Response(success=False, message=err_msg("There was an error while fetching email content.", str(e)))
@@ -240,23 +610,63 @@ def download_attachment(
     except Exception as e:
         return Response(success=False, message=err_msg("There was an error while fetching email content.", str(e)))
 
-async def convert_uploadfile_to_attachment(attachments: list[UploadFile]) -> list[Attachment]:
-    converted_to_attachment_list = []
-    if not attachments:
-        return []
-
-    for attachment in attachments:
-        data = await attachment.read()
-        if data:
-            converted_to_attachment_list.append(
-                Attachment(
-                    name=attachment.filename,
-                    data=data,
-                    type=attachment.content_type,
-                    size=len(data),
-                )
+def convert_source_to_mbox_entry(source: bytes) -> bytes:
+    source = MBOX_FROM_LINE_PATTERN.sub(rb">\1", source.replace(b"\r\n", b"\n"))
+    return b"From MAILER-DAEMON %s\n%s\n\n" % (
+        time.asctime(time.gmtime()).encode("ascii"),
+        source.rstrip(b"\n")
+    )
+
+@router.get("/export-folder/{account}/{folder}", response_model=None)
+def export_folder(
+    account: str,
+    folder: str
+) -> StreamingResponse | Response:
+    """
+    Download the emails of the folder as an mbox file. Emails are
+    fetched in chunks in the bulk lane, so the other requests of the
+    account are not held up by the export.
+    """
+    try:
+        account = extract_email_address(account)
+        response = check_openmail_connection_availability(account)
+        if isinstance(response, Response):
+            return response
+
+        folder = unquote(folder)
+        filename = re.sub(r"[^\w.-]", "_", folder) + ".mbox"
+        sources = client_handler.get_client(account).imap.iter_email_sources(folder)
+        return StreamingResponse(
+            (convert_source_to_mbox_entry(source) for _, source in sources),
+            media_type="application/mbox",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+    except Exception as e:
+        return Response(success=False, message=err_msg("There was an error while exporting folder.", str(e)))
+
+def convert_uploadfile_to_upload_session(attachments: list[UploadFile]) -> list[UploadSession]:
+    """
+    Files of the form are already spooled to disk by the server, they
+    are copied to upload sessions chunk by chunk instead of being read
+    into memory.
+    """
+    upload_sessions = []
+    try:
+        for attachment in attachments or []:
+            upload_session = upload_spool.add_file(
+                attachment.filename or "attachment",
+                attachment.content_type or "",
+                attachment.file
             )
-    return converted_to_attachment_list
+            if not upload_session.size:
+                upload_spool.remove(upload_session.id)
+                continue
+            upload_sessions.append(upload_session)
+    except Exception:
+        for upload_session in upload_sessions:
+            upload_spool.remove(upload_session.id)
+        raise
+    return upload_sessions
 
 class SendEmailFormData(BaseModel):
     sender: str # Name Surname <namesurname@domain.com> or namesurname@domain.com
@@ -267,91 +677,353 @@ class SendEmailFormData(BaseModel):
     cc: Optional[str] = None # mail addresses separated by comma
     bcc: Optional[str] = None # mail addresses separated by comma
     attachments: list[UploadFile] = []
+    upload_ids: Optional[str] = None # ids of finalized upload sessions separated by comma
+
+@contextmanager
+def get_form_attachments(form_data: SendEmailFormData) -> Iterator[list[Attachment]]:
+    """
+    Attachments of the form, both the files of the form and the
+    referenced uploads are read from disk while sending. Files of the
+    form are removed on exit, upload sessions are kept so they can be
+    referenced again, e.g. sent after being saved as draft, until they
+    expire or are discarded.
+    """
+    attachments = [
+        upload_spool.get_attachment(upload_id.strip())
+        for upload_id in (form_data.upload_ids or "").split(",")
+        if upload_id.strip()
+    ]
+    form_upload_sessions = convert_uploadfile_to_upload_session(form_data.attachments)
+    try:
+        yield [
+            upload_spool.get_attachment(upload_session.id)
+            for upload_session in form_upload_sessions
+        ] + attachments
+    finally:
+        for upload_session in form_upload_sessions:
+            upload_spool.remove(upload_session.id)
+
+class CreateUploadSessionRequest(BaseModel):
+    name: str
+    size: int # in bytes
+    type: str = ""
+
+@router.post("/create-upload-session")
+def create_upload_session(request_body: CreateUploadSessionRequest) -> Response[dict]:
+    try:
+        if request_body.size > MAX_ATTACHMENT_SIZE:
+            return Response(
+                success=False,
+                message=f"Attachment size `{request_body.size}` is too large. Max size is {MAX_ATTACHMENT_SIZE}."
+            )
+
+        upload_session = upload_spool.create(
+            request_body.name,
+            request_body.type,
+            request_body.size
+        )
+        return Response(
+            success=True,
+            message="Upload session created successfully.",
+            data=upload_session.to_status()
+        )
+    except Exception as e:
+        return Response(success=False, message=err_msg("There was an error while creating upload session.", str(e)))
+
+@asynccontextmanager
+async def enter_in_threadpool(context_manager: ContextManager[T]) -> AsyncIterator[T]:
+    """Enter and exit a blocking context manager, like a file, off the event loop."""
+    value = await run_in_threadpool(context_manager.__enter__)
+    try:
+        yield value
+    except BaseException as e:
+        if not await run_in_threadpool(context_manager.__exit__, type(e), e, e.__traceback__):
+            raise
+    else:
+        await run_in_threadpool(context_manager.__exit__, None, None, None)
+
+@router.put("/upload-chunk/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    offset: int,
+    request: Request
+) -> Response[dict]:
+    """
+    Body of the request is the raw chunk, it is written to disk as it
+    is received. If the request is interrupted, `/get-upload-session`
+    tells the offset to resume from.
+    """
+    try:
+        # Writes and the flush on close block, other requests must not
+        # wait for the disk.
+        async with enter_in_threadpool(upload_spool.open_chunk(upload_id, offset)) as chunk:
+            async for data in request.stream():
+                await run_in_threadpool(chunk.write, data)
+
+        return Response(
+            success=True,
+            message="Chunk uploaded successfully.",
+            data=(await run_in_threadpool(upload_spool.get, upload_id)).to_status()
+        )
+    except Exception as e:
+        return Response(success=False, message=err_msg("There was an error while uploading chunk.", str(e)))
+
+@router.get("/get-upload-session/{upload_id}")
+def get_upload_session(upload_id: str) -> Response[dict]:
+    try:
+        return Response(
+            success=True,
+            message="Upload session fetched successfully.",
+            data=upload_spool.get(upload_id).to_status()
+        )
+    except Exception as e:
+        return Response(success=False, message=err_msg("There was an error while fetching upload session.", str(e)))
+
+@router.post("/finalize-upload-session/{upload_id}")
+def finalize_upload_session(upload_id: str) -> Response[dict]:
+    try:
+        return Response(
+            success=True,
+            message="Upload session finalized successfully.",
+            data=upload_spool.finalize(upload_id).to_status()
+        )
+    except Exception as e:
+        return Response(success=False, message=err_msg("There was an error while finalizing upload session.", str(e)))
+
+class DiscardUploadSessionRequest(BaseModel):
+    upload_id: str
+
+@router.post("/discard-upload-session")
+def discard_upload_session(request_body: DiscardUploadSessionRequest) -> Response:
+    try:
+        upload_spool.remove(request_body.upload_id)
+        return Response(success=True, message="Upload session discarded successfully.")
+    except Exception as e:
+        return Response(success=False, message=err_msg("There was an error while discarding upload session.", str(e)))
 
 @router.post("/send-email")
-async def send_email(
+def send_email(
     form_data: Annotated[SendEmailFormData, Form()],
 ) -> Response:
     try:
         account = extract_email_address(form_data.sender)
-        response = check_openmail_connection_availability(account)
+        response = check_account_availability(account)
         if isinstance(response, Response):
             return response
 
-        status, msg = client_handler.get_client(account).smtp.send_email(
-            Draft(
-                sender=form_data.sender,
-                receivers=form_data.receivers,
-                subject=form_data.subject,
-                body=form_data.body,
-                cc=form_data.cc,
-                bcc=form_data.bcc,
-                attachments=await convert_uploadfile_to_attachment(form_data.attachments),
+        # Delivered in the background, status is sent over the
+        # notification stream.
+        with get_form_attachments(form_data) as attachments:
+            job = outbox.enqueue(
+                account,
+                OutboxJobKind.Send,
+                Draft(
+                    sender=form_data.sender,
+                    receivers=form_data.receivers,
+                    subject=form_data.subject,
+                    body=form_data.body,
+                    cc=form_data.cc,
+                    bcc=form_data.bcc,
+                    attachments=attachments,
+                )
             )
-        )
 
-        return Response(success=status, message=msg)
+        return Response(success=True, message="Email queued for sending.", data={"job_id": job.id})
     except Exception as e:
         return Response(success=False, message=err_msg("There was an error while sending email.", str(e)))
 
 
 @router.post("/reply-email/{original_message_id}")
-async def reply_email(
+def reply_email(
     original_message_id: str,
     form_data: Annotated[SendEmailFormData, Form()]
 ) -> Response:
     try:
         account = extract_email_address(form_data.sender)
-        response = check_openmail_connection_availability(account)
+        response = check_account_availability(account)
         if isinstance(response, Response):
             return response
 
-        status, msg = client_handler.get_client(account).smtp.reply_email(
-            original_message_id,
-            Draft(
-                sender=form_data.sender,
-                receivers=form_data.receivers,
-                subject=form_data.subject,
-                body=form_data.body,
-                cc=form_data.cc,
-                bcc=form_data.bcc,
-                attachments=await convert_uploadfile_to_attachment(form_data.attachments),
+        # Delivered in the background, status is sent over the
+        # notification stream.
+        with get_form_attachments(form_data) as attachments:
+            job = outbox.enqueue(
+                account,
+                OutboxJobKind.Reply,
+                Draft(
+                    sender=form_data.sender,
+                    receivers=form_data.receivers,
+                    subject=form_data.subject,
+                    body=form_data.body,
+                    cc=form_data.cc,
+                    bcc=form_data.bcc,
+                    attachments=attachments,
+                ),
+                original_message_id=original_message_id,
             )
-        )
 
-        return Response(success=status, message=msg)
+        return Response(success=True, message="Reply queued for sending.", data={"job_id": job.id})
     except Exception as e:
         return Response(success=False, message=err_msg("There was an error while replying email.", str(e)))
 
 
 @router.post("/forward-email/{original_message_id}")
-async def forward_email(
+def forward_email(
     original_message_id: str,
     form_data: Annotated[SendEmailFormData, Form()]
 ) -> Response:
     try:
         account = extract_email_address(form_data.sender)
-        response = check_openmail_connection_availability(account)
+        response = check_account_availability(account)
         if isinstance(response, Response):
             return response
 
-        status, msg = client_handler.get_client(account).smtp.forward_email(
-            original_message_id,
-            Draft(
-                sender=form_data.sender,
-                receivers=form_data.receivers,
-                subject=form_data.subject,
-                body=form_data.body,
-                cc=form_data.cc,
-                bcc=form_data.bcc,
-                attachments=await convert_uploadfile_to_attachment(form_data.attachments),
+        # Delivered in the background, status is sent over the
+        # notification stream.
+        with get_form_attachments(form_data) as attachments:
+            job = outbox.enqueue(
+                account,
+                OutboxJobKind.Forward,
+                Draft(
+                    sender=form_data.sender,
+                    receivers=form_data.receivers,
+                    subject=form_data.subject,
+                    body=form_data.body,
+                    cc=form_data.cc,
+                    bcc=form_data.bcc,
+                    attachments=attachments,
+                ),
+                original_message_id=original_message_id,
             )
-        )
 
-        return Response(success=status, message=msg)
+        return Response(success=True, message="Forward queued for sending.", data={"job_id": job.id})
     except Exception as e:
         return Response(success=False, message=err_msg("There was an error while forwarding email.", str(e)))
 
+class BulkSendRecipient(BaseModel):
+    address: str
+    variables: dict[str, str] = {}
+
+class BulkSendEmailRequest(BaseModel):
+    sender: str # Name Surname <namesurname@domain.com> or namesurname@domain.com
+    subject: str # may contain placeholders like {{ name }}
+    body: str # may contain placeholders like {{ name }}
+    recipients: list[BulkSendRecipient]
+    upload_ids: list[str] = [] # ids of finalized upload sessions
+
+@router.post("/bulk-send-email")
+def bulk_send_email(request_body: BulkSendEmailRequest) -> Response:
+    try:
+        account = extract_email_address(request_body.sender)
+        response = check_openmail_connection_availability(account)
+        if isinstance(response, Response):
+            return response
+
+        if not request_body.recipients:
+            return Response(success=False, message="There is no recipient to send email to.")
+
+        # Attachments are encoded once here and shared by every email.
+        merge = MailMerge(Draft(
+            sender=request_body.sender,
+            receivers="",
+            subject=request_body.subject,
+            body=request_body.body,
+            attachments=[
+                upload_spool.get_attachment(upload_id) for upload_id in request_body.upload_ids
+            ],
+        ))
+        job = bulk_sender.start(
+            account,
+            merge,
+            [
+                MergeRecipient(address=recipient.address, variables=recipient.variables)
+                for recipient in request_body.recipients
+            ]
+        )
+
+        return Response(success=True, message="Bulk sending started.", data={"job_id": job.id})
+    except Exception as e:
+        return Response(success=False, message=err_msg("There was an error while starting bulk sending.", str(e)))
+
+@router.websocket("/bulk-send-progress/{job_id}")
+async def bulk_send_progress_socket(websocket: WebSocket, job_id: str):
+    await websocket.accept()
+    uvicorn_logger.websocket(websocket, "New bulk send progress subscription created")
+    subscription = None
+    try:
+        subscription = bulk_sender.subscribe(job_id)
+        job = bulk_sender.get_job(job_id)
+        await websocket.send_json(job.to_status())
+        while not job.is_finished:
+            await asyncio.sleep(BULK_SEND_STATUS_CHECK_INTERVAL_SEC)
+            # Only the latest status matters, counters are cumulative.
+            status = None
+            while not subscription.empty():
+                status = subscription.get_nowait()
+            if status:
+                await websocket.send_json(status)
+        await websocket.send_json(job.to_status())
+        await websocket.close(reason=f"Bulk send job is {job.status}.")
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        await websocket.close(reason="There was an error while sending bulk send progress.")
+        uvicorn_logger.websocket(websocket, e)
+    finally:
+        if subscription:
+            bulk_sender.unsubscribe(job_id, subscription)
+
+@router.get("/get-bulk-send-jobs/{account}")
+def get_bulk_send_jobs(
+    account: str
+) -> Response[OpenmailTaskResults[list[dict]]]:
+    try:
+        account = extract_email_address(account)
+        return Response(
+            success=True,
+            message="Bulk send jobs fetched successfully.",
+            data={account: [job.to_status() for job in bulk_sender.get_jobs(account)]}
+        )
+    except Exception as e:
+        return Response(success=False, message=err_msg("There was an error while fetching bulk send jobs.", str(e)))
+
+class CancelBulkSendJobRequest(BaseModel):
+    job_id: str
+
+@router.post("/cancel-bulk-send-job")
+def cancel_bulk_send_job(request_body: CancelBulkSendJobRequest) -> Response:
+    try:
+        bulk_sender.cancel(request_body.job_id)
+        return Response(success=True, message="Bulk send job cancelled successfully.")
+    except Exception as e:
+        return Response(success=False, message=err_msg("There was an error while cancelling bulk send job.", str(e)))
+
+@router.get("/get-outbox/{account}")
+def get_outbox(
+    account: str
+) -> Response[OpenmailTaskResults[list[dict]]]:
+    try:
+        account = extract_email_address(account)
+        return Response(
+            success=True,
+            message="Outbox fetched successfully.",
+            data={account: [job.to_status() for job in outbox.get_jobs(account)]}
+        )
+    except Exception as e:
+        return Response(success=False, message=err_msg("There was an error while fetching outbox.", str(e)))
+
+class DiscardOutboxJobRequest(BaseModel):
+    account: str
+    job_id: str
+
+@router.post("/discard-outbox-job")
+def discard_outbox_job(request_body: DiscardOutboxJobRequest) -> Response:
+    try:
+        outbox.discard(extract_email_address(request_body.account), request_body.job_id)
+        return Response(success=True, message="Outbox job discarded successfully.")
+    except Exception as e:
+        return Response(success=False, message=err_msg("There was an error while discarding outbox job.", str(e)))
+
 @router.post("/save-email-as-draft")
 async def save_email_as_draft(
     form_data: Annotated[SendEmailFormData, Form()],
@@ -363,19 +1035,21 @@ async def save_email_as_draft(
         if isinstance(response, Response):
             return response
 
-        appenduid = client_handler.get_client(account).imap.save_email_as_draft(
-            client_handler.get_client(account).smtp.create_email(Draft(
-                sender=form_data.sender,
-                receivers=form_data.receivers,
-                subject=form_data.subject,
-                body=form_data.body,
-                cc=form_data.cc,
-                bcc=form_data.bcc,
-                attachments=await convert_uploadfile_to_attachment(form_data.attachments),
-            )),
-            appenduid
-        )
+        with get_form_attachments(form_data) as attachments:
+            appenduid = client_handler.get_client(account).imap.save_email_as_draft(
+                client_handler.get_client(account).smtp.create_email(Draft(
+                    sender=form_data.sender,
+                    receivers=form_data.receivers,
+                    subject=form_data.subject,
+                    body=form_data.body,
+                    cc=form_data.cc,
+                    bcc=form_data.bcc,
+                    attachments=attachments,
+                )),
+                appenduid
+            )
 
+        single_flight.invalidate(account)
         return Response(success=True, message="Email saved as draft successfully.", data={appenduid: appenduid})
     except Exception as e:
         return Response(success=False, message=err_msg("There was an error while saving email as draft.", str(e)))
@@ -387,8 +1061,10 @@ class MarkEmailRequest(BaseModel):
     folder: str = Folder.Inbox
 
 
+# Sync, so marks of the same account that arrive together run in
+# parallel and are sent as one command, see `FlagChanges`.
 @router.post("/mark-email")
-async def mark_email(request_body: MarkEmailRequest) -> Response:
+def mark_email(request_body: MarkEmailRequest) -> Response:
     try:
         account = extract_email_address(request_body.account)
         response = check_openmail_connection_availability(account)
@@ -400,6 +1076,7 @@ async def mark_email(request_body: MarkEmailRequest) -> Response:
             request_body.mark,
             request_body.folder,
         )
+        single_flight.invalidate(account)
         return Response(success=status, message=msg)
     except Exception as e:
         return Response(success=False, message=err_msg("There was an error while marking email.", str(e)))
@@ -413,7 +1090,7 @@ class UnmarkEmailRequest(BaseModel):
 
 
 @router.post("/unmark-email")
-async def unmark_email(request_body: UnmarkEmailRequest) -> Response:
+def unmark_email(request_body: UnmarkEmailRequest) -> Response:
     try:
         account = extract_email_address(request_body.account)
         response = check_openmail_connection_availability(account)
@@ -425,6 +1102,7 @@ async def unmark_email(request_body: UnmarkEmailRequest) -> Response:
             request_body.mark,
             request_body.folder,
         )
+        single_flight.invalidate(account)
         return Response(success=status, message=msg)
     except Exception as e:
         return Response(success=False, message=err_msg("There was an error while unmarking email.", str(e)))
@@ -450,6 +1128,7 @@ async def move_email(request_body: MoveEmailRequest) -> Response:
             request_body.destination_folder,
             request_body.sequence_set,
         )
+        single_flight.invalidate(account)
         return Response(success=status, message=msg)
     except Exception as e:
         return Response(success=False, message=err_msg("There was an error while moving email.", str(e)))
@@ -475,6 +1154,7 @@ async def copy_email(request_body: CopyEmailRequest) -> Response:
             request_body.destination_folder,
             request_body.sequence_set,
         )
+        single_flight.invalidate(account)
         return Response(success=status, message=msg)
     except Exception as e:
         return Response(success=False, message=err_msg("There was an error while copying email.", str(e)))
@@ -498,6 +1178,7 @@ async def delete_email(request_body: DeleteEmailRequest) -> Response:
             request_body.folder,
             request_body.sequence_set
         )
+        single_flight.invalidate(account)
         return Response(success=status, message=msg)
     except Exception as e:
         return Response(success=False, message=err_msg("There was an error while deleting email.", str(e)))
@@ -520,6 +1201,7 @@ async def create_folder(request_body: CreateFolderRequest) -> Response:
         status, msg = client_handler.get_client(account).imap.create_folder(
             request_body.folder_name, request_body.parent_folder
         )
+        single_flight.invalidate(account)
         return Response(success=status, message=msg)
     except Exception as e:
         return Response(success=False, message=err_msg("There was an error while creating folder.", str(e)))
@@ -542,6 +1224,7 @@ async def rename_folder(request_body: RenameFolderRequest) -> Response:
         status, msg = client_handler.get_client(account).imap.rename_folder(
             request_body.folder_name, request_body.new_folder_name
         )
+        single_flight.invalidate(account)
         return Response(success=status, message=msg)
     except Exception as e:
         return Response(success=False, message=err_msg("There was an error while renaming folder.", str(e)))
@@ -564,6 +1247,7 @@ async def move_folder(request_body: MoveFolderRequest) -> Response:
         status, msg = client_handler.get_client(account).imap.move_folder(
             request_body.folder_name, request_body.destination_folder
         )
+        single_flight.invalidate(account)
         return Response(success=status, message=msg)
     except Exception as e:
         return Response(success=False, message=err_msg("There was an error while moving folder.", str(e)))
@@ -586,6 +1270,7 @@ async def delete_folder(request_body: DeleteFolderRequest) -> Response:
             request_body.folder_name,
             request_body.delete_subfolders
         )
+        single_flight.invalidate(account)
         return Response(success=status, message=msg)
     except Exception as e:
         return Response(success=False, message=err_msg("There was an error while deleting folder.", str(e)))
@@ -613,49 +1298,3 @@ async def unsubscribe_email(request_body: UnsubscribeEmailRequest) -> Response:
         return Response(success=False, message=err_msg("There was an error while unsubscribing.", str(e)))
 
 __all__ = ["router"]
-
-"""
-Execute openmail tasks with threading module:
-
-def execute_openmail_task_concurrently(
-    accounts: set[str], # unique email addresses
-    func: Callable[...],
-    **params
-) -> OpenmailTaskResults:
-    result: OpenmailTaskResults = {}
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_TASK_WORKER) as executor:
-        future_to_emails = {
-            executor.submit(func, client, **params): email_address
-            for email_address, client in openmail_clients.items()
-            if email_address in accounts
-        }
-
-        for future in concurrent.futures.as_completed(future_to_emails, IMAP_OPERATION_TIMEOUT):
-            email_address = future_to_emails[future]
-            future = future.result()
-            result[email_address] = future
-            print(f"Result for {email_address}: {future}") # TODO: Comment this
-
-        return result
-
-# Usage examples of `execute_openmail_task_concurrently`:
-# instance.imap.get_folders()
-execute_openmail_task_concurrently(
-    unique_email_addresses,
-    lambda client, **params: client.imap.get_folders(),
-)
-# instance.imap.search_emails()
-execute_openmail_task_concurrently(
-    unique_email_addresses,
-    lambda client, **params: client.imap.search_emails(**params),
-    folder=folder,
-    search=SearchCriteria.parse_raw(search) if search else None,
-)
-# instance.imap.get_emails()
-execute_openmail_task_concurrently(
-    unique_email_addresses,
-    lambda client, **params: client.imap.get_emails(**params),
-    offset_start=offset_start,
-    offset_end=offset_end,
-)
-"""
@@ -35,6 +35,10 @@ def generate_random_id() -> str:
     random_part = random.randint(1000, 9999)
     return f"{epoch_time}{random_part}"
 
+def calculate_backoff(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter, `attempt` starts from 1."""
+    return random.uniform(0, min(cap, base * (2 ** max(attempt - 1, 0))))
+
 def safe_json_loads(value: bytes | str) -> dict | list | str:
     if isinstance(value, bytes):
         value = value.decode()
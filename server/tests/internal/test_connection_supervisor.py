@@ -0,0 +1,126 @@
+import time
+import unittest
+import threading
+
+from src.internal import connection_supervisor
+from src.internal.connection_supervisor import (
+    ConnectionSupervisor,
+    ConnectionStatus,
+    TimerWheel,
+    CircuitBreaker,
+)
+from src.internal.connection_supervisor import CircuitState
+
+class TestConnectionSupervisor(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        print("Setting up test `TestConnectionSupervisor`...")
+        cls._original_backoff_base = connection_supervisor.BACKOFF_BASE
+        connection_supervisor.BACKOFF_BASE = 0.5
+        cls.addClassCleanup(cls.cleanup)
+
+    def test_timer_wheel(self):
+        print("test_timer_wheel...")
+        wheel = TimerWheel(size=4)
+        wheel.schedule("a", 1)
+        wheel.schedule("b", 3)
+        wheel.schedule("c", 6) # Longer than one revolution
+        self.assertEqual(wheel.advance(), ["a"])
+        self.assertEqual(wheel.advance(), [])
+        self.assertEqual(wheel.advance(), ["b"])
+        self.assertEqual(wheel.advance(), [])
+        self.assertEqual(wheel.advance(), [])
+        self.assertEqual(wheel.advance(), ["c"])
+        self.assertFalse(wheel.is_scheduled("c"))
+
+    def test_timer_wheel_reschedule_and_cancel(self):
+        print("test_timer_wheel_reschedule_and_cancel...")
+        wheel = TimerWheel(size=8)
+        wheel.schedule("a", 1)
+        wheel.schedule("a", 2)
+        wheel.schedule("b", 1)
+        wheel.cancel("b")
+        self.assertEqual(wheel.advance(), [])
+        self.assertEqual(wheel.advance(), ["a"])
+
+    def test_circuit_breaker(self):
+        print("test_circuit_breaker...")
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=0.2)
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitState.Closed)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitState.Open)
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.25)
+        self.assertEqual(breaker.state, CircuitState.HalfOpen)
+        self.assertTrue(breaker.allow())
+        # Only one trial is allowed while half open.
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitState.Open)
+
+        time.sleep(0.25)
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitState.Closed)
+
+    def test_reconnect_with_backoff(self):
+        print("test_reconnect_with_backoff...")
+        attempts = []
+        reconnected = threading.Event()
+
+        def reconnect(key) -> bool:
+            attempts.append(key)
+            if len(attempts) < 3:
+                return False
+            reconnected.set()
+            return True
+
+        supervisor = ConnectionSupervisor(probe=lambda key: True, reconnect=reconnect)
+        supervisor.start()
+        try:
+            supervisor.watch(("a@mail.com", False), "mail.com", connected=False)
+            self.assertEqual(
+                supervisor.get_status(("a@mail.com", False)),
+                ConnectionStatus.Reconnecting
+            )
+            self.assertTrue(reconnected.wait(timeout=15))
+            time.sleep(0.1)
+            self.assertEqual(
+                supervisor.get_status(("a@mail.com", False)),
+                ConnectionStatus.Connected
+            )
+            self.assertEqual(len(attempts), 3)
+        finally:
+            supervisor.shutdown()
+
+    def test_report_logged_out(self):
+        print("test_report_logged_out...")
+        reconnected = threading.Event()
+
+        def reconnect(key) -> bool:
+            reconnected.set()
+            return True
+
+        supervisor = ConnectionSupervisor(probe=lambda key: True, reconnect=reconnect)
+        supervisor.start()
+        try:
+            supervisor.watch("a", "mail.com")
+            self.assertEqual(supervisor.get_status("a"), ConnectionStatus.Connected)
+            supervisor.report_logged_out("a")
+            self.assertEqual(supervisor.get_status("a"), ConnectionStatus.Reconnecting)
+            self.assertTrue(reconnected.wait(timeout=5))
+        finally:
+            supervisor.shutdown()
+
+    def test_unknown_connection(self):
+        print("test_unknown_connection...")
+        supervisor = ConnectionSupervisor(probe=lambda key: True, reconnect=lambda key: True)
+        self.assertEqual(supervisor.get_status("unknown"), ConnectionStatus.Disconnected)
+
+    @classmethod
+    def cleanup(cls):
+        print("Cleaning up test `TestConnectionSupervisor`...")
+        connection_supervisor.BACKOFF_BASE = cls._original_backoff_base
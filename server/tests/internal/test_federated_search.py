@@ -0,0 +1,71 @@
+import time
+import unittest
+
+from src.internal.federated_search import iter_federated_search
+from src.modules.openmail.types import Mailbox
+from tests.modules.openmail.utils.email_generator import EmailGenerator
+
+class TestFederatedSearch(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        print("Setting up test `TestFederatedSearch`...")
+        # Seconds each folder takes to answer.
+        cls._delays = {"INBOX": 0.05, "Archive": 0.3, "All Mail": 0.1, "Sent": 2}
+
+    def _search_folder(self, account: str, folder: str) -> Mailbox:
+        time.sleep(self.__class__._delays[folder])
+        if folder == "Archive" and account == "b@mail.com":
+            raise Exception("Folder could not be selected.")
+        return Mailbox(folder=folder, emails=[
+            EmailGenerator.email(1, date="Fri, 03 Jan 2025 08:00:00 +0000"),
+            EmailGenerator.email(2, date="Sat, 04 Jan 2025 08:00:00 +0000"),
+        ], total=-1)
+
+    def test_stream_results_as_folders_answer(self):
+        print("test_stream_results_as_folders_answer...")
+        started_at = time.monotonic()
+        answered_at = []
+        results = []
+        for result in iter_federated_search(
+            {"a@mail.com": None, "b@mail.com": ["INBOX", "Archive"]},
+            self._search_folder,
+            lambda account: ["All Mail"],
+        ):
+            answered_at.append(time.monotonic() - started_at)
+            results.append(result)
+
+        self.assertEqual(
+            [(result.account, result.folder, result.error) for result in results],
+            [
+                ("b@mail.com", "INBOX", ""),
+                ("a@mail.com", "All Mail", ""),
+                ("b@mail.com", "Archive", "Folder could not be selected."),
+            ]
+        )
+        self.assertLess(answered_at[0], 0.2)
+        # Folders of an account are searched one by one.
+        self.assertGreaterEqual(answered_at[2], 0.35)
+        self.assertEqual([email.uid for email in results[0].emails], ["2", "1"])
+
+    def test_report_timed_out_folders(self):
+        print("test_report_timed_out_folders...")
+        def resolve_folders(account: str) -> list[str]:
+            raise Exception("Connection is not available.")
+
+        started_at = time.monotonic()
+        results = list(iter_federated_search(
+            {"a@mail.com": ["Sent", "INBOX"], "b@mail.com": ["INBOX"], "c@mail.com": None},
+            self._search_folder,
+            resolve_folders,
+            timeout=0.5
+        ))
+        self.assertLess(time.monotonic() - started_at, 1)
+        self.assertCountEqual(
+            [(result.account, result.folder, result.error) for result in results],
+            [
+                ("b@mail.com", "INBOX", ""),
+                ("c@mail.com", "", "Connection is not available."),
+                ("a@mail.com", "Sent", "Timed out after 0.5 seconds."),
+                ("a@mail.com", "INBOX", "Timed out after 0.5 seconds."),
+            ]
+        )
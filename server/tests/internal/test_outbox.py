@@ -0,0 +1,153 @@
+import os
+import json
+import shutil
+import base64
+import unittest
+
+from src.internal.file_system import Root
+from src.internal.outbox import (
+    OutboxSpool,
+    OutboxJobKind,
+    OutboxJobStatus,
+    OutboxJobNotFound,
+)
+from src.modules.openmail.types import Draft, Attachment
+
+class TestOutbox(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        print("Setting up test `TestOutbox`...")
+        cls.addClassCleanup(cls.cleanup)
+        cls._test_root_name = "test_outbox"
+        cls._test_root_fullpath = os.path.join(".", cls._test_root_name)
+        cls._spool = OutboxSpool(Root(cls._test_root_name, "."))
+        cls._account = "test@openmail.com"
+
+    def create_draft(self) -> Draft:
+        return Draft(
+            sender=self.__class__._account,
+            receivers="receiver@openmail.com",
+            subject="test_outbox",
+            body="test_outbox",
+            attachments=[
+                Attachment(name="a.txt", size=5, type="text/plain", data=b"hello"),
+                Attachment(
+                    name="b.txt",
+                    size=5,
+                    type="text/plain",
+                    data=base64.b64encode(b"world").decode()
+                ),
+            ]
+        )
+
+    def test_add_and_get(self):
+        print("test_add_and_get...")
+        job = self.__class__._spool.add(
+            self.__class__._account,
+            OutboxJobKind.Reply,
+            self.create_draft(),
+            "<message-id@openmail.com>"
+        )
+
+        found_job = self.__class__._spool.get(self.__class__._account, job.id)
+        self.assertEqual(found_job.kind, OutboxJobKind.Reply)
+        self.assertEqual(found_job.status, OutboxJobStatus.Queued)
+        self.assertEqual(found_job.original_message_id, "<message-id@openmail.com>")
+        self.assertEqual(found_job.draft.subject, "test_outbox")
+
+        # Attachment data must be moved to files next to the job.
+        assert found_job.draft.attachments is not None
+        for attachment, expected in zip(found_job.draft.attachments, [b"hello", b"world"]):
+            self.assertIsNone(attachment.data)
+            assert attachment.path is not None
+            with open(attachment.path, "rb") as f:
+                self.assertEqual(f.read(), expected)
+
+        with open(os.path.join(
+            self.__class__._test_root_fullpath,
+            self.__class__._account,
+            job.id,
+            "job.json"
+        )) as f:
+            self.assertNotIn("hello", f.read())
+
+    def test_add_with_local_file(self):
+        print("test_add_with_local_file...")
+        local_file_path = os.path.join(self.__class__._test_root_fullpath, "upload")
+        with open(local_file_path, "wb") as f:
+            f.write(b"uploaded")
+
+        draft = self.create_draft()
+        draft.attachments = [
+            Attachment(name="c.txt", size=8, type="text/plain", path=local_file_path)
+        ]
+        job = self.__class__._spool.add(self.__class__._account, OutboxJobKind.Send, draft)
+        # Job must not depend on the original file.
+        os.remove(local_file_path)
+
+        found_job = self.__class__._spool.get(self.__class__._account, job.id)
+        assert found_job.draft.attachments is not None
+        attachment = found_job.draft.attachments[0]
+        assert attachment.path is not None
+        self.assertNotEqual(attachment.path, local_file_path)
+        with open(attachment.path, "rb") as f:
+            self.assertEqual(f.read(), b"uploaded")
+
+    def test_save(self):
+        print("test_save...")
+        job = self.__class__._spool.add(
+            self.__class__._account, OutboxJobKind.Send, self.create_draft()
+        )
+        job.status = OutboxJobStatus.Retrying
+        job.attempt = 2
+        job.last_error = "421 Try again later"
+        self.__class__._spool.save(job)
+
+        found_job = self.__class__._spool.get(self.__class__._account, job.id)
+        self.assertEqual(found_job.status, OutboxJobStatus.Retrying)
+        self.assertEqual(found_job.attempt, 2)
+        self.assertEqual(found_job.last_error, "421 Try again later")
+
+    def test_get_all_in_order(self):
+        print("test_get_all_in_order...")
+        account = "order@openmail.com"
+        job_ids = [
+            self.__class__._spool.add(account, OutboxJobKind.Send, self.create_draft()).id
+            for _ in range(3)
+        ]
+        self.assertEqual(
+            [job.id for job in self.__class__._spool.get_all(account)],
+            job_ids
+        )
+
+    def test_recover(self):
+        print("test_recover...")
+        account = "recover@openmail.com"
+        job = self.__class__._spool.add(account, OutboxJobKind.Send, self.create_draft())
+        # Job that was being written while crashed.
+        half_written_job_dir = os.path.join(
+            self.__class__._test_root_fullpath, account, "123.tmp"
+        )
+        os.makedirs(half_written_job_dir)
+        with open(os.path.join(half_written_job_dir, "job.json"), "w") as f:
+            f.write(json.dumps({"id": "123"})[:5])
+
+        self.__class__._spool.recover()
+        self.assertFalse(os.path.exists(half_written_job_dir))
+        self.assertEqual([job.id for job in self.__class__._spool.get_all(account)], [job.id])
+
+    def test_remove(self):
+        print("test_remove...")
+        job = self.__class__._spool.add(
+            self.__class__._account, OutboxJobKind.Send, self.create_draft()
+        )
+        self.__class__._spool.remove(self.__class__._account, job.id)
+        with self.assertRaises(OutboxJobNotFound):
+            self.__class__._spool.get(self.__class__._account, job.id)
+        with self.assertRaises(OutboxJobNotFound):
+            self.__class__._spool.remove(self.__class__._account, job.id)
+
+    @classmethod
+    def cleanup(cls):
+        print("Cleaning up test `TestOutbox`...")
+        shutil.rmtree(cls._test_root_fullpath, ignore_errors=True)
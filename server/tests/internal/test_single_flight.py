@@ -0,0 +1,104 @@
+import time
+import threading
+import unittest
+
+from src.internal.single_flight import SingleFlight
+from src.modules.openmail.types import SearchCriteria
+
+class TestSingleFlight(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        print("Setting up test `TestSingleFlight`...")
+        cls.addClassCleanup(cls.cleanup)
+        cls._single_flight = SingleFlight()
+
+    def _get_stats(self, operation: str):
+        return next(
+            stats for stats in self.__class__._single_flight.get_stats()
+            if stats.operation == operation
+        )
+
+    def test_coalesce_concurrent_calls(self):
+        print("test_coalesce_concurrent_calls...")
+        executions = []
+        release = threading.Event()
+
+        def fetch_folders():
+            executions.append(1)
+            release.wait(5)
+            return ["INBOX", "Sent"]
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                self.__class__._single_flight.run(
+                    "a@mail.com", "test_coalesce", (), fetch_folders
+                )
+            ))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(executions), 1)
+        self.assertEqual(results, [["INBOX", "Sent"]] * 5)
+        stats = self._get_stats("test_coalesce")
+        self.assertEqual((stats.calls, stats.executions, stats.coalesced), (5, 1, 4))
+
+    def test_share_error_of_call(self):
+        print("test_share_error_of_call...")
+        release = threading.Event()
+
+        def fail():
+            release.wait(5)
+            raise ValueError("Connection lost")
+
+        errors = []
+        def run():
+            try:
+                self.__class__._single_flight.run("a@mail.com", "test_error", (), fail)
+            except ValueError as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=run) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, ["Connection lost"] * 3)
+        # Errors are not kept.
+        self.assertEqual(
+            self.__class__._single_flight.run("a@mail.com", "test_error", (), lambda: "ok", 10),
+            "ok"
+        )
+
+    def test_keep_result_until_invalidated(self):
+        print("test_keep_result_until_invalidated...")
+        executions = []
+        def fetch_mailbox():
+            executions.append(1)
+            return len(executions)
+
+        run = lambda account, folder, search: self.__class__._single_flight.run(
+            account, "test_ttl", (folder, search, None), fetch_mailbox, 10
+        )
+        self.assertEqual(run("a@mail.com", "INBOX", SearchCriteria(senders=["b@mail.com"])), 1)
+        # Same key after normalization.
+        self.assertEqual(run("A@mail.com", " INBOX", SearchCriteria(senders=["b@mail.com"])), 1)
+        self.assertEqual(run("a@mail.com", "INBOX", SearchCriteria(senders=["c@mail.com"])), 2)
+        self.assertEqual(self._get_stats("test_ttl").cached, 1)
+
+        self.__class__._single_flight.invalidate("a@mail.com")
+        self.assertEqual(run("a@mail.com", "INBOX", SearchCriteria(senders=["b@mail.com"])), 3)
+
+    @classmethod
+    def cleanup(cls):
+        print("Cleaning up test `TestSingleFlight`...")
+        cls._single_flight.invalidate("a@mail.com")
@@ -0,0 +1,74 @@
+import time
+import unittest
+
+from src.internal.unified_mailbox import get_unified_mailbox, decode_cursor
+from src.modules.openmail.types import Mailbox
+from tests.modules.openmail.utils.email_generator import EmailGenerator
+
+class TestUnifiedMailbox(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        print("Setting up test `TestUnifiedMailbox`...")
+        # Uids of the emails of each account, newest first, with their dates.
+        cls._folders = {
+            "a@mail.com": [(30, "Mon, 06 Jan 2025 12:00:00 +0000"), (29, "Mon, 06 Jan 2025 09:00:00 +0000"),
+                           (27, "Sun, 05 Jan 2025 10:00:00 +0000")],
+            "b@mail.com": [(8, "Mon, 06 Jan 2025 13:30:00 +0100"), (5, "Mon, 06 Jan 2025 11:00:00 +0000"),
+                           (4, "Sat, 04 Jan 2025 08:00:00 +0000"), (2, "Fri, 03 Jan 2025 08:00:00 +0000")],
+        }
+
+    def _fetch_page(self, account: str, before_uid: str | None, limit: int) -> Mailbox:
+        emails = [
+            EmailGenerator.email(uid, date=date) for uid, date in self.__class__._folders[account]
+            if before_uid is None or uid < int(before_uid)
+        ]
+        return Mailbox(folder="INBOX", emails=emails[:limit], total=len(self.__class__._folders[account]))
+
+    def test_merge_pages_by_date(self):
+        print("test_merge_pages_by_date...")
+        accounts = ["a@mail.com", "b@mail.com"]
+        pages, cursor = [], ""
+        while True:
+            unified_mailbox = get_unified_mailbox(accounts, self._fetch_page, 3, cursor)
+            pages.append([(email.account[0], email.email.uid) for email in unified_mailbox.emails])
+            cursor = unified_mailbox.cursor
+            if not cursor:
+                break
+
+        self.assertEqual(pages, [
+            [("b", "8"), ("a", "30"), ("b", "5")],
+            [("a", "29"), ("a", "27"), ("b", "4")],
+            [("b", "2")],
+        ])
+        self.assertEqual(unified_mailbox.totals, {"b@mail.com": 4})
+
+    def test_leave_out_failed_accounts(self):
+        print("test_leave_out_failed_accounts...")
+        def fetch_page(account: str, before_uid: str | None, limit: int) -> Mailbox:
+            if account == "slow@mail.com":
+                time.sleep(2)
+            if account == "down@mail.com":
+                raise Exception("Connection is not available.")
+            time.sleep(0.2)
+            return self._fetch_page(account, before_uid, limit)
+
+        started_at = time.monotonic()
+        unified_mailbox = get_unified_mailbox(
+            ["a@mail.com", "slow@mail.com", "b@mail.com", "down@mail.com"],
+            fetch_page,
+            2,
+            timeout=0.5
+        )
+        # Page waits for the timeout at most, not for the slow account
+        # or for the accounts one after another.
+        self.assertLess(time.monotonic() - started_at, 1)
+        self.assertEqual([email.email.uid for email in unified_mailbox.emails], ["8", "30"])
+        self.assertEqual(unified_mailbox.failed, {
+            "slow@mail.com": "Timed out after 0.5 seconds.",
+            "down@mail.com": "Connection is not available.",
+        })
+        self.assertEqual(decode_cursor(unified_mailbox.cursor), {
+            "a@mail.com": "30", "b@mail.com": "8", "slow@mail.com": "", "down@mail.com": "",
+        })
+        with self.assertRaises(ValueError):
+            get_unified_mailbox(["a@mail.com"], fetch_page, 2, "not-a-cursor")
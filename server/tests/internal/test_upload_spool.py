@@ -0,0 +1,102 @@
+import io
+import os
+import shutil
+import unittest
+
+from src.internal.file_system import Root
+from src.internal.upload_spool import (
+    UploadSpool,
+    UploadSessionBusy,
+    UploadSessionNotFound,
+    UploadOffsetMismatch,
+    UploadSizeExceeded,
+    UploadNotFinalized,
+)
+
+class TestUploadSpool(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        print("Setting up test `TestUploadSpool`...")
+        cls.addClassCleanup(cls.cleanup)
+        cls._test_root_name = "test_upload_spool"
+        cls._test_root_fullpath = os.path.join(".", cls._test_root_name)
+        cls._spool = UploadSpool(Root(cls._test_root_name, "."))
+
+    def test_upload_in_chunks(self):
+        print("test_upload_in_chunks...")
+        content = os.urandom(1024)
+        session = self.__class__._spool.create("a.bin", "application/octet-stream", len(content))
+        for offset in range(0, len(content), 100):
+            with self.__class__._spool.open_chunk(session.id, offset) as chunk:
+                chunk.write(content[offset:offset + 60])
+                chunk.write(content[offset + 60:offset + 100])
+            self.assertEqual(
+                self.__class__._spool.get(session.id).received,
+                min(offset + 100, len(content))
+            )
+
+        self.__class__._spool.finalize(session.id)
+        attachment = self.__class__._spool.get_attachment(session.id)
+        self.assertEqual(attachment.name, "a.bin")
+        self.assertEqual(attachment.size, len(content))
+        self.assertIsNone(attachment.data)
+        assert attachment.path is not None
+        with open(attachment.path, "rb") as f:
+            self.assertEqual(f.read(), content)
+
+    def test_resume_interrupted_chunk(self):
+        print("test_resume_interrupted_chunk...")
+        content = b"0123456789"
+        session = self.__class__._spool.create("b.txt", "text/plain", len(content))
+        with self.assertRaises(ConnectionError):
+            with self.__class__._spool.open_chunk(session.id, 0) as chunk:
+                chunk.write(content[:4])
+                raise ConnectionError
+
+        # Received bytes are kept, upload is resumed from there.
+        received = self.__class__._spool.get(session.id).received
+        self.assertEqual(received, 4)
+        with self.assertRaises(UploadOffsetMismatch):
+            with self.__class__._spool.open_chunk(session.id, received + 1):
+                pass
+        # A chunk can be sent again from an earlier offset.
+        with self.__class__._spool.open_chunk(session.id, 2) as chunk:
+            chunk.write(content[2:])
+        self.assertEqual(self.__class__._spool.finalize(session.id).received, len(content))
+
+    def test_limits(self):
+        print("test_limits...")
+        session = self.__class__._spool.create("c.txt", "text/plain", 5)
+        with self.assertRaises(UploadSizeExceeded):
+            with self.__class__._spool.open_chunk(session.id, 0) as chunk:
+                chunk.write(b"123456")
+
+        with self.__class__._spool.open_chunk(session.id, 0):
+            with self.assertRaises(UploadSessionBusy):
+                with self.__class__._spool.open_chunk(session.id, 0):
+                    pass
+
+        with self.assertRaises(UploadNotFinalized):
+            self.__class__._spool.finalize(session.id)
+        with self.assertRaises(UploadNotFinalized):
+            self.__class__._spool.get_attachment(session.id)
+
+    def test_add_file_and_remove(self):
+        print("test_add_file_and_remove...")
+        session = self.__class__._spool.add_file("d.txt", "text/plain", io.BytesIO(b"hello"))
+        self.assertTrue(session.is_finalized)
+        self.assertEqual(session.size, 5)
+        with self.assertRaises(UploadOffsetMismatch):
+            with self.__class__._spool.open_chunk(session.id, 0):
+                pass
+
+        self.__class__._spool.remove(session.id)
+        with self.assertRaises(UploadSessionNotFound):
+            self.__class__._spool.get(session.id)
+        with self.assertRaises(UploadSessionNotFound):
+            self.__class__._spool.get("../" + session.id)
+
+    @classmethod
+    def cleanup(cls):
+        print("Cleaning up test `TestUploadSpool`...")
+        shutil.rmtree(cls._test_root_fullpath, ignore_errors=True)
@@ -3,6 +3,8 @@ import json
 
 from src.modules.openmail import Openmail
 from src.modules.openmail.utils import contains_non_ascii
+from src.modules.openmail.tls import get_tls_session_stats
+from src.modules.openmail.rate_limiter import get_rate_limiter_stats
 
 class TestConnectOperations(unittest.TestCase):
     @classmethod
@@ -108,6 +110,68 @@ class TestConnectOperations(unittest.TestCase):
         if len(logged_out_failed_accounts) > 0:
             self.fail(f"There were accounts that could not be logged out: {logged_out_failed_accounts}")
 
+    def test_standby_failover(self):
+        print("test_standby_failover...")
+        credential = self.__class__._credentials[0]
+        status, message = self.__class__._openmail.connect(
+            credential["email"],
+            credential["password"],
+            imap_enable_standby=True
+        )
+        self.assertTrue(status, message)
+        self.assertTrue(self.__class__._openmail.keep_standby_alive())
+
+        self.__class__._openmail.imap.select("INBOX")
+        dropped_session = self.__class__._openmail.imap
+        # Simulate a dropped connection.
+        dropped_session.shutdown()
+        dropped_session.state = "LOGOUT"
+
+        promoted_session = self.__class__._openmail.imap
+        self.assertIsNot(promoted_session, dropped_session)
+        self.assertEqual(promoted_session.state, "SELECTED")
+        self.__class__._openmail.disconnect()
+
+    def test_tls_session_resumption(self):
+        print("test_tls_session_resumption...")
+        credential = self.__class__._credentials[0]
+        for _ in range(2):
+            status, message = self.__class__._openmail.connect(
+                credential["email"],
+                credential["password"]
+            )
+            self.assertTrue(status, message)
+            self.__class__._openmail.disconnect()
+
+        stats = get_tls_session_stats()
+        self.assertTrue(stats)
+        self.assertTrue(any(host_stats.resumptions > 0 for host_stats in stats))
+
+    def test_shared_rate_limiter(self):
+        print("test_shared_rate_limiter...")
+        credential = self.__class__._credentials[0]
+        status, message = self.__class__._openmail.connect(
+            credential["email"],
+            credential["password"],
+            imap_enable_standby=True
+        )
+        self.assertTrue(status, message)
+        self.assertTrue(self.__class__._openmail.keep_standby_alive())
+
+        # Active and standby sessions of the account share one budget.
+        self.assertIs(
+            self.__class__._openmail.imap._rate_limiter,
+            self.__class__._openmail._imap_standby._rate_limiter
+        )
+        self.__class__._openmail.imap.get_folders()
+        stats = [
+            account_stats for account_stats in get_rate_limiter_stats()
+            if account_stats.account == credential["email"].lower()
+        ]
+        self.assertTrue(stats)
+        self.assertTrue(all(0 < account_stats.rate <= account_stats.max_rate for account_stats in stats))
+        self.__class__._openmail.disconnect()
+
     @classmethod
     def cleanup(cls):
         print("Cleaning up test `TestConnectOperations`...")
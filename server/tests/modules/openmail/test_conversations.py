@@ -0,0 +1,80 @@
+import unittest
+
+from src.modules.openmail.conversations import get_base_subject, thread_emails
+from src.modules.openmail.search_index import SearchIndex
+from src.modules.openmail.types import ConversationEmail
+from tests.modules.openmail.utils.email_generator import EmailGenerator
+
+class TestConversations(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        print("Setting up test `TestConversations`...")
+
+    def _thread(self, conversation_emails: list[ConversationEmail]) -> list[tuple[str, str, int]]:
+        return [
+            (conversation_email.folder, conversation_email.email.uid, conversation_email.depth)
+            for conversation_email in thread_emails(conversation_emails)
+        ]
+
+    def test_thread_emails(self):
+        print("test_thread_emails...")
+        self.assertEqual(self._thread([
+            ConversationEmail("INBOX", EmailGenerator.email(4, "Re: Re: Meeting", day=4, message_id="<d@mail>", in_reply_to="<b@mail>", references="<a@mail> <b@mail>")),
+            ConversationEmail("Sent", EmailGenerator.email(9, "Re: Meeting", day=3, message_id="<c@mail>", in_reply_to="<a@mail>", references="<a@mail>")),
+            ConversationEmail("INBOX", EmailGenerator.email(2, "Re: Meeting", day=2, message_id="<b@mail>", in_reply_to="<a@mail>")),
+            ConversationEmail("INBOX", EmailGenerator.email(1, "Meeting", day=1, message_id="<a@mail>")),
+            # Copy of the first email in another folder.
+            ConversationEmail("All Mail", EmailGenerator.email(7, "Meeting", day=1, message_id="<a@mail>")),
+        ]), [("INBOX", "1", 0), ("INBOX", "2", 1), ("INBOX", "4", 2), ("Sent", "9", 1)])
+
+        # Replies of an email that is not known become the roots.
+        self.assertEqual(self._thread([
+            ConversationEmail("INBOX", EmailGenerator.email(5, "Re: Plan", day=6, message_id="<f@mail>", in_reply_to="<x@mail>", references="<x@mail>")),
+            ConversationEmail("INBOX", EmailGenerator.email(3, "Re: Plan", day=5, message_id="<e@mail>", references="<x@mail>")),
+            # References that loop back are ignored.
+            ConversationEmail("INBOX", EmailGenerator.email(8, "Re: Plan", day=7, message_id="<g@mail>", in_reply_to="<g@mail>", references="<f@mail> <g@mail>")),
+        ]), [("INBOX", "3", 0), ("INBOX", "5", 0), ("INBOX", "8", 1)])
+
+    def test_get_base_subject(self):
+        print("test_get_base_subject...")
+        self.assertEqual(get_base_subject("Re: FWD:  Meeting   notes"), ("meeting notes", True))
+        self.assertEqual(get_base_subject("AW[2]: Angebot"), ("angebot", True))
+        self.assertEqual(get_base_subject("Rebate offer"), ("rebate offer", False))
+
+    def test_link_in_search_index(self):
+        print("test_link_in_search_index...")
+        search_index = SearchIndex()
+        # Reply arrives before the email it replies to.
+        search_index.add("Sent", "3", [EmailGenerator.email(9, "Re: Meeting", day=3, message_id="<c@mail>", in_reply_to="<a@mail>", references="<a@mail>")])
+        search_index.add("INBOX", "7", [
+            EmailGenerator.email(1, "Meeting", day=1, message_id="<a@mail>"),
+            EmailGenerator.email(2, "Lunch", day=2, message_id="<b@mail>"),
+            # Client dropped the references.
+            EmailGenerator.email(4, "RE: lunch", day=4, message_id="<d@mail>"),
+            EmailGenerator.email(5, "Report", day=5, message_id="<e@mail>"),
+            EmailGenerator.email(6, "Other report", day=6, message_id="<f@mail>"),
+        ])
+
+        def get_conversation(folder: str, uid: str) -> list[tuple[str, str]] | None:
+            conversation_emails = search_index.get_conversation(folder, uid)
+            if conversation_emails is None:
+                return None
+            return [
+                (conversation_email.folder, conversation_email.email.uid)
+                for conversation_email in conversation_emails
+            ]
+
+        self.assertEqual(get_conversation("INBOX", "1"), [("INBOX", "1"), ("Sent", "9")])
+        self.assertEqual(get_conversation("INBOX", "4"), [("INBOX", "2"), ("INBOX", "4")])
+        self.assertEqual(get_conversation("INBOX", "5"), [("INBOX", "5")])
+        self.assertIsNone(get_conversation("INBOX", "99"))
+
+        # Threads of the server, see `THREAD`.
+        search_index.link("INBOX", ["5", "6", "99"])
+        self.assertEqual(get_conversation("INBOX", "6"), [("INBOX", "5"), ("INBOX", "6")])
+
+        # Conversation stays linked when the email it replies to is removed.
+        search_index.remove("INBOX", ["1"])
+        search_index.add("INBOX", "7", [EmailGenerator.email(3, "Re: Meeting", day=7, message_id="<g@mail>", in_reply_to="<a@mail>", references="<a@mail>")])
+        self.assertEqual(get_conversation("Sent", "9"), [("Sent", "9"), ("INBOX", "3")])
+        search_index.close()
@@ -13,6 +13,7 @@ from src.modules.openmail.types import Draft, SearchCriteria
 from src.modules.openmail.parser import HTMLParser, MessageParser
 from src.modules.openmail.encoder import FileBase64Encoder
 from src.modules.openmail.converter import AttachmentConverter
+from src.modules.openmail.scheduler import get_scheduler_stats
 
 from tests.modules.openmail.utils.dummy_operator import DummyOperator
 from tests.modules.openmail.utils.name_generator import NameGenerator
@@ -587,6 +588,84 @@ class TestFetchOperations(unittest.TestCase):
         self.assertEqual(other_part_of_emails.total, count - half)
         self.assertEqual([email.subject for email in other_part_of_emails.emails], random_subject_list[half:count])
 
+    def test_fetch_with_keyset_pagination(self):
+        print("test_fetch_with_keyset_pagination...")
+
+        new_created_empty_test_folder, _ = DummyOperator.create_test_folder_and_get_name(self.__class__._openmail)
+        self.__class__._created_test_folders.append(new_created_empty_test_folder)
+        self.__class__._openmail.imap.copy_email(
+            Folder.Inbox,
+            new_created_empty_test_folder,
+            ",".join([
+                self.__class__._test_sent_basic_email_uid,
+                self.__class__._test_sent_complex_email_uid
+            ])
+        )
+
+        print("Waiting 2 seconds after copy operation")
+        time.sleep(2)
+
+        first_page = self.__class__._openmail.imap.get_emails_before(new_created_empty_test_folder, limit=1)
+        self.assertEqual(first_page.total, 2)
+        self.assertEqual(
+            [email.subject for email in first_page.emails],
+            [self.__class__._test_sent_complex_email.subject]
+        )
+
+        second_page = self.__class__._openmail.imap.get_emails_before(
+            new_created_empty_test_folder, first_page.emails[-1].uid, 1
+        )
+        self.assertEqual(
+            [email.subject for email in second_page.emails],
+            [self.__class__._test_sent_basic_email.subject]
+        )
+        self.assertEqual(
+            self.__class__._openmail.imap.get_emails_before(
+                new_created_empty_test_folder, second_page.emails[-1].uid, 1
+            ).emails,
+            []
+        )
+
+        newer_emails = self.__class__._openmail.imap.get_emails_after(
+            new_created_empty_test_folder, second_page.emails[-1].uid
+        )
+        self.assertEqual([email.uid for email in newer_emails.emails], [first_page.emails[0].uid])
+
+    def test_iter_email_sources_between_interactive_commands(self):
+        print("test_iter_email_sources_between_interactive_commands...")
+
+        new_created_empty_test_folder, _ = DummyOperator.create_test_folder_and_get_name(self.__class__._openmail)
+        self.__class__._created_test_folders.append(new_created_empty_test_folder)
+        self.__class__._openmail.imap.copy_email(
+            Folder.Inbox,
+            new_created_empty_test_folder,
+            ",".join([
+                self.__class__._test_sent_basic_email_uid,
+                self.__class__._test_sent_complex_email_uid
+            ])
+        )
+
+        print("Waiting 2 seconds after copy operation")
+        time.sleep(2)
+
+        sources = []
+        for uid, source in self.__class__._openmail.imap.iter_email_sources(new_created_empty_test_folder, 1):
+            sources.append(source)
+            # Selects inbox between the chunks of the export.
+            email_content = self.__class__._openmail.imap.get_email_content(
+                Folder.Inbox,
+                cast(str, self.__class__._test_sent_basic_email_uid)
+            )
+            self.assertEqual(email_content.subject, self.__class__._test_sent_basic_email.subject)
+
+        self.assertEqual(len(sources), 2)
+        self.assertIn(self.__class__._test_sent_basic_email.subject.encode(), sources[0])
+        self.assertIn(self.__class__._test_sent_complex_email.subject.encode(), sources[1])
+        self.assertTrue(any(
+            stats.account == self.__class__._sender_email.lower() and stats.lane == "bulk" and stats.grants >= 3
+            for stats in get_scheduler_stats()
+        ))
+
     @classmethod
     def cleanup(cls):
         print("Cleaning up test `TestFetchOperations`...")
@@ -0,0 +1,84 @@
+import time
+import threading
+import unittest
+
+from src.modules.openmail.flag_changes import FlagChanges
+
+class TestFlagChanges(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        print("Setting up test `TestFlagChanges`...")
+
+    def _run_together(self, flag_changes: FlagChanges, changes: list[tuple]) -> list:
+        results = [None] * len(changes)
+        def change(index: int):
+            results[index] = flag_changes.change(*changes[index])
+
+        threads = [threading.Thread(target=change, args=(i,)) for i in range(len(changes))]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.01)
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_merge_changes_of_window(self):
+        print("test_merge_changes_of_window...")
+        stores = []
+        def store(*args):
+            stores.append(args)
+            return True, "OK"
+
+        results = self._run_together(FlagChanges(store, window=0.2), [
+            ("INBOX", "1,2,3", "+FLAGS", "\\Seen"),
+            ("INBOX", "4", "+FLAGS", "\\Seen"),
+            ("INBOX", "2", "-FLAGS", "\\Seen"),
+            ("INBOX", "5", "+FLAGS", "\\Flagged"),
+            ("INBOX", "9:*", "+FLAGS", "\\Seen"),
+        ])
+
+        self.assertEqual(results, [(True, "OK")] * 5)
+        self.assertCountEqual(stores, [
+            ("INBOX", "1,3:4", "+FLAGS", "\\Seen"),
+            ("INBOX", "2", "-FLAGS", "\\Seen"),
+            ("INBOX", "5", "+FLAGS", "\\Flagged"),
+            ("INBOX", "9:*", "+FLAGS", "\\Seen"),
+        ])
+
+    def test_keep_order_of_unmerged_changes(self):
+        print("test_keep_order_of_unmerged_changes...")
+        stores = []
+        def store(*args):
+            stores.append(args)
+            return True, "OK"
+
+        self._run_together(FlagChanges(store, window=0.2), [
+            ("INBOX", "3", "+FLAGS", "\\Seen"),
+            ("INBOX", "1:*", "-FLAGS", "\\Seen"),
+            ("INBOX", "5", "+FLAGS", "\\Seen"),
+            ("INBOX", "6", "+FLAGS", "\\Seen"),
+        ])
+
+        self.assertEqual(stores, [
+            ("INBOX", "3", "+FLAGS", "\\Seen"),
+            ("INBOX", "1:*", "-FLAGS", "\\Seen"),
+            ("INBOX", "5:6", "+FLAGS", "\\Seen"),
+        ])
+
+    def test_share_result_of_store(self):
+        print("test_share_result_of_store...")
+        def store(folder, sequence_set, command, flag):
+            if flag == "\\Flagged":
+                raise ValueError("Connection lost")
+            return False, "Mailbox is read-only"
+
+        flag_changes = FlagChanges(store, window=0.2)
+        self.assertEqual(
+            self._run_together(flag_changes, [
+                ("INBOX", "1", "+FLAGS", "\\Seen"),
+                ("INBOX", "2", "+FLAGS", "\\Seen"),
+            ]),
+            [(False, "Mailbox is read-only")] * 2
+        )
+        with self.assertRaises(ValueError):
+            flag_changes.change("INBOX", "1", "+FLAGS", "\\Flagged")
@@ -0,0 +1,51 @@
+import unittest
+
+from src.modules.openmail.parser import MessageParser
+
+class TestMessageParser(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        print("Setting up test `TestMessageParser`...")
+
+    def test_get_esearch_partial_result(self):
+        print("test_get_esearch_partial_result...")
+        response = b'(TAG "A5") UID COUNT 1204 PARTIAL (-1:-5 1199,1201:1203,1204)'
+        self.assertEqual(MessageParser.get_esearch_count(response), 1204)
+        self.assertEqual(str(MessageParser.get_esearch_uids(response)), "1199,1201:1204")
+
+        response = b'(TAG "A6") UID COUNT 0 PARTIAL (-1:-5 NIL)'
+        self.assertEqual(MessageParser.get_esearch_count(response), 0)
+        self.assertFalse(MessageParser.get_esearch_uids(response))
+
+    def test_get_esearch_all_result(self):
+        print("test_get_esearch_all_result...")
+        response = b'(TAG "A7") UID COUNT 6 ALL 3:1,8,10:11'
+        self.assertEqual(MessageParser.get_esearch_count(response), 6)
+        self.assertEqual(list(MessageParser.get_esearch_uids(response)), [1, 2, 3, 8, 10, 11])
+        # No matches, ALL is not returned.
+        self.assertFalse(MessageParser.get_esearch_uids(b'(TAG "A8") UID COUNT 0'))
+        self.assertEqual(MessageParser.get_esearch_count(b'(TAG "A9") UID'), -1)
+
+    def test_get_copied_uids(self):
+        print("test_get_copied_uids...")
+        source, destination = MessageParser.get_copied_uids(b'38505 304,319:320 3956:3958')
+        self.assertEqual(str(source), "304,319:320")
+        self.assertEqual(str(destination), "3956:3958")
+        source, destination = MessageParser.get_copied_uids(b'[COPYUID 38505 1 7] Done')
+        self.assertEqual((str(source), str(destination)), ("1", "7"))
+
+    def test_group_messages_without_literals(self):
+        print("test_group_messages_without_literals...")
+        grouped_messages = MessageParser.group_messages([b'1 (UID 4 FLAGS (\\Seen))', b'2 (UID 7 FLAGS ())'])
+        self.assertEqual(
+            [(MessageParser.get_uid(message), MessageParser.get_flags(message)) for message in grouped_messages],
+            [("4", ["\\Seen"]), ("7", [])]
+        )
+
+    def test_get_thread_uids(self):
+        print("test_get_thread_uids...")
+        self.assertEqual(
+            MessageParser.get_thread_uids([b'(2)(3 6 (4 23)(44 7 96))((11)(12 13))']),
+            [["2"], ["3", "6", "4", "23", "44", "7", "96"], ["11", "12", "13"]]
+        )
+        self.assertEqual(MessageParser.get_thread_uids([None]), [])
@@ -0,0 +1,46 @@
+import time
+import unittest
+
+from src.modules.openmail.search_cache import SearchCache
+
+class TestSearchCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        print("Setting up test `TestSearchCache`...")
+
+    def test_get_by_key_and_cursor(self):
+        print("test_get_by_key_and_cursor...")
+        cache = SearchCache()
+        inbox_cursor = cache.put(("INBOX", "ALL", "7", 3, "100"), ["3", "2", "1"])
+        archive_cursor = cache.put(("Archive", "ALL", "9", 2, "50"), ["8", "7"])
+
+        self.assertNotEqual(inbox_cursor, archive_cursor)
+        self.assertEqual(cache.get(("INBOX", "ALL", "7", 3, "100")), ["3", "2", "1"])
+        self.assertEqual(cache.get_by_cursor(archive_cursor), ["8", "7"])
+        # Folder has changed on the server.
+        self.assertIsNone(cache.get(("INBOX", "ALL", "7", 4, "101")))
+
+    def test_evict_least_recently_used(self):
+        print("test_evict_least_recently_used...")
+        cache = SearchCache(max_size=2)
+        first_cursor = cache.put("first", 1)
+        second_cursor = cache.put("second", 2)
+        cache.get("first")
+        cache.put("third", 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get_by_cursor(first_cursor), 1)
+        self.assertIsNone(cache.get_by_cursor(second_cursor))
+        self.assertIsNone(cache.get("second"))
+
+    def test_replace_and_expire(self):
+        print("test_replace_and_expire...")
+        cache = SearchCache()
+        old_cursor = cache.put("INBOX", ["1"])
+        new_cursor = cache.put("INBOX", ["2", "1"])
+        self.assertIsNone(cache.get_by_cursor(old_cursor))
+        self.assertEqual(cache.get_by_cursor(new_cursor), ["2", "1"])
+
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("INBOX", max_age=0.05))
+        self.assertIsNone(cache.get_by_cursor(new_cursor))
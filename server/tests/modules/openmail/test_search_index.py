@@ -0,0 +1,136 @@
+import os
+import tempfile
+import unittest
+
+from src.modules.openmail.search_index import SearchIndex, get_search_index, remove_search_index, set_search_index_dir
+from src.modules.openmail.types import MessageLocation, SearchCriteria
+from tests.modules.openmail.utils.email_generator import EmailGenerator
+
+class TestSearchIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        print("Setting up test `TestSearchIndex`...")
+        cls.addClassCleanup(cls.cleanup)
+        cls._search_index = SearchIndex()
+        cls._search_index.add("INBOX", "7", [
+            EmailGenerator.email(1, "Invoice of March", "Billing <billing@shop.com>", "Total is 20 €", 3, ("invoice-march.pdf",), ("\\Seen",)),
+            EmailGenerator.email(2, "Çay saati", "Ayşe <ayse@mail.com>", "Yarın görüşelim", 4, flags=("\\Seen", "\\Flagged")),
+            EmailGenerator.email(3, "Invoice of April", "Billing <billing@shop.com>", "Total is 30 €", 5),
+        ], {"1": 52000, "2": 1200, "3": 48000})
+
+    @classmethod
+    def cleanup(cls):
+        cls._search_index.close()
+
+    def _search(self, search, folder: str = "INBOX") -> list[str] | None:
+        emails = self.__class__._search_index.search(folder, search)
+        return None if emails is None else [email.uid for email in emails]
+
+    def test_search_fields(self):
+        print("test_search_fields...")
+        self.assertEqual(self._search("invo"), ["3", "1"])
+        self.assertEqual(self._search("cay saat"), ["2"])
+        self.assertEqual(self._search(SearchCriteria(senders=["billing@shop.com"], exclude="april")), ["1"])
+        self.assertEqual(self._search(SearchCriteria(subject="march")), ["1"])
+        self.assertEqual(self._search(SearchCriteria(include="invoice-march")), ["1"])
+        self.assertEqual(self._search("görüş"), ["2"])
+        self.assertEqual(self._search("invoice", "Archive"), [])
+
+    def test_search_metadata(self):
+        print("test_search_metadata...")
+        self.assertEqual(self._search(SearchCriteria(subject="invoice", included_flags=["\\Seen"])), ["1"])
+        self.assertEqual(self._search(SearchCriteria(included_flags=["\\Unseen"])), ["3"])
+        self.assertEqual(self._search(SearchCriteria(excluded_flags=["\\Flagged", "\\Unseen"])), ["1"])
+        self.assertEqual(self._search(SearchCriteria(since="2025-01-04")), ["3", "2"])
+        self.assertEqual(self._search(SearchCriteria(since="04-Jan-2025", before="05-Jan-2025")), ["2"])
+        self.assertEqual(self._search(SearchCriteria(larger_than=50000)), ["1"])
+        self.assertEqual(self._search(SearchCriteria(smaller_than=50000)), ["3", "2"])
+        self.assertEqual(self._search(SearchCriteria(senders=["ayse@mail.com"])), ["2"])
+        self.assertEqual(self._search(SearchCriteria(receivers=["billing@shop.com"])), [])
+        # Names and domains match a part of the field.
+        self.assertEqual(self._search(SearchCriteria(senders=["Billing"])), ["3", "1"])
+        self.assertEqual(self._search(SearchCriteria(senders=["shop.com"], subject="april")), ["3"])
+        self.assertEqual(self._search(SearchCriteria(senders=["ayse", "nobody@shop.com"])), ["2"])
+        self.assertEqual(self._search(SearchCriteria(senders=["John Doe"])), [])
+        self.assertEqual(self._search(SearchCriteria(message_id=["<3@mail.com>"])), ["3"])
+        self.assertEqual(self._search(SearchCriteria(has_attachments=True)), ["1"])
+        # Malformed criteria are left to the server.
+        self.assertIsNone(self._search(SearchCriteria(since="yesterday")))
+
+    def test_update_and_remove(self):
+        print("test_update_and_remove...")
+        search_index = SearchIndex()
+        search_index.add("INBOX", "7", [EmailGenerator.email(1, "Report", "a@mail.com", "quarterly numbers", 3)])
+        # Body is kept when the email is added again without one.
+        search_index.add("INBOX", "7", [EmailGenerator.email(1, "Report v2", "a@mail.com", "", 3)])
+        self.assertEqual([email.subject for email in search_index.search("INBOX", "quarterly")], ["Report v2"])
+
+        search_index.add("INBOX", "7", [EmailGenerator.email(2, "Report", "b@mail.com", "", 4)])
+        search_index.remove("INBOX", ["1"])
+        self.assertEqual([email.uid for email in search_index.search("INBOX", "report")], ["2"])
+
+        # Uids belong to other emails once UIDVALIDITY changes.
+        search_index.check_uid_validity("INBOX", "8")
+        self.assertEqual(search_index.search("INBOX", "report"), [])
+        search_index.close()
+
+    def test_flags_and_folder_state(self):
+        print("test_flags_and_folder_state...")
+        search_index = SearchIndex()
+        search_index.add("INBOX", "7", [EmailGenerator.email(1, "Report", "a@mail.com", "", 3), EmailGenerator.email(2, "Report", "a@mail.com", "", 4)])
+        search_index.change_flag("INBOX", ["1", "2"], "\\Seen", True)
+        search_index.set_flags("INBOX", {"2": ["\\Flagged"]})
+        self.assertEqual(
+            [email.uid for email in search_index.search("INBOX", SearchCriteria(included_flags=["\\Seen"]))], ["1"]
+        )
+
+        self.assertFalse(search_index.is_complete("INBOX"))
+        search_index.set_folder_state("INBOX", ("7", 2, "15", "3"), complete=True)
+        search_index.set_folder_state("INBOX", ("7", 2, "15", "3"))
+        self.assertTrue(search_index.is_complete("INBOX"))
+        # Folder has changed on the server since it is indexed.
+        search_index.set_folder_state("INBOX", ("7", 3, "16", "4"))
+        self.assertFalse(search_index.is_complete("INBOX"))
+        self.assertEqual(list(search_index.get_uids("INBOX")), [1, 2])
+        search_index.close()
+
+    def test_locate_by_message_id(self):
+        print("test_locate_by_message_id...")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "index.sqlite3")
+            search_index = SearchIndex(path)
+            search_index.add("INBOX", "7", [EmailGenerator.email(1, "Report", "a@mail.com", "quarterly numbers", 3)], {"1": 900})
+            # Same email under another label.
+            search_index.add("All Mail", "2", [
+                EmailGenerator.email(40, "Report", "a@mail.com", "", 3, message_id="<1@mail.com>")
+            ], {"40": 900})
+            search_index.close()
+
+            # Index is kept across restarts.
+            search_index = SearchIndex(path)
+            self.assertEqual(search_index.locate("<1@mail.com>"), [
+                MessageLocation(folder="All Mail", uid_validity="2", uid="40"),
+                MessageLocation(folder="INBOX", uid_validity="7", uid="1"),
+            ])
+            self.assertEqual(search_index.locate("<2@mail.com>"), [])
+            self.assertEqual(search_index.get_email("INBOX", "1").body, "quarterly numbers")
+            self.assertIsNone(search_index.get_email("INBOX", "2"))
+
+            # Copies must have the same size.
+            self.assertEqual(search_index.get_copy(" <1@mail.com>", 900).subject, "Report")
+            self.assertIsNone(search_index.get_copy("<1@mail.com>", 901))
+            search_index.close()
+
+    def test_remove_search_index(self):
+        print("test_remove_search_index...")
+        with tempfile.TemporaryDirectory() as directory:
+            set_search_index_dir(directory)
+            self.addCleanup(set_search_index_dir, None)
+            search_index = get_search_index("A@mail.com")
+            search_index.add("INBOX", "7", [EmailGenerator.email(1, "Report", "a@mail.com", "quarterly numbers", 3)])
+            self.assertIs(get_search_index("a@mail.com"), search_index)
+
+            remove_search_index("a@mail.com")
+            self.assertEqual(os.listdir(directory), [])
+            self.assertEqual(get_search_index("a@mail.com").search("INBOX", "quarterly"), [])
+            remove_search_index("a@mail.com")
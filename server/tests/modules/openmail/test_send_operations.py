@@ -3,9 +3,11 @@ import re
 import unittest
 import json
 import copy
+import time
 
 from src.modules.openmail import Openmail
-from src.modules.openmail.types import Draft, Folder, SearchCriteria
+from src.modules.openmail.types import Draft, Folder, SearchCriteria, MergeRecipient, Attachment
+from src.modules.openmail.mail_merge import MailMerge
 from src.modules.openmail.parser import HTMLParser, MessageParser
 from src.modules.openmail.encoder import FileBase64Encoder
 from src.modules.openmail.converter import AttachmentConverter
@@ -29,6 +31,7 @@ class TestSendOperations(unittest.TestCase):
             raise ValueError("At least 4 credentials are required.")
 
         cls._sender_email = credentials[0]["email"]
+        cls._sender_password = credentials[0]["password"]
         cls._receiver_emails = [credential["email"] for credential in credentials]
         cls._openmail.connect(cls._sender_email, credentials[0]["password"])
 
@@ -130,6 +133,78 @@ class TestSendOperations(unittest.TestCase):
         self.__class__._sent_test_email_uids.append(uid)
         self.is_sent_email_valid(email_to_send, uid)
 
+    def test_send_email_with_lazy_connection(self):
+        print("test_send_email_with_lazy_connection...")
+        openmail = Openmail()
+        status, message = openmail.connect(
+            self.__class__._sender_email,
+            self.__class__._sender_password,
+            smtp_lazy_connect=True
+        )
+        self.assertTrue(status, message)
+        self.assertEqual(openmail.smtp.connection_count, 0)
+
+        for i in range(2):
+            email_to_send = Draft(
+                sender=self.__class__._sender_email,
+                receivers=self.__class__._sender_email,
+                subject=NameGenerator.subject()[0],
+                body="test_send_email_with_lazy_connection"
+            )
+            uid = DummyOperator.send_test_email_to_self_and_get_uid(
+                openmail,
+                copy.copy(email_to_send)
+            )
+            self.__class__._sent_test_email_uids.append(uid)
+            self.assertEqual(openmail.smtp.connection_count, 1)
+            if i == 0:
+                # Simulate a connection dropped by the server, next send
+                # must reconnect and retry transparently.
+                openmail.smtp._idle[0][0].close()
+
+        openmail.disconnect()
+
+    def test_send_bulk_email(self):
+        print("test_send_bulk_email...")
+        subject = NameGenerator.subject()[0]
+        names = ["First <Recipient>", "Second Recipient"]
+        results = []
+        with MailMerge(Draft(
+            sender=self.__class__._sender_email,
+            receivers="",
+            subject=subject + " {{ name }}",
+            body="<p>Hello {{ name }}, this is sent to {{ address }}.</p>",
+            attachments=[Attachment(
+                name="shared.txt",
+                size=len(b"shared attachment"),
+                type="text/plain",
+                data=base64.b64encode(b"shared attachment").decode()
+            )]
+        )) as merge:
+            processed = self.__class__._openmail.smtp.send_bulk(
+                merge,
+                [
+                    MergeRecipient(self.__class__._sender_email, {"name": name})
+                    for name in names
+                ] + [MergeRecipient(self.__class__._sender_email, {})],
+                lambda recipient, status, msg: results.append(status),
+            )
+
+        # Recipient without `name` fails without stopping the others.
+        self.assertEqual(processed, 3)
+        self.assertEqual(results, [True, True, False])
+
+        time.sleep(2)
+        self.__class__._openmail.imap.search_emails(
+            folder=Folder.Inbox,
+            search=SearchCriteria(subject=subject, senders=[self.__class__._sender_email])
+        )
+        emails = self.__class__._openmail.imap.get_emails().emails
+        self.assertEqual(len(emails), len(names))
+        for email in emails:
+            self.__class__._sent_test_email_uids.append(email.uid)
+            self.assertIn(email.subject.removeprefix(subject + " "), names)
+
     def test_send_multiple_recipients_email(self):
         print("test_send_multiple_recipients_email...")
         email_to_send = Draft(
@@ -0,0 +1,48 @@
+import unittest
+
+from src.modules.openmail.uid_set import UIDSet
+
+class TestUIDSet(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        print("Setting up test `TestUIDSet`...")
+
+    def test_compress_and_parse(self):
+        print("test_compress_and_parse...")
+        uids = UIDSet(["9", "1", "3", "2", "5", "3"])
+        self.assertEqual(str(uids), "1:3,5,9")
+        self.assertEqual(len(uids), 5)
+        self.assertEqual(UIDSet.parse("1:3,5,9"), uids)
+        self.assertEqual(str(UIDSet.parse("4:1,3:6:8,10:*", max_uid=12)), "1:8,10:12")
+        with self.assertRaises(ValueError):
+            UIDSet.parse("1,3:*")
+
+    def test_membership_and_newest(self):
+        print("test_membership_and_newest...")
+        uids = UIDSet.parse("1:400000,400005")
+        self.assertEqual(len(uids), 400001)
+        self.assertIn("250000", uids)
+        self.assertIn(400005, uids)
+        self.assertNotIn("400001", uids)
+        self.assertNotIn("0", uids)
+        self.assertEqual(uids.newest(0, 3), ["400005", "400000", "399999"])
+        self.assertEqual(uids.newest(400000), ["1"])
+        self.assertEqual([str(chunk) for chunk in UIDSet.parse("1:5,8").chunks(4)], ["1:4", "5,8"])
+
+    def test_split_by_length(self):
+        print("test_split_by_length...")
+        uids = UIDSet(range(1, 200001, 2))
+        sequence_sets = [str(batch) for batch in uids.split(8000)]
+        self.assertTrue(all(len(sequence_set) <= 8000 for sequence_set in sequence_sets))
+        self.assertEqual(UIDSet.parse(",".join(sequence_sets)), uids)
+        self.assertEqual([str(batch) for batch in UIDSet.parse("1:5,8,10:12").split(6)], ["1:5,8", "10:12"])
+
+    def test_set_algebra(self):
+        print("test_set_algebra...")
+        first = UIDSet.parse("1:10,20:30")
+        second = UIDSet.parse("5:25,40")
+        self.assertEqual(str(first | second), "1:30,40")
+        self.assertEqual(str(first & second), "5:10,20:25")
+        self.assertEqual(str(first - second), "1:4,26:30")
+        self.assertTrue(UIDSet.parse("2:4,21") <= first)
+        self.assertFalse(second <= first)
@@ -0,0 +1,57 @@
+from src.modules.openmail.types import Attachment, Email
+
+class EmailGenerator:
+    """Utility class for generating emails without a server"""
+
+    @staticmethod
+    def email(
+        uid: int,
+        subject: str | None = None,
+        sender: str = "a@mail.com",
+        body: str = "",
+        day: int = 1,
+        attachments: tuple[str, ...] = (),
+        flags: tuple[str, ...] = (),
+        date: str | None = None,
+        receivers: str = "b@mail.com",
+        message_id: str | None = None,
+        in_reply_to: str = "",
+        references: str = ""
+    ) -> Email:
+        """
+        Generate an email
+
+        Args:
+            uid (int): The uid of the email
+            subject (str, optional): The subject. Defaults to `Subject <uid>`.
+            sender (str, optional): The sender. Defaults to "a@mail.com".
+            body (str, optional): The body. Defaults to "".
+            day (int, optional): The day of January 2025 the email is sent. Defaults to 1.
+            attachments (tuple[str, ...], optional): The names of the attachments. Defaults to ().
+            flags (tuple[str, ...], optional): The flags. Defaults to ().
+            date (str, optional): The date, used instead of `day` if provided.
+            receivers (str, optional): The receivers. Defaults to "b@mail.com".
+            message_id (str, optional): The message id. Defaults to `<uid@mail.com>`.
+            in_reply_to (str, optional): The `In-Reply-To` header. Defaults to "".
+            references (str, optional): The `References` header. Defaults to "".
+
+        Returns:
+            Email: The generated email.
+
+        Example:
+            >>> EmailGenerator.email(1, "Meeting", day=3)
+            Email(message_id="<1@mail.com>", uid="1", sender="a@mail.com", date="Mon, 03 Jan 2025 10:00:00 +0000", ...)
+        """
+        return Email(
+            message_id=f"<{uid}@mail.com>" if message_id is None else message_id,
+            uid=str(uid),
+            sender=sender,
+            receivers=receivers,
+            date=date or f"Mon, {day:02} Jan 2025 10:00:00 +0000",
+            subject=f"Subject {uid}" if subject is None else subject,
+            body=body,
+            attachments=[Attachment(name=name, size=1, type="application/pdf") for name in attachments],
+            flags=list(flags),
+            in_reply_to=in_reply_to,
+            references=references
+        )